@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+
+# Micro-benchmark for Workflow._determine_orientation(). Compares the
+# OrientationClassifier against the original rfind-based implementation on
+# synthetic fastq filenames and confirms the results are identical.
+
+from random import Random
+from time import perf_counter
+import click
+from qp_klp.OrientationClassifier import OrientationClassifier
+
+
+def determine_orientation_rfind(file_name):
+    # the original implementation, kept here as a reference.
+    results = []
+    for o in ['R1', 'R2', 'I1', 'I2']:
+        for v in [f"_{o}_", f".{o}."]:
+            results.append((file_name.rfind(v), o))
+    results.sort(reverse=True)
+    pos, orientation = results[0]
+    return None if pos == -1 else orientation
+
+
+def generate_names(count, seed):
+    # names resemble bcl-convert output. Some include additional
+    # orientations in the sample-name, some use '.' as a separator and a
+    # few have no orientation at all.
+    rng = Random(seed)
+    tokens = ['R1', 'R2', 'I1', 'I2', 'SRE', '04', '1776']
+    names = []
+
+    for i in range(count):
+        sample = '_'.join(rng.choice(tokens) for _ in range(rng.randint(1,
+                                                                        4)))
+        sep = rng.choice('_.')
+        orientation = rng.choice(['R1', 'R2', 'I1', 'I2', 'R3'])
+        suffix = rng.choice(['.fastq.gz', '.trimmed.fastq.gz'])
+        names.append(f'ABC_{i}_{sample}_S{i % 384}_L00{i % 8 + 1}'
+                     f'{sep}{orientation}{sep}001{suffix}')
+
+    return names
+
+
+@click.command()
+@click.option('--count', default=100000, show_default=True,
+              help='Number of synthetic filenames.')
+@click.option('--passes', default=3, show_default=True,
+              help='Number of times each filename is classified, as names '
+                   'are classified by several stages.')
+@click.option('--seed', default=42, show_default=True)
+def benchmark(count, passes, seed):
+    names = generate_names(count, seed)
+    classifier = OrientationClassifier(maxsize=None)
+    results = {}
+
+    for name, func in [('rfind', determine_orientation_rfind),
+                       ('uncached', OrientationClassifier._classify),
+                       ('classifier', classifier.classify)]:
+        timings = []
+        for i in range(passes):
+            start = perf_counter()
+            results[name] = [func(x) for x in names]
+            timings.append(perf_counter() - start)
+
+        click.echo(f'{name:>10}: first pass: {timings[0]:.3f}s, '
+                   f'total: {sum(timings):.3f}s')
+
+    identical = (results['rfind'] == results['uncached'] ==
+                 results['classifier'])
+    click.echo(f'results identical: {identical}')
+
+
+if __name__ == '__main__':
+    benchmark()
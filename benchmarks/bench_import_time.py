@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+
+# Cold-start import time of the plugin, as paid by every start_klp and
+# configure_klp invocation. Each run imports the module in a new interpreter
+# w/'python -X importtime' and the cumulative time reported for it is
+# recorded. Exits w/a non-zero status if the best time exceeds --max-ms, so
+# that it can be used to guard against regressions.
+
+from os import environ
+from subprocess import run
+import sys
+import click
+
+
+def parse_importtime(stderr):
+    # lines are of the form:
+    # 'import time:   self [us] | cumulative | imported package'
+    results = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            # the header line.
+            continue
+        results.append((fields[2].strip(), self_us, cumulative_us))
+    return results
+
+
+def time_import(module):
+    env = dict(environ)
+    # klp reads its configuration path from the environment on import.
+    env.setdefault('QP_KLP_CONFIG_FP', 'unused')
+    proc = run([sys.executable, '-X', 'importtime', '-c',
+                f'import {module}'], capture_output=True, text=True, env=env,
+               check=True)
+    return parse_importtime(proc.stderr)
+
+
+@click.command()
+@click.option('--module', default='qp_klp', show_default=True,
+              help='The module to import.')
+@click.option('--repeat', default=5, show_default=True,
+              help='Number of cold imports.')
+@click.option('--top', default=10, show_default=True,
+              help='Number of slowest modules to list, by self time.')
+@click.option('--max-ms', default=None, type=float,
+              help='Fail if the best cumulative import time exceeds this.')
+def benchmark(module, repeat, top, max_ms):
+    timings = []
+    for i in range(repeat):
+        results = time_import(module)
+        cumulative = [x[2] for x in results if x[0] == module]
+        timings.append(cumulative[-1] / 1000)
+
+    best = min(timings)
+    click.echo(f'import {module}: best of {repeat}: {best:.1f}ms, '
+               f'modules imported: {len(results)}')
+
+    for name, self_us, _ in sorted(results, key=lambda x: -x[1])[:top]:
+        click.echo(f'{self_us / 1000:>10.1f}ms  {name}')
+
+    if max_ms is not None and best > max_ms:
+        click.echo(f'import time exceeds {max_ms}ms', err=True)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,450 @@
+#!/usr/bin/env python
+
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+
+# End-to-end benchmark of the steps a metagenomic Workflow performs once
+# GenPrepFileJob has completed: overwriting preps, generating SIFs,
+# registering blanks and preps in Qiita, loading files into Qiita and
+# packaging the results.
+#
+# A synthetic run of the requested size is generated for each repeat: the
+# output of NuQCJob, FastQCJob and GenPrepFileJob, and the studies Qiita
+# holds for each project. The real Workflow and Assay methods are then run
+# against it w/a Qiita client that adds a fixed latency to each request,
+# and each stage is timed w/the Workflow's StageTimer.
+#
+# --output records the results along w/the commit and parameters used.
+# --baseline compares the results against those of an earlier run w/the
+# same parameters, and exits w/a non-zero status if a stage is slower than
+# --max-regression allows.
+
+from json import dumps, load, loads
+from os import makedirs, urandom
+from os.path import join, dirname, abspath
+from statistics import median
+from subprocess import run
+from tempfile import TemporaryDirectory
+from threading import Lock
+from time import sleep
+import platform
+import sys
+import click
+from qp_klp.Assays import Metagenomic, ASSAY_NAME_METAGENOMIC
+from qp_klp.Workflows import Workflow
+
+
+RUN_ID = '20240101_A00000_0001_BSYNTHETIC'
+
+# the stages run, in the order a StandardMetagenomicWorkflow runs them.
+STAGES = [
+    ('special_map', lambda w: w.generate_special_map()),
+    ('tube_ids', lambda w: w._get_tube_ids_from_qiita()),
+    ('overwrite_preps',
+     lambda w: w.overwrite_prep_files(w.index_prep_files())),
+    ('sifs', lambda w: w.generate_sifs()),
+    ('blanks', lambda w: w.update_blanks_in_qiita()),
+    ('prep_templates', lambda w: w.update_prep_templates()),
+    ('load_preps', lambda w: w.load_preps_into_qiita()),
+    ('commands', lambda w: w.generate_commands()),
+    ('package', lambda w: w.execute_commands())]
+
+SIF_COLUMNS = ['sample_name', 'collection_timestamp', 'description',
+               'empo_1', 'sample_type', 'scientific_name', 'title']
+
+
+class SyntheticStudies():
+    """
+    The samples, tube-ids and blanks of each project in a synthetic run.
+
+    Every twelfth sample is a BLANK, and every other BLANK is already
+    registered in Qiita. Every seventh tube-id has leading zeroes in the
+    sample-sheet.
+    """
+    def __init__(self, projects, samples):
+        self.projects = []
+
+        for p in range(1, projects + 1):
+            qiita_id = str(10000 + p)
+            project = {'project_name': f'Project{p}',
+                       'qiita_id': qiita_id,
+                       'samples': {},
+                       'blanks': [],
+                       'registered_blanks': []}
+
+            for i in range(samples):
+                if i % 12 == 0:
+                    blank = f'BLANK.{p}.{i}'
+                    project['blanks'].append(blank)
+                    if i % 24 == 0:
+                        project['registered_blanks'].append(blank)
+                else:
+                    # sample-names map to tube-ids.
+                    project['samples'][f'{p}.{i}'] = f'{p}{i:06d}'
+
+            self.projects.append(project)
+
+    def get_sheet_names(self, project):
+        # the sample-names as they appear in the sample-sheet.
+        names = []
+        for i, tube_id in enumerate(project['samples'].values()):
+            names.append(f'000{tube_id}' if i % 7 == 0 else tube_id)
+        return names + project['blanks']
+
+
+class LatencyQiitaClient():
+    """
+    A thread-safe stand-in for QiitaClient serving a set of SyntheticStudies
+    that sleeps for a fixed latency before answering each request.
+    """
+    def __init__(self, studies, uploads_path, latency):
+        self.latency = latency
+        self.lock = Lock()
+        self.fake_id = 1000
+        self.requests = 0
+        self._server_url = 'https://qiita.synthetic'
+
+        self.responses = {'/qiita_db/artifacts/types/':
+                          {'uploads': uploads_path}}
+        self.registered = {}
+
+        for project in studies.projects:
+            qid = project['qiita_id']
+            self.registered[qid] = [f'{qid}.{x}' for x in
+                                    list(project['samples']) +
+                                    project['registered_blanks']]
+            self.responses[f'/api/v1/study/{qid}/samples/info'] = {
+                'number-of-samples': len(self.registered[qid]),
+                'categories': SIF_COLUMNS[1:] + ['tube_id']}
+            self.responses[
+                f'/api/v1/study/{qid}/samples/categories=tube_id'] = {
+                'header': ['tube_id'],
+                'samples': {f'{qid}.{k}': [v] for k, v in
+                            project['samples'].items()}}
+
+    def _wait(self):
+        sleep(self.latency)
+        with self.lock:
+            self.requests += 1
+
+    def get(self, url):
+        self._wait()
+
+        if url.endswith('/samples') and url.startswith('/api/v1/study/'):
+            with self.lock:
+                return list(self.registered[url.split('/')[-2]])
+
+        return self.responses.get(url)
+
+    def post(self, url, data=None):
+        self._wait()
+
+        with self.lock:
+            self.fake_id += 1
+            if url == '/qiita_db/prep_template/':
+                return {'prep': self.fake_id}
+            elif url == '/qiita_db/artifact/':
+                return {'job_id': self.fake_id}
+
+        raise ValueError("Unsupported URL")
+
+    def http_patch(self, url, data=None):
+        self._wait()
+
+        with self.lock:
+            # register the new samples.
+            self.registered[url.split('/')[-2]] += list(loads(data))
+
+
+class SyntheticPipeline():
+    """
+    The parts of sequence_processing_pipeline's Pipeline used once
+    GenPrepFileJob has completed.
+    """
+    def __init__(self, studies, output_path, replicates):
+        self.studies = studies
+        self.output_path = output_path
+        self.replicates = replicates
+        self.run_id = RUN_ID
+        self.pipeline_type = ASSAY_NAME_METAGENOMIC
+
+    def get_project_info(self, short_names=False):
+        results = []
+        for project in self.studies.projects:
+            name = project['project_name']
+            if not short_names:
+                name = f"{name}_{project['qiita_id']}"
+            results.append({'project_name': name,
+                            'qiita_id': project['qiita_id'],
+                            'contains_replicates': self.replicates > 1})
+        return results
+
+    def generate_sample_info_files(self, addl_info=None):
+        # one file per project listing its BLANKs.
+        paths = []
+        for project in self.studies.projects:
+            path = join(self.output_path,
+                        f"{self.run_id}_{project['qiita_id']}_blanks.tsv")
+            with open(path, 'w') as f:
+                print('\t'.join(SIF_COLUMNS), file=f)
+                for blank in project['blanks']:
+                    print('\t'.join([blank, '2024-01-01', 'blank', 'Control',
+                                     'control blank', 'metagenome',
+                                     project['project_name']]), file=f)
+            paths.append(path)
+        return paths
+
+
+class SyntheticWorkflow(Workflow, Metagenomic):
+    """
+    A metagenomic Workflow operating on a SyntheticPipeline.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.qclient = kwargs['qclient']
+        self.pipeline = kwargs['pipeline']
+        self.lane_number = kwargs['lane_number']
+        self.master_qiita_job_id = kwargs['job_id']
+
+
+def write_file(path, size, block):
+    with open(path, 'wb') as f:
+        for i in range(0, size, len(block)):
+            f.write(block[:size - i])
+
+
+def generate_run(output_path, studies, replicates, lanes, file_size,
+                 prep_columns):
+    """
+    Writes the output of NuQCJob, FastQCJob and GenPrepFileJob for a
+    synthetic run.
+    :return: The number of fastq files written.
+    """
+    block = urandom(min(file_size, 1024 * 1024)) or b'\n'
+    fastq_files = 0
+    extra_columns = [f'column_{i}' for i in range(prep_columns)]
+
+    for job in ['ConvertJob', 'NuQCJob', 'FastQCJob', 'GenPrepFileJob']:
+        makedirs(join(output_path, job, 'logs'), exist_ok=True)
+    makedirs(join(output_path, 'ConvertJob', 'Reports'), exist_ok=True)
+    makedirs(join(output_path, 'FastQCJob', 'fastqc'), exist_ok=True)
+    makedirs(join(output_path, 'FastQCJob', 'multiqc'), exist_ok=True)
+    write_file(join(output_path, 'FastQCJob', 'multiqc',
+                    'multiqc_report.html'), 64 * 1024, block)
+
+    for project in studies.projects:
+        name = f"{project['project_name']}_{project['qiita_id']}"
+        nuqc_path = join(output_path, 'NuQCJob', name)
+        fastq_path = join(nuqc_path, 'filtered_sequences')
+        for sub_dir in ['html', 'json']:
+            makedirs(join(nuqc_path, 'fastp_reports_dir', sub_dir),
+                     exist_ok=True)
+        makedirs(fastq_path, exist_ok=True)
+
+        sheet_names = studies.get_sheet_names(project)
+
+        for lane in range(1, lanes + 1):
+            for job in ['ConvertJob', 'NuQCJob', 'FastQCJob',
+                        'GenPrepFileJob']:
+                write_file(join(output_path, job, 'logs',
+                                f'{name}_{lane}.log'), 16 * 1024, block)
+
+            for replicate in range(1, replicates + 1):
+                rows = []
+                for n, sample_name in enumerate(sheet_names):
+                    well = f'{replicate}{n % 96}' if replicates > 1 else 'A'
+                    run_prefix = f'{sample_name}_{well}_S{n + 1}_L{lane:03d}'
+                    rows.append([sample_name, run_prefix, 'ACGTACGT',
+                                 project['project_name'], str(lane)] +
+                                [f'{run_prefix}_{x}' for x in extra_columns])
+
+                    for read in ['R1', 'R2']:
+                        file_name = f'{run_prefix}_{read}_001'
+                        write_file(join(fastq_path,
+                                        f'{file_name}.trimmed.fastq.gz'),
+                                   file_size, block)
+                        write_file(join(output_path, 'FastQCJob', 'fastqc',
+                                        f'{file_name}_fastqc.html'),
+                                   4 * 1024, block)
+                        fastq_files += 1
+
+                    for sub_dir in ['html', 'json']:
+                        write_file(join(nuqc_path, 'fastp_reports_dir',
+                                        sub_dir, f'{run_prefix}.{sub_dir}'),
+                                   4 * 1024, block)
+
+                # replicates are written to numbered sub-directories.
+                prep_path = join(output_path, 'GenPrepFileJob', 'PrepFiles')
+                if replicates > 1:
+                    prep_path = join(prep_path, str(replicate))
+                makedirs(prep_path, exist_ok=True)
+
+                with open(join(prep_path, f'{RUN_ID}.{name}.{lane}.tsv'),
+                          'w') as f:
+                    print('\t'.join(['sample_name', 'run_prefix', 'barcode',
+                                     'project_name', 'lane'] +
+                                    extra_columns), file=f)
+                    for row in rows:
+                        print('\t'.join(row), file=f)
+
+    return fastq_files
+
+
+def run_once(parameters, config_fp, latency):
+    with TemporaryDirectory() as tmp:
+        output_path = join(tmp, 'output')
+        studies = SyntheticStudies(parameters['projects'],
+                                   parameters['samples'])
+        fastq_files = generate_run(output_path, studies,
+                                   parameters['replicates'],
+                                   parameters['lanes'],
+                                   parameters['file_size'],
+                                   parameters['prep_columns'])
+
+        qclient = LatencyQiitaClient(studies, join(tmp, 'uploads'), latency)
+        workflow = SyntheticWorkflow(
+            qclient=qclient,
+            pipeline=SyntheticPipeline(studies, output_path,
+                                       parameters['replicates']),
+            lane_number=1,
+            job_id='synthetic-job-id',
+            config_fp=config_fp)
+
+        # requests made by worker threads aren't attributed to a stage by
+        # StageTimer, hence they are counted by the client.
+        requests = {}
+        for name, func in STAGES:
+            before = qclient.requests
+            with workflow.stage_timer.stage(name):
+                func(workflow)
+            requests[name] = qclient.requests - before
+
+            # as run_steps() does once a step completes.
+            workflow.get_output_index().invalidate(output_path,
+                                                   recursive=False)
+
+        stages = {x['name']: x for x in
+                  workflow.stage_timer.to_dict()['stages']}
+        for name in stages:
+            stages[name]['qiita_requests'] = requests[name]
+
+        return fastq_files, stages
+
+
+def get_commit():
+    proc = run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+               text=True, cwd=dirname(abspath(__file__)))
+    return proc.stdout.strip() if proc.returncode == 0 else None
+
+
+def compare(results, baseline_path, max_regression):
+    with open(baseline_path, 'r') as f:
+        baseline = load(f)
+
+    if baseline['parameters'] != results['parameters']:
+        raise click.ClickException(f"{baseline_path} was run w/different "
+                                   f"parameters: {baseline['parameters']}")
+
+    click.echo(f"\ncompared to {baseline.get('commit')}:")
+
+    regressions = []
+    for name, _ in STAGES:
+        before = baseline['stages'][name]['best']
+        after = results['stages'][name]['best']
+        change = (after - before) / before if before else 0.0
+        click.echo(f'{name:>16}: {before:>9.3f}s -> {after:>9.3f}s '
+                   f'({change:+.1%})')
+        if max_regression is not None and change > max_regression:
+            regressions.append(name)
+
+    return regressions
+
+
+@click.command()
+@click.option('--projects', default=4, show_default=True,
+              help='Number of projects in the run.')
+@click.option('--samples', default=96, show_default=True,
+              help='Number of samples in each project, including BLANKs.')
+@click.option('--replicates', default=1, show_default=True,
+              help='Number of replicates of each sample.')
+@click.option('--lanes', default=1, show_default=True,
+              help='Number of lanes.')
+@click.option('--file-size', default=64 * 1024, show_default=True,
+              help='Size of each fastq file in bytes.')
+@click.option('--prep-columns', default=30, show_default=True,
+              help='Number of additional columns in each prep-info file.')
+@click.option('--latency', default=0.02, show_default=True,
+              help='Seconds added to each Qiita request.')
+@click.option('--repeat', default=3, show_default=True,
+              help='Number of timed runs.')
+@click.option('--config-fp', default=None,
+              type=click.Path(exists=True, dir_okay=False),
+              help='A KLP config file w/optional settings e.g. pool sizes.')
+@click.option('--output', default=None, type=click.Path(dir_okay=False),
+              help='Write the results to this JSON file.')
+@click.option('--baseline', default=None,
+              type=click.Path(exists=True, dir_okay=False),
+              help='Compare the results against an earlier --output.')
+@click.option('--max-regression', default=None, type=float,
+              help='Fail if a stage is slower than the baseline by more '
+                   'than this fraction e.g. 0.2.')
+def benchmark(projects, samples, replicates, lanes, file_size, prep_columns,
+              latency, repeat, config_fp, output, baseline, max_regression):
+    # latency is a parameter, as it dominates the stages that talk to Qiita.
+    parameters = {'projects': projects, 'samples': samples,
+                  'replicates': replicates, 'lanes': lanes,
+                  'file_size': file_size, 'prep_columns': prep_columns,
+                  'latency': latency}
+
+    runs = []
+    for i in range(repeat):
+        fastq_files, stages = run_once(parameters, config_fp, latency)
+        runs.append(stages)
+
+    click.echo(f'{projects} projects x {samples} samples x {replicates} '
+               f'replicates x {lanes} lanes: {fastq_files} fastq files')
+    click.echo(f"{'stage':>16}  {'best':>9}  {'median':>9}  {'cpu':>9}  "
+               f"{'requests':>8}")
+
+    results = {'commit': get_commit(),
+               'python': platform.python_version(),
+               'parameters': parameters,
+               'stages': {}}
+
+    for name, _ in STAGES:
+        wall = [x[name]['wall_time'] for x in runs]
+        cpu = [x[name]['cpu_time'] for x in runs]
+        results['stages'][name] = {
+            'best': min(wall),
+            'median': median(wall),
+            'cpu_median': median(cpu),
+            'qiita_requests': runs[0][name]['qiita_requests']}
+
+        stage = results['stages'][name]
+        click.echo(f"{name:>16}  {stage['best']:>8.3f}s  "
+                   f"{stage['median']:>8.3f}s  {stage['cpu_median']:>8.3f}s  "
+                   f"{stage['qiita_requests']:>8}")
+
+    total = sum(x['best'] for x in results['stages'].values())
+    click.echo(f"{'total':>16}  {total:>8.3f}s")
+
+    if output is not None:
+        with open(output, 'w') as f:
+            f.write(dumps(results, indent=2))
+
+    if baseline is not None:
+        regressions = compare(results, baseline, max_regression)
+        if regressions:
+            click.echo(f"stages slower than the baseline by more than "
+                       f"{max_regression:.0%}: {', '.join(regressions)}",
+                       err=True)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+
+# Memory and time benchmark for encoding the 'prep_info' payload posted to
+# Qiita. Compares PrepInfoEncoder against the original pandas path
+# (read_csv -> set_index -> to_dict('index') -> json.dumps) on a synthetic
+# wide prep-info file and confirms the payloads are identical.
+
+from json import dumps
+from os.path import join
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import tracemalloc
+import click
+import pandas as pd
+from qp_klp.PrepInfoEncoder import PrepInfoEncoder
+
+
+def encode_w_pandas(prep_file_path):
+    # the original implementation, kept here as a reference.
+    metadata = pd.read_csv(prep_file_path, dtype=str, delimiter='\t',
+                           index_col=False)
+    metadata.set_index('sample_name', inplace=True)
+    metadata = metadata.to_dict('index')
+    run_prefixes = [metadata[sample]['run_prefix'] for sample in metadata]
+    return dumps(metadata), run_prefixes
+
+
+def encode_w_encoder(prep_file_path):
+    encoder = PrepInfoEncoder(prep_file_path)
+    prep_info = encoder.encode(collect=['run_prefix'])
+    return prep_info, encoder.collected['run_prefix']
+
+
+def generate_prep(path, rows, columns):
+    # every eleventh value is empty, as in real prep-info files.
+    header = ['sample_name', 'run_prefix'] + [f'column_{i}' for i in
+                                              range(columns - 2)]
+    with open(path, 'w') as f:
+        f.write('\t'.join(header) + '\n')
+        for i in range(rows):
+            values = [f'sample.{i}', f'sample_{i}_S{i}_L001']
+            values += ['' if (i + j) % 11 == 0 else f'value_{i}_{j}' for j
+                       in range(columns - 2)]
+            f.write('\t'.join(values) + '\n')
+
+
+def measure(func, path):
+    tracemalloc.start()
+    start = perf_counter()
+    result = func(path)
+    elapsed = perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+@click.command()
+@click.option('--rows', default=20000, show_default=True,
+              help='Number of samples in the synthetic prep-info file.')
+@click.option('--columns', default=60, show_default=True,
+              help='Number of columns in the synthetic prep-info file.')
+def benchmark(rows, columns):
+    with TemporaryDirectory() as tmp:
+        path = join(tmp, 'prep.tsv')
+        generate_prep(path, rows, columns)
+
+        results = {}
+        for name, func in [('pandas', encode_w_pandas),
+                           ('encoder', encode_w_encoder)]:
+            results[name], elapsed, peak = measure(func, path)
+            click.echo(f'{name:>8}: {elapsed:.3f}s, peak memory: '
+                       f'{peak / 1024 / 1024:.1f} MiB')
+
+        # NaN != NaN, hence run_prefixes are compared as strings.
+        identical = (results['pandas'][0] == results['encoder'][0] and
+                     str(results['pandas'][1]) == str(results['encoder'][1]))
+        click.echo(f'payloads identical: {identical}')
+
+
+if __name__ == '__main__':
+    benchmark()
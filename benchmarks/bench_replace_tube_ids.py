@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+
+# Micro-benchmark for Assay._replace_tube_ids_w_sample_names(). Compares the
+# current implementation against the original row-by-row implementation on
+# synthetic prep-info files and confirms the output is byte-identical.
+
+from os.path import join
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import click
+import pandas as pd
+from qp_klp.Assays import Assay
+
+
+def replace_tube_ids_row_by_row(prep_file_path, tube_id_map):
+    # the original implementation, kept here as a reference.
+    reversed_map = {tube_id_map[k]: k for k in tube_id_map}
+    df = pd.read_csv(prep_file_path, sep='\t', dtype=str, index_col=False)
+    df['old_sample_name'] = df['sample_name']
+    for i in df.index:
+        sample_name = df.at[i, "sample_name"]
+        if sample_name.startswith('BLANK'):
+            continue
+        sample_name = sample_name.lstrip('0')
+        if sample_name in reversed_map:
+            df.at[i, "sample_name"] = reversed_map[sample_name]
+    df.to_csv(prep_file_path, index=False, sep="\t")
+
+
+def generate_prep(path, rows):
+    # every tenth sample is a BLANK, every seventh tube-id has leading
+    # zeroes and every thirteenth sample isn't registered in Qiita.
+    tube_id_map = {}
+    lines = ['sample_name\trun_prefix\tbarcode\tproject_name']
+
+    for i in range(rows):
+        if i % 10 == 0:
+            name = f'BLANK.{i}.1A'
+        else:
+            tube_id = f'{i:010d}'
+            name = f'000{tube_id}' if i % 7 == 0 else tube_id
+            if i % 13 != 0:
+                tube_id_map[f'sample.{i}'] = tube_id.lstrip('0')
+        lines.append(f'{name}\t{name}_S{i}_L001\tACGT\tProject_1')
+
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+    return tube_id_map
+
+
+@click.command()
+@click.option('--rows', default=50000, show_default=True,
+              help='Number of rows in each synthetic prep-info file.')
+@click.option('--repeat', default=3, show_default=True,
+              help='Number of timed runs of each implementation.')
+def benchmark(rows, repeat):
+    with TemporaryDirectory() as tmp:
+        results = {}
+        for name, func in [('row-by-row', replace_tube_ids_row_by_row),
+                           ('vectorized',
+                            Assay._replace_tube_ids_w_sample_names)]:
+            timings = []
+            for i in range(repeat):
+                path = join(tmp, f'{name}.tsv')
+                tube_id_map = generate_prep(path, rows)
+                start = perf_counter()
+                func(path, tube_id_map)
+                timings.append(perf_counter() - start)
+
+            with open(path, 'rb') as f:
+                results[name] = f.read()
+
+            click.echo(f'{name:>12}: best of {repeat}: {min(timings):.3f}s')
+
+        identical = results['row-by-row'] == results['vectorized']
+        click.echo(f'output byte-identical: {identical}')
+
+
+if __name__ == '__main__':
+    benchmark()
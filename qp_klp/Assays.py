@@ -1,14 +1,15 @@
-from os import listdir, makedirs
-from os.path import isfile
-from shutil import copyfile
+from os import makedirs
 from sequence_processing_pipeline.NuQCJob import NuQCJob
 from sequence_processing_pipeline.FastQCJob import FastQCJob
 from sequence_processing_pipeline.GenPrepFileJob import GenPrepFileJob
 from os.path import join
 import pandas as pd
-from json import dumps
+from .PrepInfoEncoder import PrepInfoEncoder
 from collections import defaultdict
-from os.path import basename, dirname
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from .RunPrefixIndex import RunPrefixIndex
+from os.path import basename, dirname, exists, getsize
 
 
 ASSAY_NAME_NONE = "Assay"
@@ -52,23 +53,38 @@ class Assay():
         df = pd.read_csv(prep_file_path, sep='\t', dtype=str, index_col=False)
         # save copy of sample_name column as 'old_sample_name'
         df['old_sample_name'] = df['sample_name']
-        for i in df.index:
-            sample_name = df.at[i, "sample_name"]
-            # blanks do not get their names swapped.
-            if sample_name.startswith('BLANK'):
-                continue
 
-            # remove leading zeroes if they exist to match Qiita results.
-            sample_name = sample_name.lstrip('0')
+        sample_names = df['sample_name']
+
+        # remove leading zeroes if they exist to match Qiita results.
+        remapped = sample_names.str.lstrip('0').map(reversed_map)
 
-            if sample_name in reversed_map:
-                df.at[i, "sample_name"] = reversed_map[sample_name]
+        # blanks do not get their names swapped. Neither do names that
+        # aren't tube-ids.
+        to_replace = (~sample_names.str.startswith('BLANK', na=False) &
+                      remapped.notna())
+
+        df.loc[to_replace, 'sample_name'] = remapped[to_replace]
 
         df.to_csv(prep_file_path, index=False, sep="\t")
 
+    @classmethod
+    def _get_project_qid(cls, prep_file_path):
+        """
+        Helper method for overwrite_prep_files().
+        :param prep_file_path: The path to a generated prep-info file.
+        :return: The project-name and qiita-id segment of the file's name.
+        """
+        # prep files are named in the following form:
+        # 20220423_FS10001773_12_BRB11603-0615.Matrix_Tube_LBM_14332.1.tsv
+        # where the second segment is '<project-name>_<qiita-id>'.
+        return basename(prep_file_path).split('.')[1]
+
     def overwrite_prep_files(self, prep_file_paths):
         """
         Replace tube-ids in prep-info files w/sample-names.
+        A prep-info file belongs to a project when the second '.'-separated
+        segment of its file name is '<project-name>_<qiita-id>'.
         :param prep_file_paths: A list of generated prep-info files.
         :return: None
         """
@@ -76,28 +92,74 @@ class Assay():
         if self.tube_id_map is None:
             raise ValueError("get_tube_ids_from_qiita() was not called")
 
+        # index the prep files by project_qid in a single pass, rather than
+        # searching the entire list once for each project. A file matches a
+        # project only if its project_qid is exactly
+        # '<project-name>_<qiita-id>', so that e.g. project 'LBM_1433' does
+        # not match the prep files of project 'LBM_14332'.
+        files_by_project = defaultdict(list)
+        for prep_file in prep_file_paths:
+            files_by_project[Assay._get_project_qid(prep_file)].append(
+                prep_file)
+
         projects = self.pipeline.get_project_info(short_names=True)
 
+        tasks = []
         for project in projects:
-            project_name = project['project_name']
             qiita_id = str(project['qiita_id'])
 
             if qiita_id not in self.tube_id_map:
                 continue
 
-            # prep files are named in the following form:
-            # 20220423_FS10001773_12_BRB11603-0615.Matrix_Tube_LBM_14332.1.tsv
-            fqp_name = "%s_%s" % (project_name, qiita_id)
-            matching_files = [prep_file for prep_file in prep_file_paths if
-                              fqp_name in prep_file]
+            fqp_name = "%s_%s" % (project['project_name'], qiita_id)
 
-            if len(matching_files) == 0:
-                continue
+            for matching_file in files_by_project[fqp_name]:
+                tasks.append((matching_file, self.tube_id_map[qiita_id]))
+
+        # each prep file is rewritten independently of the others.
+        workers = self._get_prep_pool_size([x for x, _ in tasks])
+
+        if workers > 1:
+            # workers are spawned rather than forked, as this may be called
+            # while other threads hold locks that a forked child would copy.
+            with ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=get_context('spawn')) as executor:
+                futures = [executor.submit(
+                    Assay._replace_tube_ids_w_sample_names, *task)
+                    for task in tasks]
+
+                for future in futures:
+                    # re-raise any Error encountered by a worker.
+                    future.result()
+        else:
+            for task in tasks:
+                Assay._replace_tube_ids_w_sample_names(*task)
+
+    def _get_prep_pool_size(self, prep_file_paths):
+        """
+        Returns the number of processes used to work on prep-info files.
+        Each process must import pandas and metapool before it can begin,
+        hence fewer than 'process_pool_min_files' files, or fewer than
+        'process_pool_min_bytes' bytes of files, are processed serially.
+        :param prep_file_paths: A list of prep-info files.
+        :return: The number of processes. 1 if the files should be
+        processed in the calling process.
+        """
+        min_files = int(self.get_klp_config_value('process_pool_min_files',
+                                                  8))
+        min_bytes = int(self.get_klp_config_value('process_pool_min_bytes',
+                                                  32 * 1024 * 1024))
 
-            for matching_file in matching_files:
-                Assay._replace_tube_ids_w_sample_names(matching_file,
-                                                       self.tube_id_map[
-                                                           qiita_id])
+        if len(prep_file_paths) < min_files:
+            return 1
+
+        if sum(getsize(x) for x in prep_file_paths if exists(x)) < min_bytes:
+            return 1
+
+        # the plugin's host is shared, so few processes are used by default.
+        return max(1, min(len(prep_file_paths), int(
+            self.get_klp_config_value('process_pool_size', 4))))
 
     @classmethod
     def _parse_prep_file(cls, prep_file_path, convert_to_dict=True):
@@ -124,6 +186,151 @@ class Assay():
         else:
             return metadata
 
+    @classmethod
+    def _encode_prep_file(cls, prep_file_path, collect):
+        """
+        Helper method for update_prep_templates().
+        :param prep_file_path: The path to a generated prep-info file.
+        :param collect: A list of the names of columns to return.
+        :return: The prep_info JSON, the file's columns and a dict of the
+        values of the collected columns.
+        """
+        encoder = PrepInfoEncoder(prep_file_path)
+        prep_info = encoder.encode(collect=collect)
+        return prep_info, encoder.columns, encoder.collected
+
+    def _encode_prep_files(self, prep_file_paths, collect):
+        """
+        Helper method for update_prep_templates().
+        :param prep_file_paths: A list of generated prep-info files.
+        :param collect: A list of the names of columns to return.
+        :return: A list of _encode_prep_file() results, in the same order as
+        prep_file_paths.
+        """
+        workers = self._get_prep_pool_size(prep_file_paths)
+
+        results = []
+        failures = []
+
+        if workers > 1:
+            # spawned rather than forked; see overwrite_prep_files().
+            with ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=get_context('spawn')) as executor:
+                futures = [executor.submit(Assay._encode_prep_file, x,
+                                           collect)
+                           for x in prep_file_paths]
+
+                for prep_fp, future in zip(prep_file_paths, futures):
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        failures.append(f'{prep_fp}: {e}')
+        else:
+            for prep_fp in prep_file_paths:
+                try:
+                    results.append(Assay._encode_prep_file(prep_fp, collect))
+                except Exception as e:
+                    failures.append(f'{prep_fp}: {e}')
+
+        if failures:
+            raise ValueError(f"{len(failures)} of {len(prep_file_paths)} "
+                             "prep-info files could not be read:\n" +
+                             '\n'.join(failures))
+
+        return results
+
+    def _post_prep_template(self, data):
+        """
+        Helper method for update_prep_templates().
+        :param data: The prep-template to register.
+        :return: The new prep-id.
+        """
+        # since all Assays are mixins for Workflows, assume self.qclient
+        # exists and available.
+        reply = self.qclient.post('/qiita_db/prep_template/', data=data)
+        return reply['prep']
+
+    def _register_prep_templates(self, get_data_type, collect=()):
+        """
+        Helper method for update_prep_templates(). Prep-info files are
+        encoded in a pool of processes and registered in Qiita concurrently.
+        :param get_data_type: A callable taking a file's columns and
+        collected values and returning its data_type.
+        :param collect: A list of the names of columns get_data_type needs.
+        :return: A dict of lists of prep-ids, keyed by study-id.
+        """
+        prep_files = [(study_id, prep_fp) for study_id in
+                      self.prep_file_paths for prep_fp in
+                      self.prep_file_paths[study_id]]
+
+        encoded = self._encode_prep_files([x for _, x in prep_files],
+                                          ['run_prefix'] + list(collect))
+
+        # all files are validated before any prep is registered.
+        tasks = []
+        labels = []
+        names = []
+        for (study_id, prep_fp), (prep_info, columns, collected) in zip(
+                prep_files, encoded):
+            afact_name, is_repl = self._generate_artifact_name(prep_fp)
+            names.append((afact_name, is_repl))
+            labels.append(f'{basename(prep_fp)} (study {study_id})')
+            tasks.append(({'prep_info': prep_info,
+                           'study': study_id,
+                           'data_type': get_data_type(columns, collected),
+                           'job-id': self.master_qiita_job_id,
+                           'name': afact_name},))
+
+        # a POST that failed may still have registered a prep, hence POSTs
+        # are not retried.
+        runner = self.get_qiita_task_runner(idempotent=False)
+
+        try:
+            prep_ids = runner.run(self._post_prep_template, tasks, labels)
+        except ValueError as e:
+            registered = [f'{label}: prep {prep_id}' for label, prep_id in
+                          zip(labels, runner.results) if prep_id is not None]
+            if not registered:
+                raise e
+            raise ValueError(f"{e}\nThe following preps were registered "
+                             "and may need to be removed:\n" +
+                             '\n'.join(registered))
+
+        # results are assembled in the same order as prep_file_paths.
+        results = defaultdict(list)
+        for i, (study_id, _) in enumerate(prep_files):
+            afact_name, is_repl = names[i]
+            results[study_id].append((prep_ids[i], afact_name, is_repl))
+            self.run_prefixes[prep_ids[i]] = encoded[i][2]['run_prefix']
+
+        self.touched_studies_prep_info = results
+        return results
+
+    def _load_preps_concurrently(self, tasks):
+        """
+        Helper method for load_preps_into_qiita().
+        :param tasks: A list of argument tuples for _load_prep_into_qiita().
+        :return: A DataFrame() summarizing the loaded preps.
+        """
+        labels = [f'prep {prep_id} ({project})' for
+                  _, prep_id, _, _, project, _, _ in tasks]
+
+        # results are returned in the same order as tasks, hence the order
+        # of rows in touched_studies.html is deterministic. A POST that
+        # failed may still have created an artifact, hence POSTs are not
+        # retried.
+        runner = self.get_qiita_task_runner(idempotent=False)
+        data = runner.run(self._load_prep_into_qiita, tasks, labels=labels)
+
+        df = pd.DataFrame(data)
+        opath = join(self.pipeline.output_path, 'touched_studies.html')
+        with open(opath, 'w') as f:
+            f.write(df.to_html(border=2, index=False, justify="left",
+                               render_links=True, escape=False))
+
+        return df
+
     def _generate_artifact_name(self, prep_file_path):
         """
         Helper method for update_prep_templates().
@@ -164,6 +371,25 @@ class Amplicon(Assay):
 
         projects = [x['project_name'] for x in projects]
 
+        # get list of all raw output files once, before any project
+        # directories are created.
+        contents = self.get_output_index().listdir(self.raw_fastq_files_path)
+        if contents is None:
+            raise ValueError(f"{self.raw_fastq_files_path} does not exist")
+
+        job_output = [join(self.raw_fastq_files_path, x) for x in
+                      contents[1] if x.endswith('fastq.gz')]
+
+        # NB: In this case, ensure the ONLY files that get copied into the
+        # faked NuQCJob output are Undetermined files, and this is what we
+        # expect for 16S runs.
+        undetermined = [x for x in job_output if
+                        basename(x).startswith('Undetermined')]
+        determined = [x for x in job_output if
+                      not basename(x).startswith('Undetermined')]
+
+        pairs = []
+
         for project_name in projects:
             # copy the files from ConvertJob output to faked NuQCJob output
             # folder: $WKDIR/$RUN_ID/NuQCJob/$PROJ_NAME/amplicon
@@ -179,22 +405,8 @@ class Amplicon(Assay):
 
             makedirs(output_folder)
 
-            # get list of all raw output files to be copied.
-            job_output = [join(self.raw_fastq_files_path, x) for x in
-                          listdir(self.raw_fastq_files_path)]
-
-            job_output = [x for x in job_output if isfile(x)]
-            job_output = [x for x in job_output if x.endswith('fastq.gz')]
-
-            # NB: In this case, ensure the ONLY files that get copied are
-            # Undetermined files, and this is what we expect for 16S runs.
-            job_output = [x for x in job_output if
-                          basename(x).startswith('Undetermined')]
-
-            # copy the file
-            for fastq_file in job_output:
-                new_path = join(output_folder, basename(fastq_file))
-                copyfile(fastq_file, new_path)
+            pairs += [(x, join(output_folder, basename(x))) for x in
+                      undetermined]
 
             # FastQC expects the ConvertJob output to also be organized by
             # project. Since this would entail running the same ConvertJob
@@ -205,14 +417,14 @@ class Amplicon(Assay):
             output_folder = join(self.raw_fastq_files_path, project_name)
             makedirs(output_folder)
 
-            job_output = [join(self.raw_fastq_files_path, x) for x in
-                          listdir(self.raw_fastq_files_path)]
-            job_output = [x for x in job_output if isfile(x) and x.endswith(
-                'fastq.gz') and not basename(x).startswith('Undetermined')]
+            pairs += [(x, join(output_folder, basename(x))) for x in
+                      determined]
 
-            for raw_fastq_file in job_output:
-                new_path = join(output_folder, basename(raw_fastq_file))
-                copyfile(raw_fastq_file, new_path)
+        # the per-project views are hard-linked rather than copied, and are
+        # created in parallel. They are loaded into Qiita, so they are never
+        # symlinks, regardless of configuration.
+        self.get_file_stager().stage(pairs, allow_symlinks=False)
+        self.get_output_index().invalidate(self.raw_fastq_files_path)
 
     def generate_reports(self):
         config = self.pipeline.get_software_configuration('fastqc')
@@ -267,44 +479,26 @@ class Amplicon(Assay):
         Update prep-template info in Qiita. Get dict of prep-ids by study-id.
         :return: A dict of lists of prep-ids, keyed by study-id.
         """
-        results = defaultdict(list)
+        def get_data_type(columns, collected):
+            if 'target_gene' not in columns:
+                raise ValueError("target_gene must be specified for "
+                                 "amplicon type")
 
-        for study_id in self.prep_file_paths:
-            for prep_fp in self.prep_file_paths[study_id]:
-                metadata = Assay._parse_prep_file(prep_fp)
-                afact_name, is_repl = self._generate_artifact_name(prep_fp)
-                data = {'prep_info': dumps(metadata),
-                        'study': study_id,
-                        'data_type': None,
-                        'job-id': self.master_qiita_job_id,
-                        'name': afact_name}
-
-                if 'target_gene' in metadata[list(metadata.keys())[0]]:
-                    tg = metadata[list(metadata.keys())[0]]['target_gene']
-                    for key in Amplicon.AMPLICON_SUB_TYPES:
-                        if key in tg:
-                            data['data_type'] = key
-
-                    if data['data_type'] is None:
-                        raise ValueError("data_type could not be "
-                                         "determined from target_gene "
-                                         "column")
-                else:
-                    raise ValueError("target_gene must be specified for "
-                                     "amplicon type")
+            tg = collected['target_gene'][0]
+            for key in Amplicon.AMPLICON_SUB_TYPES:
+                if key in tg:
+                    return key
 
-                reply = self.qclient.post('/qiita_db/prep_template/',
-                                          data=data)
-                prep_id = reply['prep']
-                results[study_id].append((prep_id, afact_name, is_repl))
-                self.run_prefixes[prep_id] = [metadata[sample]['run_prefix']
-                                              for sample in metadata]
+            raise ValueError("data_type could not be determined from "
+                             "target_gene column")
 
-        self.touched_studies_prep_info = results
-        return results
+        return self._register_prep_templates(get_data_type,
+                                             collect=['target_gene'])
 
     def load_preps_into_qiita(self):
-        data = []
+        # working sets are assembled serially because _copy_files() is not
+        # thread-safe. Only the requests to Qiita are issued concurrently.
+        tasks = []
         for project, _, qiita_id in self.special_map:
             fastq_files = self._get_postqc_fastq_files(
                 self.pipeline.output_path, project)
@@ -325,17 +519,11 @@ class Amplicon(Assay):
                 else:
                     working_set = fastq_files
 
-                data.append(self._load_prep_into_qiita(
-                    self.qclient, prep_id, artifact_name, qiita_id, project,
-                    working_set, ARTIFACT_TYPE_AMPLICON))
+                tasks.append((self.qclient, prep_id, artifact_name,
+                              qiita_id, project, working_set,
+                              ARTIFACT_TYPE_AMPLICON))
 
-        df = pd.DataFrame(data)
-        opath = join(self.pipeline.output_path, 'touched_studies.html')
-        with open(opath, 'w') as f:
-            f.write(df.to_html(border=2, index=False, justify="left",
-                               render_links=True, escape=False))
-
-        return df
+        return self._load_preps_concurrently(tasks)
 
 
 class MetaOmic(Assay):
@@ -346,36 +534,48 @@ class MetaOmic(Assay):
     # MetaOmic does not have an assay_type of its own. It is defined by its
     # children.
 
-    def quality_control(self):
+    def _get_nuqc_job(self, fastq_root_dir, output_path):
         # because this is a mixin, assume containing object will contain
         # a pipeline object.
         config = self.pipeline.get_software_configuration('nu-qc')
 
         # base quality control used by multiple Assay types.
-        job = NuQCJob(self.raw_fastq_files_path,
-                      self.pipeline.output_path,
-                      self.pipeline.sample_sheet.path,
-                      config['minimap2_databases'],
-                      config['queue'],
-                      config['nodes'],
-                      config['wallclock_time_in_minutes'],
-                      config['job_total_memory_limit'],
-                      config['fastp_executable_path'],
-                      config['minimap2_executable_path'],
-                      config['samtools_executable_path'],
-                      config['modules_to_load'],
-                      self.master_qiita_job_id,
-                      config['job_max_array_length'],
-                      config['known_adapters_path'],
-                      config['movi_executable_path'],
-                      config['gres_value'],
-                      config['pmls_path'],
-                      config['additional_fastq_tags'],
-                      bucket_size=config['bucket_size'],
-                      length_limit=config['length_limit'],
-                      cores_per_task=config['cores_per_task'])
-
-        if 'NuQCJob' not in self.skip_steps:
+        return NuQCJob(fastq_root_dir,
+                       output_path,
+                       self.pipeline.sample_sheet.path,
+                       config['minimap2_databases'],
+                       config['queue'],
+                       config['nodes'],
+                       config['wallclock_time_in_minutes'],
+                       config['job_total_memory_limit'],
+                       config['fastp_executable_path'],
+                       config['minimap2_executable_path'],
+                       config['samtools_executable_path'],
+                       config['modules_to_load'],
+                       self.master_qiita_job_id,
+                       config['job_max_array_length'],
+                       config['known_adapters_path'],
+                       config['movi_executable_path'],
+                       config['gres_value'],
+                       config['pmls_path'],
+                       config['additional_fastq_tags'],
+                       bucket_size=config['bucket_size'],
+                       length_limit=config['length_limit'],
+                       cores_per_task=config['cores_per_task'])
+
+    def quality_control(self):
+        job = self._get_nuqc_job(self.raw_fastq_files_path,
+                                 self.pipeline.output_path)
+
+        if 'NuQCJob' in self.resume_steps:
+            # a previous attempt was interrupted. process only the samples
+            # w/out output.
+            self.rerun_failed_samples(
+                job,
+                lambda inputs, output_path: self._get_nuqc_job(inputs[0],
+                                                               output_path),
+                [self.raw_fastq_files_path])
+        elif 'NuQCJob' not in self.skip_steps:
             job.run(callback=self.job_callback)
 
         # audit the results to determine which samples failed to convert
@@ -386,25 +586,31 @@ class MetaOmic(Assay):
             self.fsr.write(failed_samples, job.__class__.__name__)
         return failed_samples
 
-    def generate_reports(self):
+    def _get_fastqc_job(self, raw_fastq_files_path,
+                        processed_fastq_files_path, output_path):
         config = self.pipeline.get_software_configuration('fastqc')
-        job = FastQCJob(self.pipeline.run_dir,
-                        self.pipeline.output_path,
-                        self.raw_fastq_files_path,
-                        join(self.pipeline.output_path, 'NuQCJob'),
-                        config['nprocs'],
-                        config['nthreads'],
-                        config['fastqc_executable_path'],
-                        config['modules_to_load'],
-                        self.master_qiita_job_id,
-                        config['queue'],
-                        config['nodes'],
-                        config['wallclock_time_in_minutes'],
-                        config['job_total_memory_limit'],
-                        config['job_pool_size'],
-                        config['multiqc_config_file_path'],
-                        config['job_max_array_length'],
-                        False)
+        return FastQCJob(self.pipeline.run_dir,
+                         output_path,
+                         raw_fastq_files_path,
+                         processed_fastq_files_path,
+                         config['nprocs'],
+                         config['nthreads'],
+                         config['fastqc_executable_path'],
+                         config['modules_to_load'],
+                         self.master_qiita_job_id,
+                         config['queue'],
+                         config['nodes'],
+                         config['wallclock_time_in_minutes'],
+                         config['job_total_memory_limit'],
+                         config['job_pool_size'],
+                         config['multiqc_config_file_path'],
+                         config['job_max_array_length'],
+                         False)
+
+    def generate_reports(self):
+        job = self._get_fastqc_job(self.raw_fastq_files_path,
+                                   join(self.pipeline.output_path, 'NuQCJob'),
+                                   self.pipeline.output_path)
 
         if 'FastQCJob' not in self.skip_steps:
             job.run(callback=self.job_callback)
@@ -443,62 +649,39 @@ class MetaOmic(Assay):
         Update prep-template info in Qiita. Get dict of prep-ids by study-id.
         :return: A dict of lists of prep-ids, keyed by study-id.
         """
-        results = defaultdict(list)
-
-        for study_id in self.prep_file_paths:
-            for prep_fp in self.prep_file_paths[study_id]:
-                metadata = Assay._parse_prep_file(prep_fp)
-                afact_name, is_repl = self._generate_artifact_name(prep_fp)
-                data = {'prep_info': dumps(metadata),
-                        'study': study_id,
-                        'job-id': self.master_qiita_job_id,
-                        'name': afact_name,
-                        'data_type': self.pipeline.pipeline_type}
-
-                # since all Assays are mixins for Workflows, assume
-                # self.qclient exists and available.
-                reply = self.qclient.post('/qiita_db/prep_template/',
-                                          data=data)
-                prep_id = reply['prep']
-                results[study_id].append((prep_id, afact_name, is_repl))
-                self.run_prefixes[prep_id] = [metadata[sample]['run_prefix']
-                                              for sample in metadata]
-
-        self.touched_studies_prep_info = results
-        return results
+        return self._register_prep_templates(
+            lambda columns, collected: self.pipeline.pipeline_type)
 
     def load_preps_into_qiita(self):
-        data = []
+        # working sets are assembled serially because _copy_files() is not
+        # thread-safe. Only the requests to Qiita are issued concurrently.
+        tasks = []
         for project, _, qiita_id in self.special_map:
             fastq_files = self._get_postqc_fastq_files(
                 self.pipeline.output_path, project)
 
+            # index the files once per project, rather than scanning every
+            # file for every run_prefix in every prep.
+            indexes = {key: RunPrefixIndex(fastq_files[key]) for key in
+                       fastq_files}
+
             for vals in self.touched_studies_prep_info[qiita_id]:
                 prep_id, artifact_name, is_repl = vals
                 # for meta*omics, generate the subset of files used by
                 # this prep only.
                 working_set = {}
                 for key in fastq_files:
-                    working_set[key] = []
-                    for run_prefix in self.run_prefixes[prep_id]:
-                        working_set[key] += [fastq for fastq in
-                                             fastq_files[key] if
-                                             run_prefix in fastq]
+                    working_set[key] = indexes[key].find_all(
+                        self.run_prefixes[prep_id])
 
                 if is_repl:
                     working_set = self._copy_files(working_set)
 
-                data.append(self._load_prep_into_qiita(
-                    self.qclient, prep_id, artifact_name, qiita_id, project,
-                    working_set, ARTIFACT_TYPE_METAOMICS))
+                tasks.append((self.qclient, prep_id, artifact_name,
+                              qiita_id, project, working_set,
+                              ARTIFACT_TYPE_METAOMICS))
 
-        df = pd.DataFrame(data)
-        opath = join(self.pipeline.output_path, 'touched_studies.html')
-        with open(opath, 'w') as f:
-            f.write(df.to_html(border=2, index=False, justify="left",
-                               render_links=True, escape=False))
-
-        return df
+        return self._load_preps_concurrently(tasks)
 
 
 class Metagenomic(MetaOmic):
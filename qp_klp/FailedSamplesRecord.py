@@ -1,9 +1,15 @@
-from json import dumps, load
+from json import dumps, load, loads
+from os import fsync, replace
 from os.path import join, exists
-import pandas as pd
 
 
 class FailedSamplesRecord:
+    # the journal is compacted into failed_samples.json once it contains
+    # this many entries.
+    COMPACT_THRESHOLD = 100000
+
+    REPORT_COLUMNS = ['Project', 'Sample ID', 'Failed at']
+
     def __init__(self, output_dir, samples):
         # because we want to write out the list of samples that failed after
         # each Job is run, and we want to organize that output by project, we
@@ -12,6 +18,16 @@ class FailedSamplesRecord:
         self.output_path = join(output_dir, 'failed_samples.json')
         self.report_path = join(output_dir, 'failed_samples.html')
 
+        # failures recorded since the last dump() are appended to a journal,
+        # one JSON object per line, rather than rewriting output_path after
+        # each Job.
+        self.journal_path = join(output_dir, 'failed_samples.jsonl')
+        self.journal_entries = 0
+
+        # recorded state is loaded on first write() only. Afterwards, the
+        # state in memory is kept up to date.
+        self.loaded = False
+
         # create an initial dictionary with sample-ids as keys and their
         # associated project-name and status as values. Afterwards, we'll
         # filter out the sample-ids w/no status (meaning they were
@@ -21,11 +37,24 @@ class FailedSamplesRecord:
         self.project_map = {x.Sample_ID: x.Sample_Project for x in samples}
 
     def dump(self):
+        # compacts the current state into output_path and empties the
+        # journal. The state is written to a temporary file first so that a
+        # crash can never leave a partially-written output_path behind.
         output = {'sample_state': self.sample_state,
                   'project_map': self.project_map}
 
-        with open(self.output_path, 'w') as f:
+        tmp_path = self.output_path + '.tmp'
+        with open(tmp_path, 'w') as f:
             f.write(dumps(output, indent=2, sort_keys=True))
+            f.flush()
+            fsync(f.fileno())
+        replace(tmp_path, self.output_path)
+
+        # if a crash occurs before the journal is emptied, replaying it
+        # again is harmless.
+        if exists(self.journal_path):
+            open(self.journal_path, 'w').close()
+        self.journal_entries = 0
 
     def load(self):
         # if recorded state exists, overwrite initial state.
@@ -36,35 +65,77 @@ class FailedSamplesRecord:
             self.sample_state = state['sample_state']
             self.project_map = state['project_map']
 
+        # replay failures recorded since the last dump().
+        self.journal_entries = 0
+        if exists(self.journal_path):
+            with open(self.journal_path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = loads(line)
+                    except ValueError:
+                        # the last line may be incomplete if a crash
+                        # occurred while it was being written.
+                        continue
+                    self.update([entry['sample_id']], entry['job_name'])
+                    self.journal_entries += 1
+
+        self.loaded = True
+
     def update(self, failed_ids, job_name):
         # as a rule, if a failed_id were to appear in more than one
         # audit(), preserve the earliest failure, rather than the
-        # latest one.
+        # latest one. Returns the failed_ids whose state changed.
+        updated = []
         for failed_id in failed_ids:
             if self.sample_state[failed_id] is None:
                 self.sample_state[failed_id] = job_name
+                updated.append(failed_id)
+        return updated
 
     def write(self, failed_ids, job_name):
         # a convenience method to support legacy behavior.
-        # specifically, reload recorded state, if it exists.
-        # then update state before recording to file.
-        self.load()
-        self.update(failed_ids, job_name)
-        self.dump()
+        # specifically, load recorded state, if it exists, the first time
+        # write() is called. then update state and append the new failures
+        # to the journal.
+        if not self.loaded:
+            self.load()
 
-    def generate_report(self):
-        # filter out the sample-ids w/out a failure status
-        filtered_fails = {x: self.sample_state[x] for x in self.sample_state if
-                          self.sample_state[x] is not None}
-
-        data = []
-        for sample_id in filtered_fails:
-            data.append({'Project': filtered_fails[sample_id],
-                         'Sample ID': sample_id,
-                         'Failed at': self.project_map[sample_id]
-                         })
-        df = pd.DataFrame(data)
+        updated = self.update(failed_ids, job_name)
+
+        if updated:
+            with open(self.journal_path, 'a') as f:
+                for failed_id in updated:
+                    f.write(dumps({'sample_id': failed_id,
+                                   'job_name': job_name}) + '\n')
+                f.flush()
+                fsync(f.fileno())
+            self.journal_entries += len(updated)
+
+        if self.journal_entries >= self.COMPACT_THRESHOLD:
+            self.dump()
 
+    def generate_report(self):
+        # the report is streamed to file one row at a time, in the same
+        # format as pandas' DataFrame.to_html(). sample-ids w/out a failure
+        # status are skipped.
         with open(self.report_path, 'w') as f:
-            f.write(df.to_html(border=2, index=False, justify="left",
-                               render_links=True, escape=False))
+            f.write('<table border="2" class="dataframe">\n'
+                    '  <thead>\n'
+                    '    <tr style="text-align: left;">\n')
+            for column in self.REPORT_COLUMNS:
+                f.write(f'      <th>{column}</th>\n')
+            f.write('    </tr>\n'
+                    '  </thead>\n'
+                    '  <tbody>\n')
+
+            for sample_id in self.sample_state:
+                if self.sample_state[sample_id] is None:
+                    continue
+                f.write('    <tr>\n'
+                        f'      <td>{self.project_map[sample_id]}</td>\n'
+                        f'      <td>{sample_id}</td>\n'
+                        f'      <td>{self.sample_state[sample_id]}</td>\n'
+                        '    </tr>\n')
+
+            f.write('  </tbody>\n'
+                    '</table>')
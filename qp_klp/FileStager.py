@@ -0,0 +1,157 @@
+from concurrent.futures import ThreadPoolExecutor
+from errno import EXDEV
+from os import link, symlink, remove, stat
+from os.path import lexists, getsize, abspath
+from shutil import copyfile
+from threading import Lock
+import logging
+
+try:
+    from fcntl import ioctl
+except ImportError:
+    ioctl = None
+
+try:
+    # Linux only.
+    from os import copy_file_range
+except ImportError:
+    copy_file_range = None
+
+
+class FileStager():
+    """
+    FileStager places copies of files at new paths using the cheapest
+    method available, so that large fastq.gz files don't need to be
+    duplicated on disk.
+
+    In 'link' mode, a hard link is created when the source and destination
+    are on the same filesystem. Otherwise a reflink (copy-on-write clone) is
+    attempted, followed by an in-kernel copy_file_range() and finally a
+    regular copy. In 'symlink' mode, symbolic links are created instead. In
+    'copy' mode, files are always copied.
+
+    Files loaded into Qiita must not be symlinks into the pipeline's output,
+    which is eventually removed. They are staged w/allow_symlinks=False, in
+    which case 'symlink' mode behaves as 'link' mode.
+    """
+    MODES = ('link', 'symlink', 'copy')
+
+    # from linux/fs.h. Clones all of the extents of one file into another.
+    FICLONE = 0x40049409
+
+    def __init__(self, max_workers=8, mode='link'):
+        """
+        :param max_workers: The maximum number of files staged at once.
+        :param mode: One of 'link', 'symlink' or 'copy'.
+        """
+        if mode not in FileStager.MODES:
+            raise ValueError(f"'{mode}' is not a valid mode. Valid modes "
+                             f"are: {', '.join(FileStager.MODES)}")
+
+        if int(max_workers) < 1:
+            raise ValueError("max_workers must be a positive integer")
+
+        self.mode = mode
+        self.max_workers = int(max_workers)
+        self.lock = Lock()
+
+        # the number of files staged w/each method and the number of bytes
+        # that were and were not written to disk as a result.
+        self.stats = {'hardlink': 0, 'symlink': 0, 'reflink': 0,
+                      'copy_file_range': 0, 'copy': 0,
+                      'bytes_avoided': 0, 'bytes_copied': 0}
+
+    def _reflink(self, src, dst):
+        if ioctl is None:
+            raise OSError("reflinks are not supported on this platform")
+
+        with open(src, 'rb') as f_in, open(dst, 'wb') as f_out:
+            ioctl(f_out.fileno(), FileStager.FICLONE, f_in.fileno())
+
+    def _copy_file_range(self, src, dst):
+        if copy_file_range is None:
+            raise OSError("copy_file_range is not supported on this "
+                          "platform")
+
+        with open(src, 'rb') as f_in, open(dst, 'wb') as f_out:
+            remaining = stat(src).st_size
+            while remaining > 0:
+                copied = copy_file_range(f_in.fileno(), f_out.fileno(),
+                                         remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+
+    def _copy(self, src, dst):
+        for method, func in [('reflink', self._reflink),
+                             ('copy_file_range', self._copy_file_range)]:
+            try:
+                func(src, dst)
+                return method
+            except OSError:
+                # fall through to the next, more expensive method.
+                if lexists(dst):
+                    remove(dst)
+
+        copyfile(src, dst)
+        return 'copy'
+
+    def stage_file(self, src, dst, allow_symlinks=True):
+        """
+        Stages a single file.
+        :param src: The path to an existing file.
+        :param dst: The path to create.
+        :param allow_symlinks: If False, a symbolic link is never created.
+        :return: The name of the method used.
+        """
+        # overwrite existing destinations, as copyfile() would.
+        if lexists(dst):
+            remove(dst)
+
+        if self.mode == 'symlink' and allow_symlinks:
+            symlink(abspath(src), dst)
+            method = 'symlink'
+        elif self.mode in ('link', 'symlink'):
+            try:
+                link(src, dst)
+                method = 'hardlink'
+            except OSError as e:
+                if e.errno != EXDEV:
+                    logging.debug(f"could not link {src}: {e}")
+                method = self._copy(src, dst)
+        else:
+            copyfile(src, dst)
+            method = 'copy'
+
+        size = getsize(src)
+
+        with self.lock:
+            self.stats[method] += 1
+            if method in ('hardlink', 'symlink', 'reflink'):
+                self.stats['bytes_avoided'] += size
+            else:
+                self.stats['bytes_copied'] += size
+
+        return method
+
+    def stage(self, pairs, allow_symlinks=True):
+        """
+        Stages a list of files concurrently.
+        :param pairs: A list of (src, dst) tuples.
+        :param allow_symlinks: If False, symbolic links are never created.
+        :return: A list of the methods used, in the same order as pairs.
+        """
+        pairs = list(pairs)
+
+        if not pairs:
+            return []
+
+        workers = min(self.max_workers, len(pairs))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(
+                lambda x: self.stage_file(*x, allow_symlinks=allow_symlinks),
+                pairs))
+
+        logging.info(f"staged {len(pairs)} files: {self.stats}")
+
+        return results
@@ -0,0 +1,45 @@
+from functools import lru_cache
+from re import compile, DOTALL
+
+
+class OrientationClassifier():
+    """
+    OrientationClassifier determines the orientation of a fastq file from
+    its name: forward (R1), reverse (R2) or indexed (I1, I2) reads.
+
+    Orientation is the right-most occurrence of one of the four orientations
+    enclosed by either '_' or '.' e.g.: '_R1_', '.I2.'. Users can and will
+    include any or all of the four orientations as part of their filenames
+    as well. e.g.: ABC_7_04_1776_R1_SRE_S3_L007_R2_001.trimmed.fastq.gz is
+    an R2 file.
+
+    The greedy prefix of PATTERN causes the right-most occurrence to be
+    matched first, hence each name is examined once. Results are cached, as
+    the same names are classified by several stages.
+    """
+    ORIENTATIONS = ('R1', 'R2', 'I1', 'I2')
+
+    PATTERN = compile(r'^.*(?:_(R1|R2|I1|I2)_|\.(R1|R2|I1|I2)\.)', DOTALL)
+
+    def __init__(self, maxsize=65536):
+        """
+        :param maxsize: The maximum number of names to cache, or None for
+        no limit.
+        """
+        self.classify = lru_cache(maxsize=maxsize)(self._classify)
+
+    @classmethod
+    def _classify(cls, file_name):
+        m = cls.PATTERN.match(file_name)
+
+        # if no orientations were found, then return None.
+        if m is None:
+            return None
+
+        return m[1] or m[2]
+
+    def cache_info(self):
+        return self.classify.cache_info()
+
+    def cache_clear(self):
+        self.classify.cache_clear()
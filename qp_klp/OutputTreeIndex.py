@@ -0,0 +1,170 @@
+from os import scandir, walk
+from os.path import join, abspath, normpath, sep
+from threading import Lock
+
+
+class OutputTreeIndex():
+    """
+    OutputTreeIndex keeps the contents of every directory in a run's output
+    tree in memory, so that stages can list and walk it w/out repeating
+    metadata operations against the filesystem.
+
+    The whole tree is scanned once, on first use. When a stage writes into
+    the tree, it invalidates the directories it wrote to. Invalidated
+    directories are rescanned individually the next time they are visited.
+
+    walk() yields the same results as os.walk() in top-down order. Paths
+    outside the tree are passed through to os.walk().
+    """
+    def __init__(self, root):
+        """
+        :param root: The path to the root of the output tree.
+        """
+        self.root = normpath(abspath(root))
+        self.lock = Lock()
+
+        # (dirs, files, symlinked dirs) keyed by absolute directory path.
+        # directories that do not exist are not recorded, as stages create
+        # them.
+        self.entries = None
+        self.scans = 0
+
+    def _in_tree(self, path):
+        return path == self.root or path.startswith(self.root + sep)
+
+    def _scan(self, path):
+        dirs = []
+        files = []
+        links = set()
+
+        try:
+            with scandir(path) as it:
+                for entry in it:
+                    try:
+                        # as os.walk() does, symlinks to directories are
+                        # listed as directories but are not descended into.
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+
+                    if is_dir:
+                        dirs.append(entry.name)
+                        if entry.is_symlink():
+                            links.add(entry.name)
+                    else:
+                        files.append(entry.name)
+        except OSError:
+            return None
+        finally:
+            self.scans += 1
+
+        return dirs, files, links
+
+    def build(self):
+        """
+        Scans the entire tree in a single pass.
+        :return: None
+        """
+        entries = {}
+        pending = [self.root]
+
+        while pending:
+            path = pending.pop()
+            entry = self._scan(path)
+            if entry is not None:
+                entries[path] = entry
+                dirs, _, links = entry
+                pending += [join(path, x) for x in dirs if x not in links]
+
+        with self.lock:
+            self.entries = entries
+
+    def _get(self, path):
+        if self.entries is None:
+            self.build()
+
+        with self.lock:
+            if path in self.entries:
+                return self.entries[path]
+
+        entry = self._scan(path)
+
+        if entry is not None:
+            with self.lock:
+                self.entries[path] = entry
+
+        return entry
+
+    def invalidate(self, path=None, recursive=True):
+        """
+        Marks a directory as modified.
+        :param path: The path to a directory in the tree. If None, the
+        entire tree is invalidated.
+        :param recursive: If True, all directories below path are also
+        invalidated.
+        :return: None
+        """
+        with self.lock:
+            if self.entries is None:
+                return
+
+            if path is None:
+                self.entries = None
+                return
+
+            path = normpath(abspath(path))
+            self.entries.pop(path, None)
+
+            if recursive:
+                prefix = path + sep
+                for key in [x for x in self.entries if x.startswith(prefix)]:
+                    del self.entries[key]
+
+    def listdir(self, path):
+        """
+        Returns the contents of a directory.
+        :param path: The path to a directory.
+        :return: A tuple of (dirs, files) lists, or None if path does not
+        exist.
+        """
+        path = normpath(abspath(path))
+
+        if not self._in_tree(path):
+            entry = self._scan(path)
+        else:
+            entry = self._get(path)
+
+        if entry is None:
+            return None
+
+        return list(entry[0]), list(entry[1])
+
+    def walk(self, top):
+        """
+        A replacement for os.walk(top), w/top-down traversal.
+        :param top: The path to a directory.
+        :return: A generator of (root, dirs, files) tuples.
+        """
+        path = normpath(abspath(top))
+
+        if not self._in_tree(path):
+            yield from walk(top)
+            return
+
+        # roots are reported relative to top, as os.walk() would.
+        pending = [(path, top)]
+
+        while pending:
+            path, reported = pending.pop()
+            entry = self._get(path)
+            if entry is None:
+                continue
+
+            dirs, files, links = entry
+            dirs = list(dirs)
+            yield reported, dirs, list(files)
+
+            # as w/os.walk(), callers may remove entries from dirs to
+            # prevent them from being visited.
+            pending += [(join(path, x), join(reported, x)) for x in
+                        reversed(dirs) if x not in links]
@@ -0,0 +1,302 @@
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count, makedirs, remove, replace
+from os.path import join, basename, exists
+from shutil import move, which
+from subprocess import Popen, PIPE
+import gzip
+import tarfile
+import logging
+
+
+class _CountingWriter():
+    # the minimal file object tarfile needs to write an archive. Records
+    # the number of bytes written.
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.count = 0
+
+    def write(self, data):
+        self.fileobj.write(data)
+        self.count += len(data)
+
+    def tell(self):
+        return self.count
+
+
+class Packager():
+    """
+    Packager builds the compressed archives and moves the reports that make
+    up a job's 'final_results' directory.
+
+    Archives are independent of one another and are built concurrently.
+    Each one is streamed into a gzip-compressed tar file using Python's
+    tarfile module, or piped through pigz when it is available. Inputs are
+    never listed on a shell command line.
+
+    Each archive is written as two gzip members: one containing its files
+    and one containing tar's end-of-archive marker. Hence a set of archives
+    built concurrently can be combined afterwards by concatenating their
+    first members, w/out compressing their contents again.
+    """
+    # tar's default compression level, rather than tarfile's.
+    COMPRESS_LEVEL = 6
+
+    def __init__(self, working_dir, results_dir, max_workers=4,
+                 use_pigz=True):
+        """
+        :param working_dir: The directory inputs are relative to.
+        :param results_dir: The directory archives are written into.
+        :param max_workers: The maximum number of archives built at once.
+        :param use_pigz: If True, use pigz for compression when present.
+        """
+        if int(max_workers) < 1:
+            raise ValueError("max_workers must be a positive integer")
+
+        self.working_dir = working_dir
+        self.results_dir = results_dir
+        self.max_workers = int(max_workers)
+        self.pigz_path = which('pigz') if use_pigz else None
+
+        # lists of (archive_name, inputs) and (inputs, destination) tuples.
+        self.archives = []
+        self.moves = []
+
+        # a list of (archive_name, list of archive_names) tuples, for
+        # archives assembled from other archives.
+        self.combined = []
+
+    def _confirm_inputs(self, inputs):
+        # it's expected that some inputs may not exist due to different
+        # pipeline types. Inputs that do not exist are ignored.
+        return [x for x in inputs if exists(join(self.working_dir, x))]
+
+    def add_archive(self, archive_name, inputs):
+        """
+        Adds an archive to be built from a list of files and directories.
+        :param archive_name: The name of the archive e.g. 'prep-files.tgz'.
+        :param inputs: A list of paths relative to working_dir.
+        :return: True if the archive was added, False if no input exists.
+        """
+        inputs = self._confirm_inputs(inputs)
+
+        # do not add the archive unless at least one of the inputs exists.
+        if inputs:
+            self.archives.append((archive_name, inputs))
+            return True
+
+        return False
+
+    def add_archive_set(self, archive_name, archives):
+        """
+        Adds a set of archives to be built concurrently and, optionally, a
+        combined archive assembled from them once they are built.
+        :param archive_name: The name of the combined archive, or None.
+        :param archives: A list of (archive_name, inputs) tuples.
+        :return: A list of the names of the archives added.
+        """
+        archives = [(name, self._confirm_inputs(inputs)) for name, inputs in
+                    archives]
+        archives = [(name, inputs) for name, inputs in archives if inputs]
+
+        if archive_name is not None and len(archives) == 1:
+            # a set of one is simply built under the combined name.
+            archives = [(archive_name, archives[0][1])]
+        elif archive_name is not None and archives:
+            self.combined.append((archive_name,
+                                  [name for name, _ in archives]))
+
+        self.archives += archives
+
+        names = [name for name, _ in archives]
+        if archive_name is not None and len(archives) > 1:
+            names.append(archive_name)
+
+        return names
+
+    def add_move(self, inputs, destination):
+        """
+        Adds a list of files and directories to be moved.
+        :param inputs: A list of paths relative to working_dir.
+        :param destination: A directory relative to working_dir.
+        :return: True if the move was added, False if no input exists.
+        """
+        inputs = self._confirm_inputs(inputs)
+
+        if inputs:
+            self.moves.append((inputs, destination))
+            return True
+
+        return False
+
+    def get_commands(self):
+        """
+        Returns the shell equivalent of each operation, for auditing.
+        :return: A list of strings.
+        """
+        cmds = []
+
+        archives = dict(self.archives)
+        for archive_name, archive_names in self.combined:
+            archives[archive_name] = [x for name in archive_names for x in
+                                      archives[name]]
+
+        for archive_name, inputs in archives.items():
+            output = join(basename(self.results_dir), archive_name)
+            if self.pigz_path:
+                cmds.append(f"tar cvf - {' '.join(inputs)} | "
+                            f"{self.pigz_path} > {output}")
+            else:
+                cmds.append(f"tar zcvf {output} {' '.join(inputs)}")
+
+        for inputs, destination in self.moves:
+            cmds.append(f"mv {' '.join(inputs)} {destination}")
+
+        return [f'cd {self.working_dir}; {cmd}' for cmd in cmds]
+
+    def _add_inputs(self, tar, inputs):
+        for input in inputs:
+            # members are stored relative to working_dir, as tar would.
+            tar.add(join(self.working_dir, input), arcname=input)
+
+    def _write_members(self, fileobj, inputs):
+        # the TarFile is not closed, as closing it writes the end-of-archive
+        # marker. The marker is written by _write_end().
+        writer = _CountingWriter(fileobj)
+        tar = tarfile.TarFile(fileobj=writer, mode='w')
+        self._add_inputs(tar, inputs)
+        return writer.count
+
+    def _write_end(self, out, size):
+        # two empty blocks, padded to a whole number of records as tar
+        # would.
+        end = 2 * tarfile.BLOCKSIZE
+        end += -(size + end) % tarfile.RECORDSIZE
+        out.write(gzip.compress(tarfile.NUL * end, self.COMPRESS_LEVEL))
+
+    def _build_archive(self, archive_name, inputs):
+        """
+        Builds an archive.
+        :param archive_name: The name of the archive.
+        :param inputs: A list of paths relative to working_dir.
+        :return: The path to the archive, the size of the gzip member
+        containing its files and the uncompressed size of those files.
+        """
+        output_path = join(self.results_dir, archive_name)
+        # write to a temporary name so that an interrupted run never leaves
+        # a truncated archive behind in final_results.
+        partial_path = output_path + '.partial'
+
+        try:
+            with open(partial_path, 'wb') as out:
+                if self.pigz_path:
+                    threads = max(1, (cpu_count() or 1) // self.max_workers)
+                    proc = Popen([self.pigz_path, '-p', str(threads), '-c'],
+                                 stdin=PIPE, stdout=out, stderr=PIPE)
+                    try:
+                        size = self._write_members(proc.stdin, inputs)
+                    finally:
+                        # always reap pigz, even if tarfile failed.
+                        proc.stdin.close()
+                        stderr = proc.stderr.read()
+                        proc.wait()
+
+                    if proc.returncode != 0:
+                        raise ValueError(f"pigz returned {proc.returncode}: "
+                                         f"{stderr.decode()}")
+                else:
+                    with gzip.GzipFile(
+                            fileobj=out, mode='wb',
+                            compresslevel=self.COMPRESS_LEVEL) as gz:
+                        size = self._write_members(gz, inputs)
+
+                # pigz writes to the file directly, hence the position is
+                # found by seeking to the end.
+                member_size = out.seek(0, 2)
+                self._write_end(out, size)
+        except Exception:
+            if exists(partial_path):
+                remove(partial_path)
+            raise
+
+        replace(partial_path, output_path)
+        logging.debug(f"created {output_path}")
+
+        return output_path, member_size, size
+
+    def _combine_archives(self, archive_name, parts):
+        """
+        Assembles an archive from other archives.
+        :param archive_name: The name of the archive.
+        :param parts: A list of _build_archive() results.
+        :return: The path to the archive.
+        """
+        output_path = join(self.results_dir, archive_name)
+        partial_path = output_path + '.partial'
+
+        try:
+            with open(partial_path, 'wb') as out:
+                for path, member_size, _ in parts:
+                    with open(path, 'rb') as f:
+                        # copy the member containing the files only.
+                        remaining = member_size
+                        while remaining:
+                            data = f.read(min(remaining, 1024 * 1024))
+                            if not data:
+                                raise ValueError(f"{path} is truncated")
+                            out.write(data)
+                            remaining -= len(data)
+
+                self._write_end(out, sum(x[2] for x in parts))
+        except Exception:
+            if exists(partial_path):
+                remove(partial_path)
+            raise
+
+        replace(partial_path, output_path)
+        logging.debug(f"created {output_path}")
+
+        return output_path
+
+    def execute(self):
+        """
+        Builds all archives concurrently, assembles any combined archives,
+        then performs all moves in order.
+        :return: A list of paths to the archives created.
+        """
+        makedirs(self.results_dir, exist_ok=True)
+
+        results = []
+        built = {}
+
+        if self.archives:
+            workers = min(self.max_workers, len(self.archives))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(self._build_archive, *archive)
+                           for archive in self.archives]
+
+                errors = []
+                for (archive_name, _), future in zip(self.archives, futures):
+                    try:
+                        built[archive_name] = future.result()
+                        results.append(built[archive_name][0])
+                    except Exception as e:
+                        errors.append(f"{archive_name}: {e}")
+
+                if errors:
+                    raise ValueError("could not create archives:\n" +
+                                     "\n".join(errors))
+
+        for archive_name, archive_names in self.combined:
+            results.append(self._combine_archives(
+                archive_name, [built[x] for x in archive_names]))
+
+        for inputs, destination in self.moves:
+            destination = join(self.working_dir, destination)
+            for input in inputs:
+                target = join(destination, basename(input))
+                if exists(target):
+                    raise ValueError(f"cannot move '{input}': '{target}' "
+                                     "already exists")
+                move(join(self.working_dir, input), target)
+
+        return results
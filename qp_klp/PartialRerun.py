@@ -0,0 +1,103 @@
+from os import walk, makedirs, replace
+from os.path import join, exists, relpath, basename, dirname
+from shutil import rmtree
+
+
+class PartialRerun():
+    """
+    PartialRerun supports rerunning a Job for the samples whose output is
+    missing, rather than for every sample in the run.
+
+    The input files of the selected samples are staged into a reduced copy
+    of each input directory. A new Job is run against the reduced inputs in
+    a separate working directory and its output is then merged into the
+    original Job's output directory.
+
+    Files are assigned to a sample when their name begins w/the sample-id
+    followed by '_S', as in '<sample-id>_S<n>_L<lane>_R1_001.fastq.gz'.
+    """
+    def __init__(self, output_path, job_name):
+        """
+        :param output_path: The pipeline's output directory.
+        :param job_name: The name of the Job e.g. 'NuQCJob'.
+        """
+        self.output_path = output_path
+        self.job_name = job_name
+
+        # the reduced Job is given this as its output_path. The Job creates
+        # its own subdirectory named for itself.
+        self.rerun_path = join(output_path, 'partial_rerun', job_name)
+        self.job_dir = join(output_path, job_name)
+        self.rerun_job_dir = join(self.rerun_path, job_name)
+
+    @classmethod
+    def belongs_to(cls, file_name, sample_ids):
+        # sample-ids may be prefixes of one another e.g. 'sample1' and
+        # 'sample11'. The '_S' that follows disambiguates them.
+        return any(file_name.startswith(f'{x}_S') for x in sample_ids)
+
+    def stage_inputs(self, input_dir, sample_ids, stager, name):
+        """
+        Stages the files belonging to a subset of samples.
+        :param input_dir: The path to a Job's input directory.
+        :param sample_ids: The list of sample-ids to stage.
+        :param stager: A FileStager used to place each file.
+        :param name: A unique name for the reduced input directory.
+        :return: The path to the reduced input directory and the number of
+        files staged.
+        """
+        reduced_dir = join(self.rerun_path, 'inputs', name)
+
+        pairs = []
+        for root, dirs, files in walk(input_dir):
+            for _file in files:
+                if self.belongs_to(_file, sample_ids):
+                    src = join(root, _file)
+                    dst = join(reduced_dir, relpath(src, input_dir))
+                    makedirs(dirname(dst), exist_ok=True)
+                    pairs.append((src, dst))
+
+        makedirs(reduced_dir, exist_ok=True)
+        stager.stage(pairs)
+
+        return reduced_dir, len(pairs)
+
+    def merge(self, sample_ids):
+        """
+        Moves the output of the reduced Job into the original Job's output
+        directory. Files belonging to sample_ids replace existing files.
+        Other files e.g. logs and scripts are only moved if they don't
+        already exist.
+        :param sample_ids: The list of sample-ids that were rerun.
+        :return: The number of files moved.
+        """
+        if not exists(join(self.rerun_job_dir, 'job_completed')):
+            raise ValueError(f"{self.job_name} did not complete for "
+                             f"{', '.join(sample_ids)}")
+
+        count = 0
+        for root, dirs, files in walk(self.rerun_job_dir):
+            for _file in files:
+                src = join(root, _file)
+                dst = join(self.job_dir, relpath(src, self.rerun_job_dir))
+
+                # job_completed is moved last, once all output is in place.
+                if _file == 'job_completed' and root == self.rerun_job_dir:
+                    continue
+
+                if exists(dst) and not self.belongs_to(basename(dst),
+                                                       sample_ids):
+                    continue
+
+                makedirs(dirname(dst), exist_ok=True)
+                replace(src, dst)
+                count += 1
+
+        replace(join(self.rerun_job_dir, 'job_completed'),
+                join(self.job_dir, 'job_completed'))
+
+        return count
+
+    def cleanup(self):
+        if exists(self.rerun_path):
+            rmtree(self.rerun_path)
@@ -0,0 +1,163 @@
+from bisect import bisect_left
+from concurrent.futures import Future
+from copy import deepcopy
+from threading import BoundedSemaphore, Lock
+from time import perf_counter
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+
+class PooledQiitaClient():
+    """
+    PooledQiitaClient wraps a QiitaClient so that requests to Qiita reuse a
+    pool of keep-alive connections and may be issued concurrently.
+
+    - Requests are sent through a single requests.Session, rather than
+      opening a new connection for every request.
+    - No more than max_concurrency requests are in flight at once.
+    - Identical GET requests issued while one is already in flight wait for
+      and share its result, rather than being sent again.
+    - The latency of every request is recorded in a histogram per method.
+
+    The API matches QiitaClient; callers issue requests concurrently from
+    their own threads e.g. w/a TaskRunner. Authentication and retries
+    remain the responsibility of the wrapped QiitaClient.
+
+    NB: connections are reused by passing the session to the private
+    QiitaClient._request_retry(), which may change between qiita_client
+    releases. Workflows only use PooledQiitaClient when
+    'qiita_use_pooled_client' is enabled in the KLP config.
+    """
+    METHODS = ('get', 'post', 'patch', 'http_patch', 'delete')
+
+    # upper bounds of the latency histogram buckets, in seconds.
+    BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, qclient, max_concurrency=8):
+        """
+        :param qclient: A QiitaClient object.
+        :param max_concurrency: The maximum number of requests in flight.
+        """
+        if int(max_concurrency) < 1:
+            raise ValueError("max_concurrency must be a positive integer")
+
+        self.qclient = qclient
+        self.max_concurrency = int(max_concurrency)
+        self.semaphore = BoundedSemaphore(self.max_concurrency)
+        self.lock = Lock()
+
+        # keep as many connections open as there may be requests in flight.
+        self.session = Session()
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=self.max_concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # GET requests currently in flight, keyed by url and arguments.
+        self.in_flight = {}
+
+        self.stats = {'requests': 0, 'coalesced': 0}
+        self.histograms = {method: [0] * (len(self.BUCKETS) + 1)
+                           for method in self.METHODS}
+
+    def __getattr__(self, name):
+        if name == 'qclient':
+            raise AttributeError(name)
+
+        return getattr(self.qclient, name)
+
+    def _send(self, method, url, *args, **kwargs):
+        # QiitaClient sends every request through _request_retry(), which
+        # accepts the function used to send it. Pass it the session's
+        # equivalent so that connections are reused. Clients w/out
+        # _request_retry() e.g. test doubles, are called directly.
+        request_retry = getattr(self.qclient, '_request_retry', None)
+
+        if request_retry is None or method == 'patch':
+            # QiitaClient.patch() formats its own payload before calling
+            # _request_retry().
+            return getattr(self.qclient, method)(url, *args, **kwargs)
+
+        session_func = {'get': self.session.get,
+                        'post': self.session.post,
+                        'http_patch': self.session.patch,
+                        'delete': self.session.delete}[method]
+
+        return request_retry(session_func, url, *args, **kwargs)
+
+    def _request(self, method, url, *args, **kwargs):
+        with self.semaphore:
+            start = perf_counter()
+            try:
+                return self._send(method, url, *args, **kwargs)
+            finally:
+                self._record(method, perf_counter() - start)
+
+    def _record(self, method, elapsed):
+        with self.lock:
+            self.stats['requests'] += 1
+            self.histograms[method][bisect_left(self.BUCKETS, elapsed)] += 1
+
+    def get(self, url, **kwargs):
+        key = (url, repr(sorted(kwargs.items())))
+
+        with self.lock:
+            future = self.in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self.in_flight[key] = future
+            else:
+                self.stats['coalesced'] += 1
+
+        # callers may modify the results they are given, hence each caller,
+        # including the one that sent the request, is given its own copy.
+        if not is_leader:
+            return deepcopy(future.result())
+
+        try:
+            result = self._request('get', url, **kwargs)
+            future.set_result(result)
+            return deepcopy(result)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+    def post(self, url, **kwargs):
+        return self._request('post', url, **kwargs)
+
+    def patch(self, url, op, path, value=None, from_p=None):
+        return self._request('patch', url, op, path, value=value,
+                             from_p=from_p)
+
+    def http_patch(self, url, **kwargs):
+        return self._request('http_patch', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self._request('delete', url, **kwargs)
+
+    def get_histograms(self):
+        """
+        Returns the latency histogram of each method used.
+        :return: A dict of lists of (upper-bound, count) pairs, keyed by
+        method. The final upper-bound is None.
+        """
+        bounds = list(self.BUCKETS) + [None]
+
+        with self.lock:
+            return {method: list(zip(bounds, counts)) for method, counts in
+                    self.histograms.items() if sum(counts)}
+
+    def get_stats(self):
+        """
+        Returns the number of requests sent and coalesced.
+        :return: A dict.
+        """
+        with self.lock:
+            return dict(self.stats)
+
+    def close(self):
+        self.session.close()
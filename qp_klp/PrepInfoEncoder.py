@@ -0,0 +1,113 @@
+from csv import reader, QUOTE_MINIMAL
+from json import dumps
+
+
+class PrepInfoEncoder():
+    """
+    PrepInfoEncoder converts a prep-info file into the JSON 'prep_info'
+    payload Qiita expects, one row at a time.
+
+    The output is identical to json.dumps() of the dict of dicts produced by
+    reading the file w/pandas.read_csv(dtype=str, index_col=False), setting
+    'sample_name' as the index and calling to_dict('index'). Unlike that
+    path, neither a DataFrame nor a dict of the entire file is created.
+
+    As w/pandas, empty fields and the strings in NA_VALUES are encoded as
+    NaN, blank lines are skipped and rows w/more fields than the header
+    raise an error.
+    """
+    # pandas' default na_values.
+    NA_VALUES = frozenset(['', '#N/A', '#N/A N/A', '#NA', '-1.#IND',
+                           '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                           '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a',
+                           'nan', 'null'])
+
+    NAN = float('nan')
+
+    def __init__(self, prep_file_path):
+        """
+        :param prep_file_path: The path to a generated prep-info file.
+        """
+        self.prep_file_path = prep_file_path
+        self.columns = None
+        self.sample_names = []
+
+        # values of the columns requested in encode(), in row order.
+        self.collected = {}
+
+    def _rows(self):
+        # utf-8-sig removes a byte-order mark, as pandas does.
+        with open(self.prep_file_path, 'r', encoding='utf-8-sig',
+                  newline='') as f:
+            for row in reader(f, delimiter='\t', quoting=QUOTE_MINIMAL):
+                if row:
+                    yield row
+
+    def encode(self, collect=()):
+        """
+        Encodes the prep-info file as JSON.
+        :param collect: The names of columns whose values should be kept in
+        self.collected e.g. ['run_prefix']. Columns not present in the file
+        are ignored.
+        :return: A JSON string mapping each sample_name to a dict of its
+        remaining columns.
+        """
+        rows = self._rows()
+
+        try:
+            self.columns = next(rows)
+        except StopIteration:
+            raise ValueError(f"{self.prep_file_path} is empty")
+
+        duplicates = sorted({x for x in self.columns
+                             if self.columns.count(x) > 1})
+        if duplicates:
+            raise ValueError(f"{self.prep_file_path} contains duplicate "
+                             f"columns: {', '.join(duplicates)}")
+
+        if 'sample_name' not in self.columns:
+            raise ValueError(f"{self.prep_file_path} does not contain a "
+                             "'sample_name' column")
+
+        index = self.columns.index('sample_name')
+        width = len(self.columns)
+        others = [i for i in range(width) if i != index]
+        keys = [dumps(self.columns[i]) for i in others]
+        collected = [(x, self.columns.index(x)) for x in collect
+                     if x in self.columns]
+
+        self.sample_names = []
+        self.collected = {x: [] for x, _ in collected}
+        seen = set()
+        parts = []
+
+        for line_number, row in enumerate(rows, start=2):
+            # as w/pandas, short rows are padded w/NaN and long rows are an
+            # error.
+            if len(row) > width:
+                raise ValueError(f"{self.prep_file_path} line {line_number}"
+                                 f": expected {width} fields, saw "
+                                 f"{len(row)}")
+
+            values = [self.NAN if x in self.NA_VALUES else x for x in row]
+            values += [self.NAN] * (width - len(values))
+
+            sample_name = values[index]
+            if sample_name in seen:
+                raise ValueError(f"{self.prep_file_path} contains duplicate "
+                                 f"sample_name '{sample_name}'")
+            seen.add(sample_name)
+            self.sample_names.append(sample_name)
+
+            for name, i in collected:
+                self.collected[name].append(values[i])
+
+            # NaN is encoded as NaN, as json.dumps() does by default.
+            fields = ', '.join(f'{k}: {dumps(values[i])}' for k, i in
+                               zip(keys, others))
+            # json.dumps() encodes a NaN key as the string "NaN".
+            key = dumps(sample_name if isinstance(sample_name, str) else
+                        dumps(sample_name))
+            parts.append(f'{key}: {{{fields}}}')
+
+        return '{' + ', '.join(parts) + '}'
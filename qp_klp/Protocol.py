@@ -3,10 +3,10 @@ from sequence_processing_pipeline.TellReadJob import TellReadJob
 from sequence_processing_pipeline.SeqCountsJob import SeqCountsJob
 from sequence_processing_pipeline.TRIntegrateJob import TRIntegrateJob
 from sequence_processing_pipeline.PipelineError import PipelineError
-from os.path import join, split
+from os.path import join, split, getsize
 from re import match
-from os import makedirs, rename, walk
-from metapool import load_sample_sheet
+from .RenamePlan import RenamePlan
+from .SequenceCounter import SequenceCounter
 
 
 PROTOCOL_NAME_NONE = "None"
@@ -135,11 +135,27 @@ class TellSeq(Protocol):
         files_to_count_path = join(self.pipeline.output_path,
                                    'files_to_count.txt')
 
+        files_to_count = []
+        index = self.get_output_index()
+        for root, _, files in index.walk(self.raw_fastq_files_path):
+            for _file in files:
+                if self._determine_orientation(_file) in ['R1', 'R2']:
+                    files_to_count.append(join(root, _file))
+
         with open(files_to_count_path, 'w') as f:
-            for root, _, files in walk(self.raw_fastq_files_path):
-                for _file in files:
-                    if self._determine_orientation(_file) in ['R1', 'R2']:
-                        print(join(root, _file), file=f)
+            for fastq_file in files_to_count:
+                print(fastq_file, file=f)
+
+        # for small runs, waiting in the queue for a SeqCountsJob takes far
+        # longer than counting the reads locally. reads are counted on the
+        # plugin's host, so only very small runs are counted locally by
+        # default.
+        max_bytes = self.get_klp_config_value('local_seq_counts_max_bytes',
+                                              512 * 1024 ** 2)
+        if sum(getsize(x) for x in files_to_count) <= max_bytes:
+            if 'SeqCountsJob' not in self.skip_steps:
+                self._count_sequences_locally(files_to_count)
+            return
 
         job = SeqCountsJob(self.pipeline.run_dir,
                            self.pipeline.output_path,
@@ -162,6 +178,22 @@ class TellSeq(Protocol):
         # likely that we're going to fail to count sequences for only some
         # of the samples.
 
+    def _count_sequences_locally(self, files_to_count):
+        """
+        Produces the output of a SeqCountsJob w/out submitting one.
+        :param files_to_count: A list of R1 and R2 fastq.gz files.
+        :return: None
+        """
+        job_dir = join(self.pipeline.output_path, 'SeqCountsJob')
+
+        # the plugin's host is shared, so few processes are used by default.
+        counter = SequenceCounter(self.get_klp_config_value(
+            'local_seq_counts_pool_size', 2))
+        counter.write(files_to_count, job_dir)
+
+        with open(join(job_dir, 'job_completed'), 'w') as f:
+            f.write("counted locally\n")
+
     def integrate_results(self):
         config = self.pipeline.get_software_configuration('tell-seq')
 
@@ -215,15 +247,25 @@ class TellSeq(Protocol):
         # post-processing the results is a relatively trivial task in terms
         # of time. It also relies on metadata stored in the job object.
         # Hence, it is performed here.
-        mapping = self._generate_mapping()
+        job_dir = join(self.pipeline.output_path, 'TRIntegrateJob')
+        plan = RenamePlan(join(job_dir, RenamePlan.FILE_NAME))
 
-        # rename the files and move them into project directories.
-        for root, dirs, files in walk(self.raw_fastq_files_path):
-            for _file in files:
-                fastq_file = join(root, _file)
-                self._post_process_file(fastq_file,
-                                        mapping,
-                                        self.lane_number)
+        # TRIntegrateJob has just written to raw_fastq_files_path.
+        self.get_output_index().invalidate(self.raw_fastq_files_path)
+
+        if plan.exists():
+            # a previous attempt was interrupted. the files already renamed
+            # can't be named again, hence the recorded plan is resumed.
+            plan.load()
+        else:
+            plan.create(self._generate_rename_plan(self._generate_mapping(),
+                                                   self.lane_number))
+
+        plan.execute(self.get_klp_config_value('file_staging_pool_size', 8))
+        self.get_output_index().invalidate(self.raw_fastq_files_path)
+
+        with open(join(job_dir, 'post_processing_completed'), 'w') as f:
+            f.write(f"{len(plan.renames)} files renamed\n")
 
         # audit the results to determine which samples failed to convert
         # properly. Append these to the failed-samples report and also
@@ -241,7 +283,8 @@ class TellSeq(Protocol):
         # NB: This method should only be implemented for tellseq-related
         # SequencingTech() objects where a barcode_id column can be expected
         # to exist and a mapping is needed.
-        sheet = load_sample_sheet(self.pipeline.get_sample_sheet_path())
+        # the sheet was already parsed by Pipeline.
+        sheet = self.pipeline.sample_sheet
 
         results = {}
 
@@ -255,7 +298,38 @@ class TellSeq(Protocol):
             count += 1
         return results
 
-    def _post_process_file(self, fastq_file, mapping, lane):
+    def _generate_rename_plan(self, mapping, lane):
+        """
+        Determines the new name of every file in raw_fastq_files_path.
+        :param mapping: The barcode_id mapping from _generate_mapping().
+        :param lane: The lane number.
+        :return: A list of (src, dst) tuples.
+        """
+        # files already moved into project directories by an earlier
+        # attempt are not listed.
+        contents = self.get_output_index().listdir(self.raw_fastq_files_path)
+        if contents is None:
+            raise ValueError(f"{self.raw_fastq_files_path} does not exist")
+
+        renames = []
+        errors = []
+
+        for _file in sorted(contents[1]):
+            fastq_file = join(self.raw_fastq_files_path, _file)
+            try:
+                renames.append((fastq_file, self._get_post_processed_path(
+                    fastq_file, mapping, lane)))
+            except ValueError as e:
+                errors.append(str(e))
+
+        # report every file that can't be renamed, rather than only the
+        # first.
+        if errors:
+            raise ValueError('\n'.join(errors))
+
+        return renames
+
+    def _get_post_processed_path(self, fastq_file, mapping, lane):
         # generate names of the form generated by bcl-convert/bcl2fastq:
         # <Sample_ID>_S#_L00#_<R# or I#>_001.fastq.gz
         # see:
@@ -287,13 +361,4 @@ class TellSeq(Protocol):
                                                   "L%s" % str(lane).zfill(3),
                                                   read_type)
 
-        # ensure that the project directory exists before we rename and move
-        # the file to that location.
-        makedirs(join(_dir, project_name), exist_ok=True)
-
-        # if there's an error renaming and moving the file, let it pass up to
-        # the user.
-        final_path = join(_dir, project_name, new_name)
-        rename(fastq_file, final_path)
-
-        return final_path
+        return join(_dir, project_name, new_name)
@@ -0,0 +1,114 @@
+from concurrent.futures import ThreadPoolExecutor
+from json import dumps, load
+from os import makedirs, rename, replace, fsync
+from os.path import exists, dirname
+from collections import Counter
+
+
+class RenamePlan():
+    """
+    RenamePlan moves a set of files to new paths as a single operation that
+    can be resumed if it is interrupted.
+
+    Every (src, dst) pair is validated before any file is moved, and the
+    plan is written to a journal before the first rename. As each rename is
+    atomic, every file in the plan is always found at either its source or
+    its destination. Hence an interrupted plan is resumed by loading it from
+    the journal and performing the renames whose source still exists.
+    """
+    FILE_NAME = 'rename_plan.json'
+
+    def __init__(self, journal_path):
+        """
+        :param journal_path: The path to the journal file.
+        """
+        self.journal_path = journal_path
+        self.renames = []
+
+    def exists(self):
+        return exists(self.journal_path)
+
+    def create(self, renames):
+        """
+        Validates a new plan and writes it to the journal.
+        :param renames: A list of (src, dst) tuples.
+        :return: None
+        """
+        renames = [(src, dst) for src, dst in renames]
+        errors = []
+
+        sources = set(src for src, _ in renames)
+        counts = Counter(dst for _, dst in renames)
+
+        for src, dst in renames:
+            if counts[dst] > 1:
+                errors.append(f"{src}: {dst} is the destination of "
+                              f"{counts[dst]} files")
+            elif dst in sources:
+                errors.append(f"{src}: {dst} is the source of another "
+                              "rename")
+            elif exists(dst):
+                errors.append(f"{src}: {dst} already exists")
+
+        if errors:
+            raise ValueError(f"{len(errors)} files could not be renamed:\n" +
+                             '\n'.join(sorted(errors)))
+
+        self.renames = renames
+
+        tmp_path = self.journal_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(dumps({'renames': self.renames}, indent=2))
+            f.flush()
+            fsync(f.fileno())
+        replace(tmp_path, self.journal_path)
+
+    def load(self):
+        with open(self.journal_path, 'r') as f:
+            self.renames = [tuple(x) for x in load(f)['renames']]
+
+    def _get_pending(self):
+        pending = []
+        errors = []
+
+        for src, dst in self.renames:
+            if exists(src):
+                pending.append((src, dst))
+            elif not exists(dst):
+                errors.append(f"{src}: neither it nor {dst} exists")
+
+        if errors:
+            raise ValueError(f"{len(errors)} files in {self.journal_path} "
+                             "are missing:\n" + '\n'.join(errors))
+
+        return pending
+
+    def execute(self, max_workers=8):
+        """
+        Performs the renames that have not already been performed.
+        :param max_workers: The maximum number of renames run at once.
+        :return: The number of files renamed.
+        """
+        pending = self._get_pending()
+
+        # directories are created up front, rather than by each worker.
+        for path in sorted(set(dirname(dst) for _, dst in pending)):
+            makedirs(path, exist_ok=True)
+
+        failures = []
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(rename, src, dst) for src, dst in
+                       pending]
+
+            for (src, dst), future in zip(pending, futures):
+                try:
+                    future.result()
+                except OSError as e:
+                    failures.append(f"{src}: {e}")
+
+        if failures:
+            raise ValueError(f"{len(failures)} of {len(pending)} files "
+                             "could not be renamed:\n" + '\n'.join(failures))
+
+        return len(pending)
@@ -0,0 +1,145 @@
+from json import dumps, load
+from os import walk, stat, replace
+from os.path import join, exists, relpath
+from zlib import crc32
+
+try:
+    # optional. xxhash is considerably faster than crc32 when available.
+    from xxhash import xxh64
+except ImportError:
+    xxh64 = None
+
+
+class RestartManifest():
+    """
+    RestartManifest records the size, modification time and a checksum of
+    every file a Job produced, so that a restart can confirm a Job's output
+    is intact and identify the individual files that are not.
+
+    To keep checksums fast on multi-GB fastq files, only the first and last
+    CHUNK_SIZE bytes of each file are hashed. Combined w/the file's size,
+    this detects truncated, replaced and partially rewritten files.
+    """
+    FILE_NAME = 'restart_manifest.json'
+
+    CHUNK_SIZE = 1024 * 1024
+
+    # files managed by the workflow rather than produced by the Job.
+    IGNORED = ('restart_manifest.json', 'restart_manifest.json.tmp')
+
+    def __init__(self, job_dir):
+        """
+        :param job_dir: The path to a Job's output directory.
+        """
+        self.job_dir = job_dir
+        self.path = join(job_dir, RestartManifest.FILE_NAME)
+        self.algorithm = 'xxh64' if xxh64 is not None else 'crc32'
+
+        # file metadata keyed by path relative to job_dir.
+        self.files = {}
+
+    @classmethod
+    def checksum(cls, path, algorithm):
+        """
+        Returns a checksum of the first and last CHUNK_SIZE bytes of a file.
+        :param path: The path to a file.
+        :param algorithm: 'xxh64' or 'crc32'.
+        :return: A hexadecimal string.
+        """
+        size = stat(path).st_size
+
+        with open(path, 'rb') as f:
+            head = f.read(cls.CHUNK_SIZE)
+            tail = b''
+            if size > cls.CHUNK_SIZE:
+                f.seek(max(cls.CHUNK_SIZE, size - cls.CHUNK_SIZE))
+                tail = f.read(cls.CHUNK_SIZE)
+
+        if algorithm == 'xxh64':
+            if xxh64 is None:
+                raise ValueError("manifest was created w/xxhash, which is "
+                                 "not installed")
+            h = xxh64(head)
+            h.update(tail)
+            return h.hexdigest()
+
+        if algorithm == 'crc32':
+            return '%08x' % crc32(tail, crc32(head))
+
+        raise ValueError(f"'{algorithm}' is not a valid checksum algorithm")
+
+    def _describe(self, path):
+        st = stat(path)
+        return {'size': st.st_size,
+                'mtime': st.st_mtime,
+                'checksum': self.checksum(path, self.algorithm)}
+
+    def create(self):
+        """
+        Records every file in job_dir and writes the manifest to file.
+        :return: The number of files recorded.
+        """
+        self.files = {}
+
+        for root, dirs, files in walk(self.job_dir):
+            for _file in files:
+                if _file in RestartManifest.IGNORED:
+                    continue
+                path = join(root, _file)
+                self.files[relpath(path, self.job_dir)] = self._describe(path)
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(dumps({'algorithm': self.algorithm,
+                           'chunk_size': self.CHUNK_SIZE,
+                           'files': self.files}, indent=2, sort_keys=True))
+        replace(tmp_path, self.path)
+
+        return len(self.files)
+
+    def exists(self):
+        return exists(self.path)
+
+    def load(self):
+        with open(self.path, 'r') as f:
+            manifest = load(f)
+
+        if manifest['chunk_size'] != self.CHUNK_SIZE:
+            raise ValueError(f"{self.path} was created w/a different "
+                             "chunk size")
+
+        self.algorithm = manifest['algorithm']
+        self.files = manifest['files']
+
+    def verify(self):
+        """
+        Compares the files in job_dir against the manifest.
+        :return: A dict of 'valid', 'modified' and 'missing' lists of paths
+        relative to job_dir.
+        """
+        self.load()
+
+        results = {'valid': [], 'modified': [], 'missing': []}
+
+        for rel_path in sorted(self.files):
+            expected = self.files[rel_path]
+            path = join(self.job_dir, rel_path)
+
+            if not exists(path):
+                results['missing'].append(rel_path)
+                continue
+
+            st = stat(path)
+            if st.st_size != expected['size']:
+                results['modified'].append(rel_path)
+            elif st.st_mtime == expected['mtime']:
+                # an unchanged size and mtime is trusted w/out rereading the
+                # file.
+                results['valid'].append(rel_path)
+            elif self.checksum(path, self.algorithm) == expected['checksum']:
+                # e.g. the file was touched or copied.
+                results['valid'].append(rel_path)
+            else:
+                results['modified'].append(rel_path)
+
+        return results
@@ -0,0 +1,78 @@
+from bisect import bisect_left
+from collections import defaultdict
+from os.path import basename, dirname
+
+
+class RunPrefixIndex():
+    """
+    RunPrefixIndex resolves the fastq files belonging to a run_prefix
+    w/out testing every run_prefix against every file.
+
+    A run_prefix has the form '<sample_id>_S<n>_L<lane>' and the fastq files
+    it describes begin w/it e.g. '<sample_id>_S<n>_L<lane>_R1_001.fastq.gz'.
+    Since each sample on a lane has a unique S<n>, a run_prefix found
+    anywhere in a file's name is found at the start of it. Hence file names
+    are kept in sorted order and the files for a run_prefix are located
+    w/a binary search.
+
+    Under that assumption, results are the same as testing
+    'run_prefix in path' for each path: paths are returned in their
+    original order, directories are also searched, and a full scan is
+    performed if a run_prefix isn't found at the start of any file name.
+    Otherwise, files that contain a run_prefix other than at the start of
+    their name are missed when another file starts w/it e.g. for run_prefix
+    'A_S1_L001', 'XA_S1_L001_R1_001.fastq.gz' is not returned alongside
+    'A_S1_L001_R1_001.fastq.gz'.
+    """
+    def __init__(self, fastq_files):
+        """
+        :param fastq_files: A list of paths to fastq files.
+        """
+        self.fastq_files = list(fastq_files)
+
+        # sorted list of (file-name, position in fastq_files) pairs.
+        self.index = sorted((basename(x), i) for i, x in
+                            enumerate(self.fastq_files))
+        self.file_names = [file_name for file_name, _ in self.index]
+
+        # positions of the files in each directory. Typically all files
+        # are in the same directory.
+        self.directories = defaultdict(list)
+        for i, fastq_file in enumerate(self.fastq_files):
+            self.directories[dirname(fastq_file)].append(i)
+
+    def find(self, run_prefix):
+        """
+        Returns the paths that contain run_prefix.
+        :param run_prefix: A run_prefix.
+        :return: A list of paths, in the order they were given.
+        """
+        matches = set()
+
+        start = bisect_left(self.file_names, run_prefix)
+        for file_name, i in self.index[start:]:
+            if not file_name.startswith(run_prefix):
+                break
+            matches.add(i)
+
+        for directory in self.directories:
+            if run_prefix in directory:
+                matches.update(self.directories[directory])
+
+        if not matches:
+            # fall back to a full scan in case a file name contains the
+            # run_prefix somewhere other than at its start.
+            return [x for x in self.fastq_files if run_prefix in x]
+
+        return [self.fastq_files[i] for i in sorted(matches)]
+
+    def find_all(self, run_prefixes):
+        """
+        Returns the paths for each run_prefix, concatenated in order.
+        :param run_prefixes: A list of run_prefixes.
+        :return: A list of paths.
+        """
+        results = []
+        for run_prefix in run_prefixes:
+            results += self.find(run_prefix)
+        return results
@@ -0,0 +1,214 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from os import makedirs, replace, stat
+from os.path import join, basename
+from re import compile
+import numpy as np
+import zlib
+
+try:
+    # optional. isal's zlib-compatible API decompresses considerably faster
+    # than zlib when available.
+    from isal import isal_zlib as gzip_zlib
+except ImportError:
+    gzip_zlib = zlib
+
+
+class SequenceCounter():
+    """
+    SequenceCounter counts the reads in gzipped fastq files in-process, as
+    an alternative to submitting a SeqCountsJob for small runs.
+
+    Files are decompressed in large chunks, the layout of their gzip members
+    is recorded and their reads and bases are counted. Newlines are located
+    w/numpy, w/out splitting the decompressed data into lines. Files are
+    counted in parallel by a pool of processes.
+
+    write() produces the SeqCounts.csv file SeqCountsJob produces: the
+    total number of R1 and R2 reads for each sample.
+    """
+    FILE_NAME = 'SeqCounts.csv'
+
+    CHUNK_SIZE = 4 * 1024 * 1024
+
+    # files are named <Sample_ID>_S#_L00#_<R1 or R2>_001.fastq.gz once
+    # TRIntegrateJob's output has been renamed.
+    SAMPLE_ID = compile(r'^(.+)_S\d+_L\d+_R[12]_001\.fastq\.gz$')
+
+    def __init__(self, max_workers=1):
+        """
+        :param max_workers: The maximum number of files counted at once.
+        """
+        if int(max_workers) < 1:
+            raise ValueError("max_workers must be a positive integer")
+
+        self.max_workers = int(max_workers)
+
+    @classmethod
+    def scan(cls, path):
+        """
+        Counts the reads and bases in a gzipped fastq file.
+        :param path: The path to a fastq.gz file.
+        :return: A dict of the file's size and mtime_ns when it was read,
+        its reads and bases, and its gzip members as a list of
+        [offset, compressed size, uncompressed size] lists.
+        :raises EOFError: If the file's gzip stream is incomplete.
+        """
+        st = stat(path)
+        lines = 0
+        bases = 0
+        # the partial line carried over from the previous chunk.
+        partial = b''
+        members = []
+        offset = 0
+        member = [0, 0, 0]
+        # 16 + MAX_WBITS accepts a gzip header.
+        decompressor = gzip_zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        def consume(data):
+            nonlocal lines, bases, partial
+            data = partial + data
+            ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10)
+            if len(ends) == 0:
+                partial = data
+                return
+
+            # the length of each complete line, excluding its newline.
+            lengths = np.diff(ends, prepend=-1) - 1
+            # sequences are the second line of each four-line record.
+            bases += int(lengths[(1 - lines) % 4::4].sum())
+            lines += len(ends)
+            partial = data[ends[-1] + 1:]
+
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(cls.CHUNK_SIZE)
+                if not chunk:
+                    break
+                offset += len(chunk)
+
+                while chunk:
+                    data = decompressor.decompress(chunk)
+                    member[2] += len(data)
+                    consume(data)
+
+                    # gzip files may contain multiple members, as produced
+                    # by pigz or by concatenating files.
+                    chunk = decompressor.unused_data
+                    if decompressor.eof:
+                        end = offset - len(chunk)
+                        member[1] = end - member[0]
+                        members.append(member)
+                        member = [end, 0, 0]
+                        decompressor = gzip_zlib.decompressobj(
+                            16 + zlib.MAX_WBITS)
+
+        if member[0] < offset:
+            # the final member is incomplete; the file was truncated, e.g.
+            # by an interrupted job.
+            raise EOFError(f"{path} ends before the end of its final gzip "
+                           "member")
+
+        # the last record may not end w/a newline.
+        if partial:
+            consume(b'\n')
+
+        if lines % 4 != 0:
+            raise ValueError(f"{path} contains {lines} lines, which is not a "
+                             "multiple of four")
+
+        return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                'reads': lines // 4, 'bases': bases, 'members': members}
+
+    @classmethod
+    def count_reads(cls, path):
+        """
+        Counts the reads in a gzipped fastq file.
+        :param path: The path to a fastq.gz file.
+        :return: The number of reads.
+        """
+        return cls.scan(path)['reads']
+
+    @classmethod
+    def try_scan(cls, path):
+        """
+        Returns the scan() results for a gzipped fastq file, or None if it
+        cannot be read in full.
+        :param path: The path to a fastq.gz file.
+        :return: A dict of scan() results or None.
+        """
+        try:
+            return cls.scan(path)
+        except (EOFError, ValueError, zlib.error, gzip_zlib.error):
+            return None
+
+    def _map(self, func, paths):
+        workers = min(self.max_workers, len(paths))
+
+        if workers <= 1:
+            return [func(x) for x in paths]
+
+        # workers are spawned rather than forked, as counting may run while
+        # other threads hold locks that a forked child would copy.
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=get_context('spawn')) as executor:
+            return list(executor.map(func, paths))
+
+    def get_stats(self, paths):
+        """
+        Returns the scan() results for a list of gzipped fastq files.
+        :param paths: A list of paths to fastq.gz files.
+        :return: A list of scan() results, in the same order as paths.
+        """
+        return self._map(SequenceCounter.scan, paths)
+
+    def find_invalid(self, paths):
+        """
+        Returns the gzipped fastq files that cannot be read in full e.g.
+        those left truncated by an interrupted Job. Decompressing a file in
+        full also confirms the CRC32 recorded for each of its gzip members.
+        :param paths: A list of paths to fastq.gz files.
+        :return: A list of the paths that are invalid.
+        """
+        results = self._map(SequenceCounter.try_scan, paths)
+
+        return [x for x, result in zip(paths, results) if result is None]
+
+    def count(self, paths):
+        """
+        Counts the reads in a list of gzipped fastq files.
+        :param paths: A list of paths to fastq.gz files.
+        :return: A list of read counts, in the same order as paths.
+        """
+        return [x['reads'] for x in self.get_stats(paths)]
+
+    def write(self, paths, output_dir):
+        """
+        Counts the reads in a list of R1 and R2 files and writes the total
+        for each sample to SeqCounts.csv.
+        :param paths: A list of paths to R1 and R2 fastq.gz files.
+        :param output_dir: The directory to write SeqCounts.csv to.
+        :return: The path to SeqCounts.csv.
+        """
+        sample_ids = []
+        for path in paths:
+            m = SequenceCounter.SAMPLE_ID.match(basename(path))
+            if m is None:
+                raise ValueError(f"a Sample_ID could not be determined from "
+                                 f"'{path}'")
+            sample_ids.append(m[1])
+
+        totals = {}
+        for sample_id, reads in zip(sample_ids, self.count(paths)):
+            totals[sample_id] = totals.get(sample_id, 0) + reads
+
+        makedirs(output_dir, exist_ok=True)
+        output_path = join(output_dir, SequenceCounter.FILE_NAME)
+
+        with open(output_path + '.tmp', 'w') as f:
+            print("Sample_ID,raw_reads_r1r2", file=f)
+            for sample_id in sorted(totals):
+                print(f"{sample_id},{totals[sample_id]}", file=f)
+        replace(output_path + '.tmp', output_path)
+
+        return output_path
@@ -0,0 +1,232 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from json import dumps
+from os import makedirs
+from os.path import join, exists
+from sys import platform
+from threading import Lock
+from time import perf_counter
+import resource
+
+
+class StageTimer():
+    """
+    StageTimer records the wall time, CPU time, peak memory, I/O and the
+    number and latency of Qiita requests for each stage of a Workflow.
+
+    A stage is begun on the calling thread and lasts until the next stage
+    is begun on that thread, or until it is explicitly ended. Qiita
+    requests are attributed to the stage active in the context that made
+    them. Work submitted to a TaskRunner runs in a copy of the caller's
+    context, hence its requests are attributed to the caller's stage.
+
+    CPU time includes that of child processes. CPU time and I/O are
+    measured for the whole process, hence stages that run concurrently
+    will include each other's usage.
+
+    The OS reports only the peak RSS of the process to date, not that of a
+    stage. max_rss_to_date is that cumulative peak when the stage ended.
+    max_rss_growth is how much the stage raised it, and is zero for stages
+    that stayed beneath the peak of an earlier stage.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.current = ContextVar(f'stage_timer_{id(self)}', default=None)
+        self.stages = []
+        self.status_updates = {'count': 0, 'total_time': 0.0}
+        self.unattributed = {'count': 0, 'total_time': 0.0}
+        self.counters = {}
+        self.started = datetime.now().isoformat()
+
+    @classmethod
+    def _read_io(cls):
+        # /proc/self/io is only available on Linux. read_bytes and
+        # write_bytes count the bytes that actually reached storage.
+        results = {'read_bytes': None, 'write_bytes': None}
+
+        if exists('/proc/self/io'):
+            with open('/proc/self/io', 'r') as f:
+                for line in f:
+                    key, value = line.split(':')
+                    if key in results:
+                        results[key] = int(value)
+
+        return results
+
+    @classmethod
+    def _get_max_rss(cls, who):
+        # ru_maxrss is reported in kilobytes on Linux and bytes on macOS.
+        max_rss = resource.getrusage(who).ru_maxrss
+        return max_rss if platform == 'darwin' else max_rss * 1024
+
+    @classmethod
+    def _snapshot(cls):
+        rself = resource.getrusage(resource.RUSAGE_SELF)
+        rchildren = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        return {'wall': perf_counter(),
+                'cpu': (rself.ru_utime + rself.ru_stime +
+                        rchildren.ru_utime + rchildren.ru_stime),
+                'max_rss': cls._get_max_rss(resource.RUSAGE_SELF),
+                'max_rss_children': cls._get_max_rss(
+                    resource.RUSAGE_CHILDREN),
+                'io': cls._read_io()}
+
+    def begin(self, name, step=None):
+        """
+        Begins a new stage on the calling thread, ending the current one.
+        :param name: A description of the stage.
+        :param step: An optional step number.
+        :return: None
+        """
+        self.end()
+
+        stage = {'name': name,
+                 'step': step,
+                 'started': datetime.now().isoformat(),
+                 'qiita_requests': 0,
+                 'qiita_latency': 0.0,
+                 '_start': self._snapshot()}
+
+        with self.lock:
+            self.stages.append(stage)
+
+        self.current.set(stage)
+
+    def end(self):
+        """
+        Ends the current stage on the calling thread, if there is one.
+        :return: None
+        """
+        stage = self.current.get()
+
+        if stage is None:
+            return
+
+        start = stage.pop('_start')
+        stop = self._snapshot()
+
+        stage['wall_time'] = stop['wall'] - start['wall']
+        stage['cpu_time'] = stop['cpu'] - start['cpu']
+        stage['max_rss_to_date'] = stop['max_rss']
+        stage['max_rss_growth'] = stop['max_rss'] - start['max_rss']
+        stage['max_rss_to_date_children'] = stop['max_rss_children']
+        stage['max_rss_growth_children'] = (stop['max_rss_children'] -
+                                            start['max_rss_children'])
+
+        for key in ['read_bytes', 'write_bytes']:
+            if start['io'][key] is None:
+                stage[key] = None
+            else:
+                stage[key] = stop['io'][key] - start['io'][key]
+
+        self.current.set(None)
+
+    @contextmanager
+    def stage(self, name, step=None):
+        self.begin(name, step=step)
+        try:
+            yield
+        finally:
+            self.end()
+
+    def record_request(self, method, url, elapsed):
+        """
+        Records a request made to Qiita.
+        :param method: The name of the method e.g. 'get'.
+        :param url: The url requested.
+        :param elapsed: The time taken to complete the request in seconds.
+        :return: None
+        """
+        stage = self.current.get()
+
+        with self.lock:
+            if stage is None:
+                self.unattributed['count'] += 1
+                self.unattributed['total_time'] += elapsed
+            else:
+                stage['qiita_requests'] += 1
+                stage['qiita_latency'] += elapsed
+
+    def record_status_update(self, elapsed):
+        """
+        Records a call to a Workflow's status_update_callback.
+        :param elapsed: The time taken by the callback in seconds.
+        :return: None
+        """
+        with self.lock:
+            self.status_updates['count'] += 1
+            self.status_updates['total_time'] += elapsed
+
+    def set_counter(self, name, value):
+        """
+        Records an additional named value e.g. cache statistics.
+        :param name: The name of the value.
+        :param value: A JSON-serializable value.
+        :return: None
+        """
+        with self.lock:
+            self.counters[name] = value
+
+    def to_dict(self):
+        with self.lock:
+            # stages still in progress have no results yet.
+            stages = [{k: v for k, v in stage.items() if k != '_start'}
+                      for stage in self.stages]
+
+            return {'started': self.started,
+                    'stages': stages,
+                    'status_updates': dict(self.status_updates),
+                    'counters': dict(self.counters),
+                    'unattributed_qiita_requests': dict(self.unattributed)}
+
+    def write(self, output_dirs, file_name='timings.json'):
+        """
+        Writes the results to file.
+        :param output_dirs: A list of directories to write to.
+        :param file_name: The name of the file.
+        :return: A list of the paths written.
+        """
+        results = dumps(self.to_dict(), indent=2)
+
+        paths = []
+        for output_dir in output_dirs:
+            makedirs(output_dir, exist_ok=True)
+            path = join(output_dir, file_name)
+            with open(path, 'w') as f:
+                f.write(results)
+            paths.append(path)
+
+        return paths
+
+
+class TimedQiitaClient():
+    """
+    TimedQiitaClient wraps a QiitaClient and records the latency of each
+    request in a StageTimer.
+    """
+    TIMED_METHODS = ('get', 'post', 'patch', 'http_patch', 'delete')
+
+    def __init__(self, qclient, stage_timer):
+        self.qclient = qclient
+        self.stage_timer = stage_timer
+
+    def __getattr__(self, name):
+        if name == 'qclient':
+            raise AttributeError(name)
+
+        attr = getattr(self.qclient, name)
+
+        if name not in TimedQiitaClient.TIMED_METHODS:
+            return attr
+
+        def timed(url, *args, **kwargs):
+            start = perf_counter()
+            try:
+                return attr(url, *args, **kwargs)
+            finally:
+                self.stage_timer.record_request(name, url,
+                                                perf_counter() - start)
+
+        return timed
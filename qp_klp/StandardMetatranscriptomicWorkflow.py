@@ -1,12 +1,12 @@
 from .Protocol import Illumina
-from os.path import join, abspath, exists
-from os import walk
+from os.path import join, exists
 from shutil import rmtree
 from sequence_processing_pipeline.Pipeline import Pipeline
 from .Assays import Metatranscriptomic
 from .Assays import ASSAY_NAME_METATRANSCRIPTOMIC
 from .FailedSamplesRecord import FailedSamplesRecord
 from .Workflows import Workflow
+from .StepScheduler import Step
 
 
 class StandardMetatranscriptomicWorkflow(Workflow, Metatranscriptomic,
@@ -60,13 +60,20 @@ class StandardMetatranscriptomicWorkflow(Workflow, Metatranscriptomic,
         directories_to_check = ['ConvertJob', 'NuQCJob',
                                 'FastQCJob', 'GenPrepFileJob']
 
-        for directory in directories_to_check:
+        for i, directory in enumerate(directories_to_check):
             if exists(join(out_dir, directory)):
-                if exists(join(out_dir, directory, 'job_completed')):
-                    # this step completed successfully.
+                if exists(join(out_dir, directory, 'job_completed')) and \
+                   self.verify_restart_manifest(directory):
+                    # this step completed successfully and its output is
+                    # intact.
                     self.skip_steps.append(directory)
+                elif self.can_resume(directory, directories_to_check[:i]):
+                    # keep the output of the samples that completed and
+                    # process only the remainder.
+                    self.resume_steps.append(directory)
                 else:
-                    # work stopped before this job could be completed.
+                    # work stopped before this job could be completed, or
+                    # its output was modified afterwards.
                     rmtree(join(out_dir, directory))
 
     def execute_pipeline(self):
@@ -74,111 +81,75 @@ class StandardMetatranscriptomicWorkflow(Workflow, Metatranscriptomic,
         Executes steps of pipeline in proper sequence.
         :return: None
         '''
-        if not self.is_restart:
-            self.pre_check()
-
-        # this is performed even in the event of a restart.
-        self.generate_special_map()
-
-        # even if a job is being skipped, it's being skipped because it was
-        # determined that it already completed successfully. Hence,
-        # increment the status because we are still iterating through them.
-
-        self.update_status("Converting data", 1, 9)
-        if "ConvertJob" not in self.skip_steps:
-            # converting raw data to fastq depends heavily on the instrument
-            # used to generate the run_directory. Hence this method is
-            # supplied by the instrument mixin.
-            # NB: convert_raw_to_fastq() now generates fsr on its own
-            results = self.convert_raw_to_fastq()
-
-        self.update_status("Performing quality control", 2, 9)
-        if "NuQCJob" not in self.skip_steps:
-            # NB: quality_control generates its own fsr
-            self.quality_control(self.pipeline)
-
-        self.update_status("Generating reports", 3, 9)
-        if "FastQCJob" not in self.skip_steps:
-            # reports are currently implemented by the assay mixin. This is
-            # only because metaranscriptomic runs currently require a failed-
-            # samples report to be generated. This is not done for amplicon
-            # runs since demultiplexing occurs downstream of SPP.
-            results = self.generate_reports()
-            self.fsr_write(results, 'FastQCJob')
-
-        self.update_status("Generating preps", 4, 9)
-        if "GenPrepFileJob" not in self.skip_steps:
-            # preps are currently associated with array mixin, but only
-            # because there are currently some slight differences in how
-            # FastQCJob gets instantiated(). This could get moved into a
-            # shared method, but probably still in Assay.
-            self.generate_prep_file()
-
-        # moved final component of genprepfilejob outside of object.
-        # obtain the paths to the prep-files generated by GenPrepFileJob
-        # w/out having to recover full state.
-        tmp = join(self.pipeline.output_path, 'GenPrepFileJob', 'PrepFiles')
-
-        self.has_replicates = False
-
-        prep_paths = []
-        self.prep_file_paths = {}
-
-        for root, dirs, files in walk(tmp):
-            for _file in files:
-                # breakup the prep-info-file into segments
-                # (run-id, project_qid, other) and cleave
-                # the qiita-id from the project_name.
-                qid = _file.split('.')[1].split('_')[-1]
-
-                if qid not in self.prep_file_paths:
-                    self.prep_file_paths[qid] = []
-
-                _path = abspath(join(root, _file))
-                if _path.endswith('.tsv'):
-                    prep_paths.append(_path)
-                    self.prep_file_paths[qid].append(_path)
-
-            for _dir in dirs:
-                if _dir == '1':
-                    # if PrepFiles contains the '1' directory, then it's a
-                    # given that this sample-sheet contains replicates.
-                    self.has_replicates = True
-
-        # currently imported from Assay although it is a base method. it
-        # could be imported into Workflows potentially, since it is a post-
-        # processing step. All pairings of assay and instrument type need to
-        # generate prep-info files in the same format.
-        self.overwrite_prep_files(prep_paths)
-
-        # for now, simply re-run any line below as if it was a new job, even
-        # for a restart. functionality is idempotent, except for the
-        # registration of new preps in Qiita. These will simply be removed
-        # manually.
-
-        # post-processing steps are by default associated with the Workflow
-        # class, since they deal with fastq files and Qiita, and don't depend
-        # on assay or instrument type.
-        self.update_status("Generating sample information", 5, 9)
-        self.sifs = self.generate_sifs()
-
-        # post-processing step.
-        self.update_status("Registering blanks in Qiita", 6, 9)
-        if self.update:
-            self.update_blanks_in_qiita()
-
-        self.update_status("Loading preps into Qiita", 7, 9)
-        if self.update:
-            self.update_prep_templates()
-
-        # before we load preps into Qiita we need to copy the fastq
-        # files n times for n preps and correct the file-paths each
-        # prep is pointing to.
-        self.load_preps_into_qiita()
-
-        self.update_status("Generating packaging commands", 8, 9)
-        self.generate_commands()
-
-        self.update_status("Packaging results", 9, 9)
-        if self.update:
-            self.execute_commands()
+        with self.instrumentation():
+            if not self.is_restart:
+                self.pre_check()
+
+            # this is performed even in the event of a restart.
+            self.generate_special_map()
+
+            # even if a job is being skipped, it's being skipped because it was
+            # determined that it already completed successfully. Hence, the
+            # status is still reported for each step.
+
+            # steps are run as soon as the steps they require have completed,
+            # hence independent steps such as FastQCJob and the generation of
+            # preps run concurrently.
+            steps = [
+                # converting raw data to fastq depends heavily on the
+                # instrument used to generate the run_directory. Hence this
+                # method is supplied by the instrument mixin. NB:
+                # convert_raw_to_fastq() now generates fsr on its own.
+                Step('convert', self.convert_raw_to_fastq,
+                     status="Converting data",
+                     skip="ConvertJob" in self.skip_steps,
+                     outputs="ConvertJob"),
+                # NB: quality_control() generates its own fsr.
+                Step('quality_control', self.quality_control, ['convert'],
+                     status="Performing quality control",
+                     skip="NuQCJob" in self.skip_steps,
+                     outputs="NuQCJob"),
+                # reports are currently implemented by the assay mixin. This is
+                # only because metatranscriptomic runs currently require a
+                # failed-samples report to be generated. NB: generate_reports()
+                # generates its own fsr.
+                Step('reports', self.generate_reports, ['quality_control'],
+                     status="Generating reports",
+                     skip="FastQCJob" in self.skip_steps,
+                     outputs="FastQCJob"),
+                Step('preps', self.generate_prep_file, ['quality_control'],
+                     status="Generating preps",
+                     skip="GenPrepFileJob" in self.skip_steps,
+                     outputs="GenPrepFileJob"),
+                # obtain the paths to the prep-files generated by
+                # GenPrepFileJob w/out having to recover full state. All
+                # pairings of assay and instrument type need to generate
+                # prep-info files in the same format. GenPrepFileJob's output
+                # is recorded once the prep-files have been overwritten.
+                Step('overwrite_preps',
+                     lambda: self.overwrite_prep_files(
+                         self.index_prep_files()),
+                     ['preps'], outputs="GenPrepFileJob"),
+                # for now, simply re-run the steps below as if it was a new
+                # job, even for a restart. functionality is idempotent, except
+                # for the registration of new preps in Qiita. These will simply
+                # be removed manually.
+                Step('sifs', self.generate_sifs, ['overwrite_preps'],
+                     status="Generating sample information"),
+                Step('blanks', self.update_blanks_in_qiita, ['sifs'],
+                     status="Registering blanks in Qiita",
+                     skip=not self.update),
+                Step('prep_templates', self.update_prep_templates, ['blanks'],
+                     status="Loading preps into Qiita",
+                     skip=not self.update),
+                # Qiita moves the fastq files it is given, hence preps are not
+                # loaded until FastQCJob has finished reading them.
+                Step('load_preps', self.load_preps_into_qiita,
+                     ['prep_templates', 'reports']),
+                Step('commands', self.generate_commands, ['load_preps'],
+                     status="Generating packaging commands"),
+                Step('package', self.execute_commands, ['commands'],
+                     status="Packaging results",
+                     skip=not self.update)]
+
+            self.run_steps(steps)
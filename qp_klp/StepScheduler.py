@@ -0,0 +1,166 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import logging
+
+
+class Step():
+    """
+    A single step of a Workflow and the names of the steps it requires.
+    """
+    def __init__(self, name, func, requires=None, status=None, skip=False,
+                 outputs=None):
+        """
+        :param name: A unique name for the step.
+        :param func: A callable taking no arguments.
+        :param requires: A list of names of steps that must complete first.
+        :param status: An optional status message. Steps w/a status message
+        are numbered in the order they are declared e.g. 'Step 2 of 9'.
+        :param skip: If True, or a callable returning True when the step is
+        reached, func is not called. The step is still reported and is
+        considered complete.
+        :param outputs: The name of the Job directory the step produces, if
+        any.
+        """
+        self.name = name
+        self.func = func
+        self.requires = list(requires) if requires else []
+        self.status = status
+        self.skip = skip
+        self.outputs = outputs
+        self.number = None
+        self.skipped = None
+
+    def should_skip(self):
+        return self.skip() if callable(self.skip) else bool(self.skip)
+
+
+class StepScheduler():
+    """
+    StepScheduler runs a list of Steps as a dependency graph. A step is
+    started as soon as all of the steps it requires have completed, hence
+    independent steps run concurrently.
+
+    When more steps are ready than there are workers, they are started in
+    the order they were declared. With a single worker, steps run one at a
+    time in declaration order, provided every step is declared after the
+    steps it requires.
+
+    If a step fails, no further steps are started. Steps already running
+    are allowed to finish and the first failure is then raised.
+    """
+    def __init__(self, steps, max_workers=1, on_start=None, on_finish=None,
+                 on_complete=None):
+        """
+        :param steps: A list of Step objects.
+        :param max_workers: The maximum number of steps run at once.
+        :param on_start: Optional callable(step, total) called on the
+        worker thread before a step is run or skipped.
+        :param on_finish: Optional callable(step) called on the worker
+        thread after a step is run or skipped, even if it failed.
+        :param on_complete: Optional callable(step) called on the worker
+        thread after a step is run successfully or skipped.
+        """
+        if int(max_workers) < 1:
+            raise ValueError("max_workers must be a positive integer")
+
+        self.steps = list(steps)
+        self.max_workers = int(max_workers)
+        self.on_start = on_start
+        self.on_finish = on_finish
+        self.on_complete = on_complete
+
+        names = [step.name for step in self.steps]
+        duplicates = sorted({x for x in names if names.count(x) > 1})
+        if duplicates:
+            raise ValueError("duplicate step names: %s" %
+                             ', '.join(duplicates))
+
+        for step in self.steps:
+            missing = [x for x in step.requires if x not in names]
+            if missing:
+                raise ValueError(f"step '{step.name}' requires unknown "
+                                 f"steps: {', '.join(missing)}")
+
+        self._confirm_acyclic()
+
+        # number the steps that report status, in declaration order.
+        numbered = [step for step in self.steps if step.status is not None]
+        for i, step in enumerate(numbered):
+            step.number = i + 1
+        self.total = len(numbered)
+
+        # names of the steps completed, in the order they completed.
+        self.completed = []
+
+    def _confirm_acyclic(self):
+        remaining = {step.name: set(step.requires) for step in self.steps}
+
+        while remaining:
+            ready = [name for name in remaining if not remaining[name]]
+            if not ready:
+                raise ValueError("steps contain a circular dependency: %s" %
+                                 ', '.join(sorted(remaining)))
+            for name in ready:
+                del remaining[name]
+            for name in remaining:
+                remaining[name].difference_update(ready)
+
+    def _run_step(self, step):
+        try:
+            if self.on_start:
+                self.on_start(step, self.total)
+
+            step.skipped = step.should_skip()
+
+            if step.skipped:
+                logging.debug(f"skipping step '{step.name}'")
+            else:
+                step.func()
+
+            if self.on_complete:
+                self.on_complete(step)
+        finally:
+            if self.on_finish:
+                self.on_finish(step)
+
+    def run(self):
+        """
+        Runs all steps.
+        :return: A list of the names of the steps, in the order completed.
+        """
+        pending = list(self.steps)
+        running = {}
+        failure = None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                if failure is None:
+                    for step in list(pending):
+                        if len(running) >= self.max_workers:
+                            break
+                        if all(x in self.completed for x in step.requires):
+                            pending.remove(step)
+                            future = executor.submit(self._run_step, step)
+                            running[future] = step
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+                # process completed steps in declaration order so that the
+                # results are deterministic.
+                for future in sorted(done, key=lambda x: self.steps.index(
+                                     running[x])):
+                    step = running.pop(future)
+                    try:
+                        future.result()
+                        self.completed.append(step.name)
+                    except Exception as e:
+                        logging.error(f"step '{step.name}' failed: {e}")
+                        if failure is None:
+                            failure = e
+
+        if failure is not None:
+            raise failure
+
+        return self.completed
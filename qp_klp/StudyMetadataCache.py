@@ -0,0 +1,113 @@
+from threading import Lock
+import logging
+import re
+
+
+class StudyMetadataCache():
+    """
+    StudyMetadataCache wraps a QiitaClient and keeps the sample metadata
+    Qiita returns for each study in memory. Several steps in a Workflow
+    query the same '/api/v1/study/{id}/samples...' endpoints for the same
+    studies. With the cache, each of them is requested from Qiita once.
+
+    StudyMetadataCache can be passed to any method expecting a qclient.
+    Only GETs for study sample metadata are cached. Writes made through
+    http_patch() invalidate the cached entries for that study.
+    """
+    STUDY_URL = re.compile(r'^/api/v1/study/(\d+)/samples')
+
+    def __init__(self, qclient, task_runner=None):
+        """
+        :param qclient: A QiitaClient object.
+        :param task_runner: An optional TaskRunner used by prefetch().
+        """
+        self.qclient = qclient
+        self.task_runner = task_runner
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def __getattr__(self, name):
+        # delegate everything not defined here (post(), _server_url, etc.)
+        # to the wrapped client.
+        if name == 'qclient':
+            raise AttributeError(name)
+        return getattr(self.qclient, name)
+
+    @classmethod
+    def _get_study_id(cls, url):
+        m = cls.STUDY_URL.match(url)
+        return None if m is None else m[1]
+
+    def get(self, url, **kwargs):
+        if kwargs or self._get_study_id(url) is None:
+            # don't cache anything other than study sample metadata.
+            return self.qclient.get(url, **kwargs)
+
+        with self.lock:
+            if url in self.cache:
+                self.hits += 1
+                return self.cache[url]
+
+        result = self.qclient.get(url)
+
+        with self.lock:
+            self.misses += 1
+            self.cache[url] = result
+
+        return result
+
+    def http_patch(self, url, **kwargs):
+        result = self.qclient.http_patch(url, **kwargs)
+
+        study_id = self._get_study_id(url)
+        if study_id is not None:
+            self.invalidate(study_id)
+
+        return result
+
+    def invalidate(self, qiita_id):
+        """
+        Removes all cached entries for a study.
+        :param qiita_id: The Qiita ID of the study.
+        :return: None
+        """
+        prefix = f'/api/v1/study/{qiita_id}/'
+        with self.lock:
+            for url in [x for x in self.cache if x.startswith(prefix)]:
+                del self.cache[url]
+
+    def _prefetch_study(self, qiita_id):
+        self.get(f'/api/v1/study/{qiita_id}/samples')
+        info = self.get(f'/api/v1/study/{qiita_id}/samples/info')
+
+        if info is not None and 'tube_id' in info['categories']:
+            self.get(f'/api/v1/study/{qiita_id}/samples/categories=tube_id')
+
+    def prefetch(self, qiita_ids):
+        """
+        Retrieves the sample metadata for a list of studies.
+        :param qiita_ids: A list of Qiita study IDs.
+        :return: None
+        """
+        qiita_ids = sorted(set(str(x) for x in qiita_ids))
+        tasks = [(qiita_id,) for qiita_id in qiita_ids]
+
+        if self.task_runner is None:
+            for args in tasks:
+                self._prefetch_study(*args)
+        else:
+            self.task_runner.run(self._prefetch_study, tasks,
+                                 labels=[f'study {x}' for x in qiita_ids])
+
+        logging.debug(f"prefetched metadata for {len(qiita_ids)} studies")
+
+    def get_stats(self):
+        """
+        Returns the number of cache hits and misses.
+        :return: A dict.
+        """
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'entries': len(self.cache)}
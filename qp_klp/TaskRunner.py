@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from time import sleep
+import logging
+
+
+class TaskRunner():
+    """
+    TaskRunner runs a list of independent, I/O-bound tasks (e.g. requests
+    to Qiita) on a bounded pool of threads. Each task is retried w/an
+    exponential backoff before it is considered to have failed.
+
+    Results are always returned in the order the tasks were given, no
+    matter the order in which they complete. Failures are collected
+    rather than aborting on the first one, so that all of them can be
+    reported to the user at once.
+    """
+    def __init__(self, max_workers=8, max_retries=3, backoff=1.0):
+        """
+        :param max_workers: The maximum number of tasks run at once.
+        :param max_retries: The number of times a failed task is retried.
+        :param backoff: The number of seconds to wait before the first
+         retry. The wait is doubled on each subsequent retry.
+        """
+        if int(max_workers) < 1:
+            raise ValueError("max_workers must be a positive integer")
+
+        if int(max_retries) < 0:
+            raise ValueError("max_retries must be zero or greater")
+
+        self.max_workers = int(max_workers)
+        self.max_retries = int(max_retries)
+        self.backoff = float(backoff)
+
+        # a list of (label, exception) pairs from the most recent run().
+        self.failures = []
+
+        # the results of the most recent run(), w/None for failed tasks.
+        # available even when run() raises.
+        self.results = []
+
+    def _run_with_retry(self, func, args, label):
+        attempt = 0
+
+        while True:
+            try:
+                return func(*args)
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    raise e
+
+                wait = self.backoff * (2 ** attempt)
+                attempt += 1
+                logging.warning(f"{label} failed ({e}); retry {attempt} of "
+                                f"{self.max_retries} in {wait} seconds")
+                sleep(wait)
+
+    def run(self, func, tasks, labels=None):
+        """
+        Runs func once for each entry in tasks.
+        :param func: A callable.
+        :param tasks: A list of tuples of positional arguments for func.
+        :param labels: An optional list of descriptions, one per task, used
+         when reporting failures.
+        :return: A list of results, in the same order as tasks.
+        """
+        tasks = list(tasks)
+
+        if labels is None:
+            labels = [f'{func.__name__}{args}' for args in tasks]
+
+        if len(labels) != len(tasks):
+            raise ValueError("labels must be the same length as tasks")
+
+        self.failures = []
+        self.results = results = [None] * len(tasks)
+
+        if not tasks:
+            return results
+
+        workers = min(self.max_workers, len(tasks))
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # each task runs in a copy of the caller's context, so that
+            # e.g. the Qiita requests it makes are attributed to the
+            # caller's stage by StageTimer.
+            futures = [executor.submit(copy_context().run,
+                                       self._run_with_retry, func, args,
+                                       label)
+                       for args, label in zip(tasks, labels)]
+
+            # collect the results in submission order so that output is
+            # deterministic.
+            for i, future in enumerate(futures):
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    self.failures.append((labels[i], e))
+
+        if self.failures:
+            msgs = [f'{label}: {e}' for label, e in self.failures]
+            raise ValueError(f"{len(self.failures)} of {len(tasks)} tasks "
+                             "failed:\n" + '\n'.join(msgs))
+
+        return results
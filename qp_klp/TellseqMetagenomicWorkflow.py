@@ -1,12 +1,11 @@
 from .Protocol import TellSeq
-from os.path import join, abspath, exists
-from os import walk
+from os.path import join, exists
 from sequence_processing_pipeline.Pipeline import Pipeline, InstrumentUtils
 from .Assays import Metagenomic
 from .Assays import ASSAY_NAME_METAGENOMIC
 from .Workflows import Workflow
+from .StepScheduler import Step
 from .FailedSamplesRecord import FailedSamplesRecord
-from collections import defaultdict
 
 
 class TellSeqMetagenomicWorkflow(Workflow, Metagenomic, TellSeq):
@@ -67,6 +66,11 @@ class TellSeqMetagenomicWorkflow(Workflow, Metagenomic, TellSeq):
         for directory in directories_to_check:
             if exists(join(out_dir, directory)):
                 if exists(join(out_dir, directory, 'job_completed')):
+                    if not self.verify_restart_manifest(directory):
+                        raise ValueError("%s contains modified files: %s" %
+                                         (join(out_dir, directory), ', '.join(
+                                             self.restart_verification[
+                                                 directory]['modified'])))
                     # this step completed successfully.
                     self.skip_steps.append(directory)
                     if exists(join(out_dir, directory,
@@ -83,99 +87,69 @@ class TellSeqMetagenomicWorkflow(Workflow, Metagenomic, TellSeq):
         Executes steps of pipeline in proper sequence.
         :return: None
         '''
-
-        # perform some (re)initialization steps on (re)startup.
-        self.pre_check()
-
-        # this is performed even in the event of a restart.
-        self.generate_special_map()
-
-        # even if a job is being skipped, it's being skipped because it was
-        # determined that it already completed successfully. Hence,
-        # increment the status because we are still iterating through them.
-
-        self.update_status("Converting data", 1, 9)
-
-        # convert_raw_to_fastq() now performs its own checking of skip_steps.
-        # convert_raw_to_fastq() now performs its own write to fsr reports.
-        # This means fsr reports will be accurate even on restarts.
-        self.convert_raw_to_fastq()
-
-        self.integrate_results()
-
-        self.generate_sequence_counts()
-
-        self.update_status("Performing quality control", 2, 9)
-        self.quality_control()
-
-        self.update_status("Generating reports", 3, 9)
-        self.generate_reports()
-
-        self.update_status("Generating preps", 4, 9)
-        self.generate_prep_file()
-
-        # moved final component of genprepfilejob outside of object.
-        # obtain the paths to the prep-files generated by GenPrepFileJob
-        # w/out having to recover full state.
-        tmp = join(self.pipeline.output_path, 'GenPrepFileJob', 'PrepFiles')
-
-        self.has_replicates = False
-
-        prep_paths = []
-        self.prep_file_paths = defaultdict(list)
-
-        for root, dirs, files in walk(tmp):
-            for _file in files:
-                # breakup the prep-info-file into segments
-                # (run-id, project_qid, other) and cleave
-                # the qiita-id from the project_name.
-                qid = _file.split('.')[1].split('_')[-1]
-
-                if _file.endswith('.tsv'):
-                    _path = abspath(join(root, _file))
-                    prep_paths.append(_path)
-                    self.prep_file_paths[qid].append(_path)
-
-            for _dir in dirs:
-                if _dir == '1':
-                    # if PrepFiles contains the '1' directory, then it's a
-                    # given that this sample-sheet contains replicates.
-                    self.has_replicates = True
-
-        # currently imported from Assay although it is a base method. it
-        # could be imported into Workflows potentially, since it is a post-
-        # processing step. All pairings of assay and instrument type need to
-        # generate prep-info files in the same format.
-        self.overwrite_prep_files(prep_paths)
-
-        # for now, simply re-run any line below as if it was a new job, even
-        # for a restart. functionality is idempotent, except for the
-        # registration of new preps in Qiita. These will simply be removed
-        # manually.
-
-        # post-processing steps are by default associated with the Workflow
-        # class, since they deal with fastq files and Qiita, and don't depend
-        # on assay or instrument type.
-        self.update_status("Generating sample information", 5, 9)
-        self.sifs = self.generate_sifs()
-
-        # post-processing step.
-        self.update_status("Registering blanks in Qiita", 6, 9)
-        if self.update:
-            self.update_blanks_in_qiita()
-
-        self.update_status("Loading preps into Qiita", 7, 9)
-        if self.update:
-            self.update_prep_templates()
-
-        # before we load preps into Qiita we need to copy the fastq
-        # files n times for n preps and correct the file-paths each
-        # prep is pointing to.
-        self.load_preps_into_qiita()
-
-        self.update_status("Generating packaging commands", 8, 9)
-        self.generate_commands()
-
-        self.update_status("Packaging results", 9, 9)
-        if self.update:
-            self.execute_commands()
+        with self.instrumentation():
+            # perform some (re)initialization steps on (re)startup.
+            self.pre_check()
+
+            # this is performed even in the event of a restart.
+            self.generate_special_map()
+
+            # even if a job is being skipped, it's being skipped because it was
+            # determined that it already completed successfully. Hence, the
+            # status is still reported for each step.
+
+            # steps are run as soon as the steps they require have completed,
+            # hence independent steps such as FastQCJob and the generation of
+            # preps run concurrently.
+            steps = [
+                # convert_raw_to_fastq() now performs its own checking of
+                # skip_steps and its own write to fsr reports. This means fsr
+                # reports will be accurate even on restarts. The same is true
+                # of the steps that follow.
+                Step('convert', self.convert_raw_to_fastq,
+                     status="Converting data", outputs="TellReadJob"),
+                Step('integrate', self.integrate_results, ['convert'],
+                     outputs="TRIntegrateJob"),
+                # sequences are counted while quality control is performed.
+                Step('sequence_counts', self.generate_sequence_counts,
+                     ['integrate'], outputs="SeqCountsJob"),
+                Step('quality_control', self.quality_control, ['integrate'],
+                     status="Performing quality control", outputs="NuQCJob"),
+                Step('reports', self.generate_reports, ['quality_control'],
+                     status="Generating reports", outputs="FastQCJob"),
+                # GenPrepFileJob reads the counts generated by SeqCountsJob.
+                Step('preps', self.generate_prep_file,
+                     ['quality_control', 'sequence_counts'],
+                     status="Generating preps", outputs="GenPrepFileJob"),
+                # obtain the paths to the prep-files generated by
+                # GenPrepFileJob w/out having to recover full state. All
+                # pairings of assay and instrument type need to generate
+                # prep-info files in the same format. GenPrepFileJob's output
+                # is recorded once the prep-files have been overwritten.
+                Step('overwrite_preps',
+                     lambda: self.overwrite_prep_files(
+                         self.index_prep_files()),
+                     ['preps'], outputs="GenPrepFileJob"),
+                # for now, simply re-run the steps below as if it was a new
+                # job, even for a restart. functionality is idempotent, except
+                # for the registration of new preps in Qiita. These will simply
+                # be removed manually.
+                Step('sifs', self.generate_sifs, ['overwrite_preps'],
+                     status="Generating sample information"),
+                Step('blanks', self.update_blanks_in_qiita, ['sifs'],
+                     status="Registering blanks in Qiita",
+                     skip=not self.update),
+                Step('prep_templates', self.update_prep_templates, ['blanks'],
+                     status="Loading preps into Qiita",
+                     skip=not self.update),
+                # Qiita moves the fastq files it is given, hence preps are not
+                # loaded until FastQCJob has finished reading them.
+                Step('load_preps', self.load_preps_into_qiita,
+                     ['prep_templates', 'reports']),
+                Step('commands', self.generate_commands, ['load_preps'],
+                     status="Generating packaging commands"),
+                Step('package', self.execute_commands, ['commands'],
+                     status="Packaging results",
+                     skip=not self.update)]
+
+            self.run_steps(steps)
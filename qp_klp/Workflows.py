@@ -1,12 +1,26 @@
-from os.path import join, exists, split
-from os import walk, makedirs, listdir
+from os.path import join, exists, split, abspath, relpath, sep
+from os import makedirs, remove, scandir, stat, walk
 import pandas as pd
-from json import dumps
-from subprocess import Popen, PIPE
-from glob import glob
-from shutil import copyfile
+from json import dumps, load
+import tarfile
 import logging
+from collections import defaultdict
+from contextlib import contextmanager
 from .Assays import ASSAY_NAME_AMPLICON
+from .TaskRunner import TaskRunner
+from .StudyMetadataCache import StudyMetadataCache
+from .Packager import Packager
+from .FileStager import FileStager
+from .StageTimer import StageTimer, TimedQiitaClient
+from .StepScheduler import StepScheduler
+from .PooledQiitaClient import PooledQiitaClient
+from .RestartManifest import RestartManifest
+from .PartialRerun import PartialRerun
+from .OutputTreeIndex import OutputTreeIndex
+from .OrientationClassifier import OrientationClassifier
+from .SequenceCounter import SequenceCounter
+from time import perf_counter
+from threading import Lock, local
 
 
 class WorkflowError(Exception):
@@ -16,6 +30,10 @@ class WorkflowError(Exception):
 
 
 class Workflow():
+    # shared by all Workflows, so that names are classified once per
+    # process.
+    orientation_classifier = OrientationClassifier()
+
     def __init__(self, **kwargs):
         """
         base initializer allows WorkflowFactory to return the correct
@@ -28,15 +46,26 @@ class Workflow():
         # mixins.
         self.cmds_log_path = None
         self.cmds = None
+        self.file_stager = None
         self.has_replicates = None
         self.job_pool_size = None
+        self.klp_config = None
+        self.lock = Lock()
         self.mandatory_attributes = []
         self.master_qiita_job_id = None
+        self.output_index = None
         self.output_path = None
+        self.packager = None
         self.pipeline = None
+        self.pooled_qclient = None
         self.prep_copy_index = 0
         self.prep_file_paths = None
         self.qclient = None
+        # results of verifying each Job's output on restart.
+        self.restart_summary = []
+        self.restart_verification = {}
+        # Jobs to be rerun only for the samples w/out output.
+        self.resume_steps = []
         self.run_prefixes = {}
         self.samples_in_qiita = None
         self.sample_state = None
@@ -44,6 +73,13 @@ class Workflow():
         self.skip_steps = []
         self.special_map = None
         self.status_msg = ''
+        # steps may run concurrently. each thread keeps its own status
+        # message for job_callback() to update.
+        self.local_status = local()
+        self.study_cache = None
+        # held while study metadata is fetched, so that self.lock isn't
+        # held during requests to Qiita.
+        self.study_cache_lock = Lock()
         self.touched_studies_prep_info = None
         self.tube_id_map = None
 
@@ -52,6 +88,13 @@ class Workflow():
         else:
             self.status_update_callback = None
 
+        # allow callers to supply their own StageTimer, e.g. to collect
+        # timings across multiple Workflows.
+        if 'stage_timer' in kwargs:
+            self.stage_timer = kwargs['stage_timer']
+        else:
+            self.stage_timer = StageTimer()
+
     def confirm_mandatory_attributes(self):
         """
         Confirms that all mandatory attributes are present in kwargs.
@@ -67,18 +110,86 @@ class Workflow():
                              f"kwargs for {self.__class__.__name__} workflows"
                              + ": " + ', '.join(absent_list))
 
+    def get_klp_config_value(self, key, default=None):
+        """
+        Returns an optional plugin-level setting from the KLP config file.
+        :param key: The name of the setting.
+        :param default: The value returned if the setting is not defined.
+        :return: The value of the setting.
+        """
+        if self.klp_config is None:
+            self.klp_config = {}
+            config_fp = self.kwargs.get('config_fp')
+            if config_fp is not None and exists(config_fp):
+                with open(config_fp, 'r') as f:
+                    self.klp_config = load(f)
+
+        return self.klp_config.get(key, default)
+
+    def get_qiita_task_runner(self, idempotent=True):
+        """
+        Returns a TaskRunner configured for issuing requests to Qiita.
+        :param idempotent: If False, failed requests are not retried, as a
+        request that failed may still have been processed by Qiita.
+        :return: A TaskRunner object.
+        """
+        max_retries = 0
+        if idempotent:
+            max_retries = self.get_klp_config_value('qiita_max_retries', 3)
+
+        return TaskRunner(self.get_klp_config_value('qiita_pool_size', 8),
+                          max_retries,
+                          self.get_klp_config_value('qiita_retry_backoff',
+                                                    1.0))
+
+    def get_study_cache(self):
+        """
+        Returns the cache of Qiita sample metadata for the studies in this
+        run. On first use, metadata for all studies is fetched concurrently.
+        :return: A StudyMetadataCache object.
+        """
+        if self.study_cache is None:
+            with self.study_cache_lock:
+                if self.study_cache is None:
+                    study_cache = StudyMetadataCache(
+                        self.qclient, self.get_qiita_task_runner())
+                    study_cache.prefetch(
+                        [x['qiita_id'] for x in
+                         self.pipeline.get_project_info()])
+
+                    # the cache is only published once it is populated.
+                    with self.lock:
+                        self.study_cache = study_cache
+
+        return self.study_cache
+
+    def get_output_index(self):
+        """
+        Returns the index of the pipeline's output directory. The directory
+        is scanned in full on first use.
+        :return: An OutputTreeIndex object.
+        """
+        with self.lock:
+            if self.output_index is None:
+                self.output_index = OutputTreeIndex(self.pipeline.output_path)
+
+        return self.output_index
+
     def job_callback(self, jid, status):
         """
         Update main status message w/current child job status.
         """
         if self.status_update_callback:
-            self.status_update_callback(self.status_msg +
-                                        f" ({jid}: {status})")
+            status_msg = getattr(self.local_status, 'msg', self.status_msg)
+            self.status_update_callback(status_msg + f" ({jid}: {status})")
 
     def update_status(self, msg, step_number, total_steps):
         """
         Prettify status message before updating.
         """
+        # each status update marks the beginning of a new step. Resource
+        # usage is recorded per step.
+        self.stage_timer.begin(msg, step=step_number)
 
         # When this method is called, a new status message is created.
         # This is saved so that child jobs can use job_callback() to update
@@ -87,9 +198,318 @@ class Workflow():
         # set self.status_msg even if self.status_update_callback() is None.
         msg = "Step %d of %d: %s" % (step_number, total_steps, msg)
         self.status_msg = msg
+        self.local_status.msg = msg
 
         if self.status_update_callback:
+            start = perf_counter()
             self.status_update_callback(self.status_msg)
+            self.stage_timer.record_status_update(perf_counter() - start)
+
+        if self.study_cache is not None:
+            logging.info("study metadata cache: %s" %
+                         self.study_cache.get_stats())
+
+    def start_pooled_qclient(self):
+        """
+        Wraps qclient so that requests to Qiita share a pool of connections
+        and may be issued concurrently. PooledQiitaClient relies on the
+        private QiitaClient._request_retry(), hence it is only used when
+        'qiita_use_pooled_client' is enabled in the config.
+        :return: The PooledQiitaClient, or None if not enabled.
+        """
+        if self.pooled_qclient is None and self.get_klp_config_value(
+                'qiita_use_pooled_client', False):
+            self.pooled_qclient = PooledQiitaClient(
+                self.qclient, self.get_klp_config_value('qiita_pool_size', 8))
+            self.qclient = self.pooled_qclient
+
+        return self.pooled_qclient
+
+    def start_instrumentation(self):
+        """
+        Begins recording resource usage and Qiita requests.
+        """
+        if not isinstance(self.qclient, TimedQiitaClient):
+            self.qclient = TimedQiitaClient(self.qclient, self.stage_timer)
+
+        self.stage_timer.begin('Setting up')
+
+    def finish_instrumentation(self):
+        """
+        Stops recording and writes timings.json to the output directory and
+        to final_results.
+        :return: A list of paths written.
+        """
+        self.stage_timer.end()
+
+        if self.study_cache is not None:
+            self.stage_timer.set_counter('study_cache',
+                                         self.study_cache.get_stats())
+
+        if self.file_stager is not None:
+            self.stage_timer.set_counter('file_staging',
+                                         dict(self.file_stager.stats))
+
+        if self.pooled_qclient is not None:
+            stats = self.pooled_qclient.get_stats()
+            stats['latency_histograms'] = self.pooled_qclient.get_histograms()
+            self.stage_timer.set_counter('qiita_client', stats)
+
+        try:
+            return self.stage_timer.write([self.pipeline.output_path,
+                                           join(self.pipeline.output_path,
+                                                'final_results')])
+        except OSError as e:
+            # timings are informational; failing to write them must not
+            # replace the outcome of the pipeline.
+            logging.warning(f"timings could not be written: {e}")
+            return []
+
+    @contextmanager
+    def instrumentation(self):
+        """
+        Records the resources used by each step run within the context.
+        Timings are written even if a step fails, to help identify the step
+        that failed.
+        """
+        self.start_pooled_qclient()
+        self.start_instrumentation()
+
+        try:
+            yield
+        finally:
+            self.finish_instrumentation()
+
+            if self.pooled_qclient is not None:
+                self.pooled_qclient.close()
+
+    def run_steps(self, steps):
+        """
+        Runs a list of Steps, starting each one as soon as the steps it
+        requires have completed.
+        :param steps: A list of Step objects.
+        :return: A list of the names of the steps, in the order completed.
+        """
+        def on_start(step, total):
+            if step.status is None:
+                self.stage_timer.begin(step.name)
+            else:
+                self.update_status(step.status, step.number, total)
+
+        def on_finish(step):
+            self.stage_timer.end()
+
+        def on_complete(step):
+            # steps may write files into the root of the output directory,
+            # and anywhere beneath their own Job directory.
+            index = self.get_output_index()
+            index.invalidate(self.pipeline.output_path, recursive=False)
+
+            if step.outputs is not None:
+                index.invalidate(join(self.pipeline.output_path,
+                                      step.outputs))
+
+                # Jobs skipped on restart already have a verified manifest.
+                if not step.skipped:
+                    self.write_restart_manifest(step.outputs)
+
+        scheduler = StepScheduler(
+            steps,
+            max_workers=self.get_klp_config_value('max_concurrent_steps', 4),
+            on_start=on_start,
+            on_finish=on_finish,
+            on_complete=on_complete)
+
+        # resource usage is recorded on the thread running each step.
+        self.stage_timer.end()
+
+        return scheduler.run()
+
+    def write_restart_manifest(self, directory):
+        """
+        Records the output of a completed Job for verification on restart.
+        :param directory: The name of the Job's output directory.
+        :return: None
+        """
+        job_dir = join(self.pipeline.output_path, directory)
+
+        if exists(join(job_dir, 'job_completed')):
+            count = RestartManifest(job_dir).create()
+            logging.debug(f"recorded {count} files in {job_dir}")
+
+    def verify_restart_manifest(self, directory):
+        """
+        Confirms the output of a completed Job is intact before it is
+        reused on restart.
+        :param directory: The name of the Job's output directory.
+        :return: True if the output can be reused, False otherwise.
+        """
+        manifest = RestartManifest(join(self.pipeline.output_path,
+                                        directory))
+
+        if not manifest.exists():
+            # Jobs completed before manifests were recorded are trusted.
+            self.restart_summary.append(f"{directory}: completed; no "
+                                        "manifest to verify against")
+            return True
+
+        results = manifest.verify()
+        self.restart_verification[directory] = results
+
+        msg = f"{directory}: {len(results['valid'])} files verified"
+
+        if results['missing']:
+            # files are expected to be missing once they have been moved
+            # into Qiita.
+            msg += f", {len(results['missing'])} missing"
+
+        if results['modified']:
+            msg += (f", {len(results['modified'])} modified (e.g. "
+                    f"{results['modified'][0]}); output will be regenerated")
+
+        self.restart_summary.append(msg)
+
+        return not results['modified']
+
+    def can_resume(self, directory, previous_directories):
+        """
+        Determines whether an interrupted Job can be rerun for only the
+        samples w/out output, rather than for all samples.
+        :param directory: The name of the Job's output directory.
+        :param previous_directories: The names of the Jobs that run before.
+        :return: True if the Job can be resumed.
+        """
+        # FastQCJob is not resumed, as its MultiQC report would cover only
+        # the samples rerun.
+        if directory != 'NuQCJob':
+            return False
+
+        if not self.get_klp_config_value('per_sample_resume', True):
+            return False
+
+        # the existing output is only reusable if the Job's input will not
+        # be regenerated.
+        return all(x in self.skip_steps for x in previous_directories)
+
+    def remove_incomplete_output(self, job_dir):
+        """
+        Removes the fastq.gz files a Job was writing when it was interrupted,
+        if they cannot be read in full, so that audit() reports their
+        samples as failed.
+
+        Only files modified within 'incomplete_output_window' seconds of the
+        last write to the Job's output are read. Files completed earlier
+        were closed before the Job stopped and are left to audit().
+        :param job_dir: The path to a Job's output directory.
+        :return: A list of the paths removed.
+        """
+        window = float(self.get_klp_config_value('incomplete_output_window',
+                                                 3600))
+
+        mtimes = {}
+        last_write = None
+        for root, dirs, files in walk(job_dir):
+            for _file in files:
+                path = join(root, _file)
+                mtime = stat(path).st_mtime
+                if last_write is None or mtime > last_write:
+                    last_write = mtime
+                if _file.endswith('.fastq.gz'):
+                    mtimes[path] = mtime
+
+        paths = [x for x in mtimes if mtimes[x] >= last_write - window]
+
+        logging.info(f"checking {len(paths)} of {len(mtimes)} fastq.gz "
+                     f"files in {job_dir} for incomplete output")
+
+        counter = SequenceCounter(self.get_klp_config_value(
+            'local_seq_counts_pool_size', 2))
+
+        invalid = counter.find_invalid(paths)
+        for path in invalid:
+            logging.warning(f"removing incomplete output {path}")
+            remove(path)
+
+        return invalid
+
+    def rerun_failed_samples(self, job, make_job, input_dirs):
+        """
+        Reruns an interrupted Job for only the samples whose output is
+        missing or was modified since it was recorded.
+        :param job: The original Job object.
+        :param make_job: A callable(input_dirs, output_path) returning a new
+        Job of the same type that processes the given input directories.
+        :param input_dirs: A list of the original Job's input directories.
+        :return: A list of the sample-ids rerun.
+        """
+        job_name = job.__class__.__name__
+        job_dir = join(self.pipeline.output_path, job_name)
+
+        # remove output that no longer matches the restart manifest so that
+        # audit() reports its samples as failed.
+        if job_name in self.restart_verification:
+            verification = self.restart_verification[job_name]
+            for rel_path in verification['modified']:
+                remove(join(job_dir, rel_path))
+        else:
+            # the Job was interrupted before a manifest was recorded. the
+            # fastq files it was writing may be truncated.
+            self.remove_incomplete_output(job_dir)
+
+        sample_ids = job.audit(self.pipeline.get_sample_ids())
+
+        rerun = PartialRerun(self.pipeline.output_path, job_name)
+
+        # remove anything left behind by a previous attempt.
+        rerun.cleanup()
+
+        staged = 0
+        reduced_dirs = []
+        for i, input_dir in enumerate(input_dirs):
+            reduced_dir, count = rerun.stage_inputs(input_dir, sample_ids,
+                                                    self.get_file_stager(),
+                                                    str(i))
+            reduced_dirs.append(reduced_dir)
+            staged += count
+
+        if staged == 0:
+            # the remaining samples may have no input to process because
+            # they failed an earlier step, in which case the Job is
+            # otherwise complete. Any other sample w/out input means its
+            # files weren't matched to it, and the Job is not complete.
+            rerun.cleanup()
+
+            failed_earlier = self.fsr.sample_state if hasattr(
+                self, 'fsr') else {}
+            unexplained = [x for x in sample_ids if failed_earlier.get(x)
+                           is None]
+
+            if unexplained:
+                raise WorkflowError(f"{job_name} has no output for "
+                                    f"{len(unexplained)} samples but none "
+                                    "of their input could be found in "
+                                    f"{', '.join(input_dirs)}: "
+                                    f"{', '.join(unexplained)}")
+
+            with open(join(job_dir, 'job_completed'), 'w') as f:
+                f.write('')
+            self.restart_summary.append(f"{job_name}: no samples to rerun")
+            return []
+
+        logging.info(f"rerunning {job_name} for {len(sample_ids)} samples: "
+                     f"{', '.join(sample_ids)}")
+
+        make_job(reduced_dirs, rerun.rerun_path).run(
+            callback=self.job_callback)
+
+        count = rerun.merge(sample_ids)
+        rerun.cleanup()
+
+        self.restart_summary.append(f"{job_name}: rerun for "
+                                    f"{len(sample_ids)} samples; {count} "
+                                    "files merged")
+
+        return sample_ids
 
     def what_am_i(self):
         """
@@ -157,11 +577,12 @@ class Workflow():
         metadata on BLANKS.
         """
         from_qiita = {}
+        study_cache = self.get_study_cache()
 
         for study_id in self.prep_file_paths:
             url = f'/api/v1/study/{study_id}/samples'
             logging.debug(url)
-            samples = list(self.qclient.get(url))
+            samples = list(study_cache.get(url))
             from_qiita[study_id] = samples
 
         add_sif_info = []
@@ -195,6 +616,7 @@ class Workflow():
         Updates the blanks registered in a given project in Qiita.
         :return:
         """
+        study_cache = self.get_study_cache()
 
         for sif_path in self.sifs:
             # get study_id from sif_file_name ...something_14385_blanks.tsv
@@ -213,7 +635,7 @@ class Workflow():
                 return
 
             # Get list of BLANKs already registered in Qiita.
-            from_qiita = self.qclient.get(f'/api/v1/study/{study_id}/samples')
+            from_qiita = study_cache.get(f'/api/v1/study/{study_id}/samples')
             from_qiita = [x for x in from_qiita if
                           x.startswith(f'{study_id}.BLANK')]
 
@@ -224,7 +646,7 @@ class Workflow():
                 # Generate dummy entries for each new BLANK, if any.
                 url = f'/api/v1/study/{study_id}/samples/info'
                 logging.debug(url)
-                categories = self.qclient.get(url)['categories']
+                categories = study_cache.get(url)['categories']
 
                 # initialize payload w/required dummy categories
                 data = {i: {c: 'control sample' for c in categories} for i in
@@ -237,17 +659,18 @@ class Workflow():
                     for column in sif_data[new_blank]:
                         data[new_blank][column] = sif_data[new_blank][column]
 
-                # http_patch will raise Error if insert failed.
-                self.qclient.http_patch(f'/api/v1/study/{study_id}/samples',
-                                        data=dumps(data))
+                # http_patch will raise Error if insert failed. The cached
+                # metadata for this study is invalidated afterwards.
+                study_cache.http_patch(f'/api/v1/study/{study_id}/samples',
+                                       data=dumps(data))
 
-    def _helper_process_operations(self):
+    def _helper_process_operations(self, packager):
         """
         Helper method for generate_commands()
-        :return:
+        :param packager: A Packager object.
+        :return: None
         """
         RESULTS_DIR = 'final_results'
-        TAR_CMD = 'tar zcvf'
         LOG_PREFIX = 'logs'
         REPORT_PREFIX = 'reports'
         PREP_PREFIX = 'prep-files'
@@ -257,95 +680,123 @@ class Workflow():
         PREPFILE_JOB = 'GenPrepFileJob'
         TAR_EXT = 'tgz'
 
-        op_meta = [(['ConvertJob/logs'], TAR_CMD,
-                    f'{LOG_PREFIX}-{CONVERT_JOB}.{TAR_EXT}', 'OUTPUT_FIRST'),
+        archives = [(['ConvertJob/logs'],
+                     f'{LOG_PREFIX}-{CONVERT_JOB}.{TAR_EXT}'),
 
-                   (['ConvertJob/Reports', 'ConvertJob/logs'], TAR_CMD,
-                    f'{REPORT_PREFIX}-{CONVERT_JOB}.{TAR_EXT}',
-                    'OUTPUT_FIRST'),
+                    (['ConvertJob/Reports', 'ConvertJob/logs'],
+                     f'{REPORT_PREFIX}-{CONVERT_JOB}.{TAR_EXT}'),
 
-                   (['NuQCJob/logs'], TAR_CMD,
-                    f'{LOG_PREFIX}-{QC_JOB}.{TAR_EXT}', 'OUTPUT_FIRST'),
+                    (['NuQCJob/logs'], f'{LOG_PREFIX}-{QC_JOB}.{TAR_EXT}'),
 
-                   (['FastQCJob/logs'], TAR_CMD,
-                    f'{LOG_PREFIX}-{FASTQC_JOB}.{TAR_EXT}', 'OUTPUT_FIRST'),
+                    (['FastQCJob/logs'],
+                     f'{LOG_PREFIX}-{FASTQC_JOB}.{TAR_EXT}'),
 
-                   (['FastQCJob/fastqc'], TAR_CMD,
-                    f'{REPORT_PREFIX}-{FASTQC_JOB}.{TAR_EXT}', 'OUTPUT_FIRST'),
+                    (['FastQCJob/fastqc'],
+                     f'{REPORT_PREFIX}-{FASTQC_JOB}.{TAR_EXT}'),
 
-                   (['GenPrepFileJob/logs'], TAR_CMD,
-                    f'{LOG_PREFIX}-{PREPFILE_JOB}.{TAR_EXT}', 'OUTPUT_FIRST'),
+                    (['GenPrepFileJob/logs'],
+                     f'{LOG_PREFIX}-{PREPFILE_JOB}.{TAR_EXT}'),
 
-                   (['GenPrepFileJob/PrepFiles'], TAR_CMD,
-                    f'{PREP_PREFIX}.{TAR_EXT}', 'OUTPUT_FIRST'),
+                    (['GenPrepFileJob/PrepFiles'],
+                     f'{PREP_PREFIX}.{TAR_EXT}')]
 
-                   (['failed_samples.html', 'touched_studies.html'],
-                    'mv', RESULTS_DIR, 'INPUTS_FIRST'),
+        moves = [(['failed_samples.html', 'touched_studies.html'],
+                  RESULTS_DIR),
 
-                   (['FastQCJob/multiqc'], 'mv', RESULTS_DIR, 'INPUTS_FIRST')]
+                 (['FastQCJob/multiqc'], RESULTS_DIR)]
 
-        cmds = []
+        # it's okay for an operation to go unprocessed if none of its
+        # inputs exist. Packager will ignore it.
+        for inputs, archive_name in archives:
+            packager.add_archive(archive_name, inputs)
 
-        for inputs, action, output, order in op_meta:
-            confirmed_inputs = []
-            for input in inputs:
-                if exists(join(self.pipeline.output_path, input)):
-                    # it's expected that some inputs may not exist due to
-                    # different pipeline types. If one or more inputs do not
-                    # exist, do not include them in the command-line as they
-                    # may cause an error.
-                    confirmed_inputs.append(input)
-
-            # do not add the command to the list unless at least one of
-            # the inputs exists. It's okay for a command to go unprocessed.
-            if confirmed_inputs:
-                # convert to string form before using.
-                confirmed_inputs = ' '.join(confirmed_inputs)
-                if order == 'OUTPUT_FIRST':
-                    cmds.append(f'{action} {output} {confirmed_inputs}')
-                elif order == 'INPUTS_FIRST':
-                    cmds.append(f'{action} {confirmed_inputs} {output}')
-                else:
-                    raise ValueError(f"'{order}' is not a defined order of "
-                                     "operations")
-
-        return cmds
+        for inputs, destination in moves:
+            packager.add_move(inputs, destination)
 
     def _process_blanks(self):
         """
         Helper method for generate_commands().
-        :return:
+        :return: A list of sample-information files to archive.
         """
-        results = [x for x in listdir(self.pipeline.output_path) if
-                   x.endswith('_blanks.tsv')]
+        _, files = self.get_output_index().listdir(self.pipeline.output_path)
+        results = [x for x in files if x.endswith('_blanks.tsv')]
 
         results.sort()
 
-        if len(results) > 0:
-            return 'tar zcvf sample-files.tgz' + ' ' + ' '.join(results)
+        return results
 
     def _process_fastp_report_dirs(self):
         """
         Helper method for generate_commands().
-        :return:
+        :return: A list of fastp report directories to archive.
         """
+        REPORTS_DIR = 'fastp_reports_dir'
+        nuqc_path = join(self.pipeline.output_path, 'NuQCJob')
         report_dirs = []
 
-        for root, dirs, files in walk(self.pipeline.output_path):
-            for dir_name in dirs:
-                if dir_name == 'fastp_reports_dir':
-                    # generate the full path for this directory before
-                    # truncating everything up to the NuQCJob directory.
-                    full_path = join(root, dir_name).split('NuQCJob/')
-                    report_dirs.append(join('NuQCJob', full_path[1]))
-
-        if report_dirs:
-            report_dirs.sort()
-            return 'tar zcvf reports-NuQCJob.tgz ' + ' '.join(report_dirs)
-        else:
-            # It is okay to return an empty list of commands if reports_dirs
-            # is empty. Some pipelines do not generate fastp reports.
-            return []
+        # NuQCJob and its project directories are listed directly, rather
+        # than through the output index, which would first index every
+        # fastq and log file beneath NuQCJob.
+        try:
+            with scandir(nuqc_path) as entries:
+                subdirs = [x.name for x in entries if x.is_dir()]
+        except FileNotFoundError:
+            # It is okay to return an empty list if reports_dirs is empty.
+            # Some pipelines do not generate fastp reports.
+            return report_dirs
+
+        # NuQCJob writes reports to NuQCJob/<project>/fastp_reports_dir.
+        if REPORTS_DIR in subdirs:
+            report_dirs.append(join('NuQCJob', REPORTS_DIR))
+
+        for dir_name in subdirs:
+            with scandir(join(nuqc_path, dir_name)) as entries:
+                if any(x.name == REPORTS_DIR and x.is_dir() for x in entries):
+                    report_dirs.append(join('NuQCJob', dir_name, REPORTS_DIR))
+
+        if not report_dirs:
+            # in case the layout changes, search a limited number of levels
+            # below NuQCJob. os.walk() only lists the directories it visits.
+            max_depth = self.get_klp_config_value('fastp_reports_max_depth',
+                                                  3)
+            for root, dirs, _ in walk(nuqc_path):
+                if REPORTS_DIR in dirs:
+                    report_dirs.append(relpath(join(root, REPORTS_DIR),
+                                               self.pipeline.output_path))
+                    dirs.remove(REPORTS_DIR)
+
+                # dirs are one level below root.
+                level = 1 if root == nuqc_path else relpath(
+                    root, nuqc_path).count(sep) + 2
+                if level >= max_depth:
+                    dirs.clear()
+
+        report_dirs.sort()
+        return report_dirs
+
+    def _add_fastp_report_archives(self, packager):
+        """
+        Helper method for generate_commands(). Reports are archived per
+        project, and optionally combined into a single archive.
+        :param packager: A Packager object.
+        :return: A list of the names of the archives added.
+        """
+        archives = defaultdict(list)
+        for report_dir in self._process_fastp_report_dirs():
+            # 'NuQCJob/<project>/fastp_reports_dir'. Reports not kept per
+            # project are archived together.
+            parts = report_dir.split(sep)
+            archives[parts[1] if len(parts) > 2 else 'run'].append(
+                report_dir)
+
+        combined = None
+        if self.get_klp_config_value('packaging_combine_fastp_reports',
+                                     True):
+            combined = 'reports-NuQCJob.tgz'
+
+        return packager.add_archive_set(
+            combined, [(f'reports-NuQCJob-{name}.tgz', archives[name]) for
+                       name in sorted(archives)])
 
     def _write_commands_to_output_path(self):
         """
@@ -358,47 +809,37 @@ class Workflow():
                 f.write(f'{cmd}\n')
 
     def generate_commands(self):
-        cmds = self._helper_process_operations()
-
-        result = self._process_fastp_report_dirs()
-
-        if result:
-            cmds.append(result)
+        if hasattr(self, 'fsr'):
+            # compact the failed-samples journal and render the report once,
+            # so that it can be moved into final_results.
+            self.fsr.dump()
+            self.fsr.generate_report()
 
-        result = self._process_blanks()
+        self.packager = Packager(
+            self.pipeline.output_path,
+            join(self.pipeline.output_path, 'final_results'),
+            max_workers=self.get_klp_config_value('packaging_pool_size', 4),
+            use_pigz=self.get_klp_config_value('packaging_use_pigz', True))
 
-        if result:
-            cmds.append(result)
+        self._helper_process_operations(self.packager)
 
-        # if one or more tar-gzip files are found (which we expect there to
-        # be), move them into the 'final_results' directory. However, if none
-        # are present, don't raise an error.
-        cmds.append('(find *.tgz -maxdepth 1 -type f | xargs mv -t '
-                    'final_results) || true')
+        self._add_fastp_report_archives(self.packager)
 
-        # prepend each command with a change-directory to the correct
-        # location.
-        cmds = [f'cd {self.pipeline.output_path}; {cmd}' for cmd in cmds]
+        self.packager.add_archive('sample-files.tgz', self._process_blanks())
 
-        self.cmds = cmds
+        # archives are written directly into the 'final_results' directory.
+        # the list of equivalent shell commands is kept for auditing.
+        self.cmds = self.packager.get_commands()
 
         self._write_commands_to_output_path()
 
     def execute_commands(self):
-        # execute the list of commands in order
-        for cmd in self.cmds:
-            p = Popen(cmd,
-                      universal_newlines=True,
-                      shell=True,
-                      stdout=PIPE,
-                      stderr=PIPE)
-            _, _ = p.communicate()
-            return_code = p.returncode
-
-            if return_code != 0:
-                # during testing, ignore processes that fail and continue
-                # to test other commands.
-                raise WorkflowError(f"'{cmd}' returned {return_code}")
+        # build all archives concurrently, then move the remaining reports
+        # into place.
+        try:
+            self.packager.execute()
+        except (ValueError, OSError, tarfile.TarError) as e:
+            raise WorkflowError(f"packaging results failed: {e}")
 
     def _project_metadata_check(self):
         """
@@ -411,13 +852,14 @@ class Workflow():
         # decide (using its metapool dependency) which column names are
         # reserved.
         qiita_ids = [x['qiita_id'] for x in self.pipeline.get_project_info()]
+        study_cache = self.get_study_cache()
 
         results = []
 
         for qiita_id in qiita_ids:
             url = f"/api/v1/study/{qiita_id}/samples/info"
             logging.debug(f"URL: {url}")
-            categories = self.qclient.get(url)["categories"]
+            categories = study_cache.get(url)["categories"]
 
             res = self.pipeline.identify_reserved_words(categories)
 
@@ -586,45 +1028,21 @@ class Workflow():
 
     @classmethod
     def _determine_orientation(cls, file_name):
-        # aka forward, reverse, and indexed reads
-        orientations = ['R1', 'R2', 'I1', 'I2']
-
-        results = []
-
-        # assume orientation is always present in the file's name.
-        # assume that it is of one of the four forms above.
-        # assume that it is always the right-most occurance of the four
-        # orientations above.
-        # assume that orientation is encapsulated with either '_' or '.'
-        # e.g.: '_R1_', '.I2.'.
-        # assume users can and will include any or all of the four
-        # orientation as part of their filenames as well. e.g.:
-        # ABC_7_04_1776_R1_SRE_S3_L007_R2_001.trimmed.fastq.gz
-        for o in orientations:
-            variations = [f"_{o}_", f".{o}."]
-            for v in variations:
-                # rfind searches from the end of the string, rather than
-                # its beginning. It returns the position in the string
-                # where the substring begins.
-                results.append((file_name.rfind(v), o))
-
-        # the orientation will be the substring found with the maximum
-        # found value for pos. That is, it will be the substring that
-        # begins at the rightest most position in the file name.
-        results.sort(reverse=True)
-
-        pos, orientation = results[0]
-
-        # if no orientations were found, then return None.
-        return None if pos == -1 else orientation
+        # aka forward, reverse, and indexed reads. See
+        # OrientationClassifier for the rules used.
+        return cls.orientation_classifier.classify(file_name)
 
     def _get_postqc_fastq_files(self, out_dir, project):
         af = None
+        index = self.get_output_index()
         sub_folders = ['amplicon', 'filtered_sequences', 'trimmed_sequences']
         for sub_folder in sub_folders:
             sf = join(out_dir, 'NuQCJob', project, sub_folder)
-            if exists(sf):
-                af = [f for f in glob(join(sf, '*.fastq.gz'))]
+            contents = index.listdir(sf)
+            if contents is not None:
+                # equivalent to glob(join(sf, '*.fastq.gz')).
+                af = [join(sf, f) for f in contents[1] if
+                      f.endswith('.fastq.gz') and not f.startswith('.')]
                 break
         if af is None or not af:
             raise WorkflowError("NuQCJob output not in expected location")
@@ -684,6 +1102,19 @@ class Workflow():
                 'Artifact Name': artifact_name,
                 'Prep URL': prep_url, 'Linking JobID': job_id}
 
+    def get_file_stager(self):
+        """
+        Returns the FileStager used to place copies of fastq files.
+        :return: A FileStager object.
+        """
+        with self.lock:
+            if self.file_stager is None:
+                self.file_stager = FileStager(
+                    self.get_klp_config_value('file_staging_pool_size', 8),
+                    self.get_klp_config_value('file_staging_mode', 'link'))
+
+        return self.file_stager
+
     def _copy_files(self, files):
         # increment the prep_copy_index before generating a new set of copies.
         self.prep_copy_index += 1
@@ -694,13 +1125,59 @@ class Workflow():
                 path_name, file_name = split(some_path)
                 path_name = join(path_name, f'copy{self.prep_copy_index}')
                 makedirs(path_name, exist_ok=True)
+                self.get_output_index().invalidate(path_name)
+                self.get_output_index().invalidate(split(path_name)[0],
+                                                   recursive=False)
                 new_files[key].append(join(path_name, file_name))
 
+        # hard-link the files where possible, rather than copying them. Qiita
+        # moves the files it is given, which only removes the new link and
+        # leaves the original and all other copies intact. Symlinks are never
+        # used, as Qiita would be given links into the pipeline's output.
+        pairs = []
         for key in files:
-            for src, dst in zip(files[key], new_files[key]):
-                copyfile(src, dst)
+            pairs += list(zip(files[key], new_files[key]))
+
+        stager = self.get_file_stager()
+        stager.stage(pairs, allow_symlinks=False)
+        logging.info("bytes avoided copying fastq files: %d" %
+                     stager.stats['bytes_avoided'])
+
         return new_files
 
+    def index_prep_files(self):
+        """
+        Locates the prep-info files generated by GenPrepFileJob.
+        Sets prep_file_paths and has_replicates w/out having to recover the
+        full state of GenPrepFileJob.
+        :return: A list of paths to prep-info files.
+        """
+        tmp = join(self.pipeline.output_path, 'GenPrepFileJob', 'PrepFiles')
+
+        self.has_replicates = False
+
+        prep_paths = []
+        self.prep_file_paths = defaultdict(list)
+
+        for root, dirs, files in self.get_output_index().walk(tmp):
+            for _file in files:
+                if _file.endswith('.tsv'):
+                    # breakup the prep-info-file into segments
+                    # (run-id, project_qid, other) and cleave
+                    # the qiita-id from the project_name.
+                    qid = _file.split('.')[1].split('_')[-1]
+                    _path = abspath(join(root, _file))
+                    prep_paths.append(_path)
+                    self.prep_file_paths[qid].append(_path)
+
+            for _dir in dirs:
+                if _dir == '1':
+                    # if PrepFiles contains the '1' directory, then it's a
+                    # given that this sample-sheet contains replicates.
+                    self.has_replicates = True
+
+        return prep_paths
+
     def get_prep_file_paths(self):
         return self.prep_file_paths
 
@@ -713,11 +1190,12 @@ class Workflow():
 
         tids_by_qiita_id = {}
         sample_names_by_qiita_id = {}
+        study_cache = self.get_study_cache()
 
         for qiita_id in qiita_ids:
             # Qiita returns a set of sample-ids in qsam and a dictionary where
             # sample-names are used as keys and tube-ids are their values.
-            qsam, tids = self.get_samples_in_qiita(self.qclient, qiita_id)
+            qsam, tids = self.get_samples_in_qiita(study_cache, qiita_id)
 
             sample_names_by_qiita_id[str(qiita_id)] = qsam
 
@@ -10,10 +10,6 @@ from os import environ
 from qiita_client import ArtifactInfo
 from os import makedirs
 from os.path import join, exists
-from sequence_processing_pipeline.PipelineError import PipelineError
-from metapool import load_sample_sheet
-from .Workflows import WorkflowError
-from .WorkflowFactory import WorkflowFactory
 
 
 CONFIG_FP = environ["QP_KLP_CONFIG_FP"]
@@ -48,6 +44,15 @@ def sequence_processing_pipeline(qclient, job_id, parameters, out_dir):
     bool, list, str
         The results of the job
     """
+    # the workflows and the Jobs, pandas and metapool they depend on are
+    # imported here, rather than when the plugin is loaded. The plugin is
+    # also loaded to configure it and to register it w/Qiita, neither of
+    # which need them.
+    from sequence_processing_pipeline.PipelineError import PipelineError
+    from metapool import load_sample_sheet
+    from .Workflows import WorkflowError
+    from .WorkflowFactory import WorkflowFactory
+
     status_line = StatusUpdate(qclient, job_id)
 
     # NB: RESTART FUNCTIONALITY:
@@ -143,6 +148,11 @@ def sequence_processing_pipeline(qclient, job_id, parameters, out_dir):
 
         workflow = WorkflowFactory().generate_workflow(**kwargs)
 
+        if is_restart and workflow.restart_summary:
+            # note which completed jobs were verified and will be reused.
+            with open(join(out_dir, 'notes.txt'), 'a') as f:
+                f.write('\n'.join(workflow.restart_summary) + '\n')
+
         status_line.update_job_status("Getting project information")
 
         workflow.execute_pipeline()
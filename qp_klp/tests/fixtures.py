@@ -0,0 +1,205 @@
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from unittest import TestCase
+from os.path import join, split
+from os import makedirs, getcwd
+from tempfile import TemporaryDirectory
+from threading import Lock
+from time import sleep
+from qp_klp.Workflows import Workflow
+
+
+class FakeClient():
+    def __init__(self):
+        self.cwd = getcwd()
+        self.base_path = join(self.cwd, 'qp_klp/tests/data/QDir')
+        self.qdirs = {'Demultiplexed': 'Demultiplexed',
+                      'beta_div_plots': 'analysis/beta_div_plots',
+                      'rarefaction_curves': 'analysis/rarefaction_curves',
+                      'taxa_summary': 'analysis/taxa_summary',
+                      'q2_visualization': 'working_dir',
+                      'distance_matrix': 'working_dir',
+                      'ordination_results': 'working_dir',
+                      'alpha_vector': 'working_dir',
+                      'FASTQ': 'FASTQ',
+                      'BIOM': 'BIOM',
+                      'per_sample_FASTQ': 'per_sample_FASTQ',
+                      'SFF': 'SFF',
+                      'FASTA': 'FASTA',
+                      'FASTA_Sanger': 'FASTA_Sanger',
+                      'FeatureData': 'FeatureData',
+                      'job-output-folder': 'job-output-folder',
+                      'BAM': 'BAM',
+                      'VCF': 'VCF',
+                      'SampleData': 'SampleData',
+                      'uploads': 'uploads'}
+
+        self.samples_in_13059 = ['13059.SP331130A04', '13059.AP481403B02',
+                                 '13059.LP127829A02', '13059.BLANK3.3B',
+                                 '13059.EP529635B02', '13059.EP542578B04',
+                                 '13059.EP446602B01', '13059.EP121011B01',
+                                 '13059.EP636802A01', '13059.SP573843A04']
+
+        # note these samples have known tids, but aren't in good-sample-sheet.
+        self.samples_in_11661 = ['11661.1.24', '11661.1.57', '11661.1.86',
+                                 '11661.10.17', '11661.10.41', '11661.10.64',
+                                 '11661.11.18', '11661.11.43', '11661.11.64',
+                                 '11661.12.15']
+
+        self.samples_in_6123 = ['3A', '4A', '5B', '6A', 'BLANK.41.12G', '7A',
+                                '8A', 'ISB', 'GFR', '6123']
+
+        self.info_in_11661 = {'number-of-samples': 10,
+                              'categories': ['sample_type', 'tube_id']}
+
+        self.info_in_13059 = {'number-of-samples': 10,
+                              'categories': ['anonymized_name',
+                                             'collection_timestamp',
+                                             'description',
+                                             'dna_extracted',
+                                             'elevation', 'empo_1',
+                                             'empo_2', 'empo_3',
+                                             'env_biome', 'env_feature',
+                                             'env_material',
+                                             'env_package',
+                                             'geo_loc_name', 'host_age',
+                                             'host_age_units',
+                                             'host_body_habitat',
+                                             'host_body_mass_index',
+                                             'host_body_product',
+                                             'host_body_site',
+                                             'host_common_name',
+                                             'host_height',
+                                             'host_height_units',
+                                             'host_life_stage',
+                                             'host_scientific_name',
+                                             'host_subject_id',
+                                             'host_taxid', 'host_weight',
+                                             'host_weight_units',
+                                             'latitude', 'longitude',
+                                             'nyuid',
+                                             'physical_specimen_location',
+                                             'physical_specimen_remaining',
+                                             'predose_time',
+                                             'sample_type',
+                                             'scientific_name', 'sex',
+                                             'subject_id', 'taxon_id',
+                                             'title', 'tube_id']}
+
+        # Study not in qiita-rc. Faking results.
+        self.info_in_6123 = {'number-of-samples': 10,
+                             'categories': ['sample_type', 'subject_id',
+                                            'title']}
+
+        self.tids_13059 = {"header": ["tube_id"],
+                           "samples": {'13059.SP331130A04': ['SP331130A-4'],
+                                       '13059.AP481403B02': ['AP481403B-2'],
+                                       '13059.LP127829A02': ['LP127829A-2'],
+                                       '13059.BLANK3.3B': ['BLANK3.3B'],
+                                       '13059.EP529635B02': ['EP529635B-2'],
+                                       '13059.EP542578B04': ['EP542578B-4'],
+                                       '13059.EP446602B01': ['EP446602B-1'],
+                                       '13059.EP121011B01': ['EP121011B-1'],
+                                       '13059.EP636802A01': ['EP636802A-1'],
+                                       '13059.SP573843A04': ['SP573843A-4']}}
+
+        self.tids_11661 = {"header": ["tube_id"],
+                           "samples": {"11661.1.24": ["1.24"],
+                                       "11661.1.57": ["1.57"],
+                                       "11661.1.86": ["1.86"],
+                                       "11661.10.17": ["10.17"],
+                                       "11661.10.41": ["10.41"],
+                                       "11661.10.64": ["10.64"],
+                                       "11661.11.18": ["11.18"],
+                                       "11661.11.43": ["11.43"],
+                                       "11661.11.64": ["11.64"],
+                                       "11661.12.15": ["12.15"]}}
+
+        for key in self.qdirs:
+            self.qdirs[key] = join(self.base_path, self.qdirs[key])
+
+        for qdir in self.qdirs:
+            makedirs(self.qdirs[qdir], exist_ok=True)
+
+        self.fake_id = 1000
+        self._server_url = "some.server.url"
+        self.saved_posts = {}
+
+    def get(self, url):
+        m = {'/api/v1/study/11661/samples': self.samples_in_11661,
+             '/api/v1/study/11661/samples/categories=tube_id': self.tids_11661,
+             '/api/v1/study/11661/samples/info': self.info_in_11661,
+             '/api/v1/study/13059/samples': self.samples_in_13059,
+             '/api/v1/study/13059/samples/categories=tube_id': self.tids_13059,
+             '/api/v1/study/13059/samples/info': self.info_in_13059,
+             '/api/v1/study/6123/samples': self.samples_in_6123,
+             '/api/v1/study/6123/samples/info': self.info_in_6123,
+             '/qiita_db/artifacts/types/': self.qdirs}
+
+        if url in m:
+            return m[url]
+
+        return None
+
+    def post(self, url, data=None):
+        if '/qiita_db/prep_template/' == url:
+            self.fake_id += 1
+            return {'prep': self.fake_id}
+        elif '/qiita_db/artifact/' == url:
+            self.saved_posts[str(self.fake_id)] = data
+            self.fake_id += 1
+            return {'job_id': self.fake_id}
+        else:
+            raise ValueError("Unsupported URL")
+
+
+class LatencyFakeClient(FakeClient):
+    # a thread-safe FakeClient that simulates network round-trips.
+    def __init__(self, latency=0.1):
+        super().__init__()
+        self.latency = latency
+        self.lock = Lock()
+
+    def get(self, url):
+        sleep(self.latency)
+        return super().get(url)
+
+    def post(self, url, data=None):
+        sleep(self.latency)
+        with self.lock:
+            return super().post(url, data=data)
+
+
+class MockPipeline():
+    def __init__(self, output_path):
+        self.output_path = output_path
+
+
+class OutputDirTestCase(TestCase):
+    # a TestCase w/a temporary output directory that is removed after each
+    # test.
+    def setUp(self):
+        self.output = TemporaryDirectory()
+        self.addCleanup(self.output.cleanup)
+
+    def write(self, rel_path, contents=''):
+        # writes contents to a path beneath the output directory, creating
+        # any parent directories needed.
+        path = join(self.output.name, rel_path)
+        makedirs(split(path)[0], exist_ok=True)
+        with open(path, 'wb' if isinstance(contents, bytes) else 'w') as f:
+            f.write(contents)
+        return path
+
+    def make_workflow(self, klp_config=None):
+        # a bare Workflow whose pipeline writes to the output directory.
+        workflow = Workflow()
+        workflow.pipeline = MockPipeline(self.output.name)
+        if klp_config is not None:
+            workflow.klp_config = klp_config
+        return workflow
@@ -0,0 +1,188 @@
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from os.path import split
+from threading import Lock
+from time import sleep
+from qp_klp.Assays import Assay
+from qp_klp.Workflows import Workflow
+from fixtures import OutputDirTestCase
+import pandas as pd
+
+
+class AssayTests(OutputDirTestCase):
+    def test_replace_tube_ids_w_sample_names(self):
+        prep_fp = self.write('prep.tsv', "sample_name\trun_prefix\n"
+                                         "0363192526\tA_S1_L001\n"
+                                         "363192073\tB_S2_L001\n"
+                                         "BLANK.1.1A\tC_S3_L001\n"
+                                         "unregistered\tD_S4_L001\n")
+
+        tube_id_map = {'sample.1': '363192526',
+                       'sample.2': '363192073',
+                       'sample.3': 'BLANK.1.1A'}
+
+        Assay._replace_tube_ids_w_sample_names(prep_fp, tube_id_map)
+
+        with open(prep_fp, 'r') as f:
+            obs = f.read()
+
+        exp = ("sample_name\trun_prefix\told_sample_name\n"
+               "sample.1\tA_S1_L001\t0363192526\n"
+               "sample.2\tB_S2_L001\t363192073\n"
+               "BLANK.1.1A\tC_S3_L001\tBLANK.1.1A\n"
+               "unregistered\tD_S4_L001\tunregistered\n")
+
+        self.assertEqual(obs, exp)
+
+    def test_overwrite_prep_files(self):
+        class MockPipeline():
+            def get_project_info(self, short_names=False):
+                return [{'project_name': 'LBM', 'qiita_id': '1433'},
+                        {'project_name': 'LBM', 'qiita_id': '14332'},
+                        {'project_name': 'Other', 'qiita_id': '1'}]
+
+        class OverwritingAssay(Assay):
+            def __init__(self, process_pool_size):
+                self.pipeline = MockPipeline()
+                self.process_pool_size = process_pool_size
+                # project 1 has no tube-ids.
+                self.tube_id_map = {'1433': {'sample.1': '363192526'},
+                                    '14332': {'sample.2': '363192526'}}
+
+            def get_klp_config_value(self, key, default):
+                # files are rewritten in parallel regardless of their
+                # number and size.
+                return {'process_pool_size': self.process_pool_size,
+                        'process_pool_min_files': 0,
+                        'process_pool_min_bytes': 0}.get(key, default)
+
+        for process_pool_size in [1, 2]:
+            prep_file_paths = []
+            for project_qid in ['LBM_1433', 'LBM_14332', 'Other_1']:
+                for i in range(2):
+                    prep_file_paths.append(self.write(
+                        f'{process_pool_size}/20220423_FS10001773_12_BRB1'
+                        f'1603-0615.{project_qid}.{i}.tsv',
+                        "sample_name\trun_prefix\n0363192526\tA_S1_L001\n"))
+
+            OverwritingAssay(process_pool_size).overwrite_prep_files(
+                prep_file_paths)
+
+            obs = []
+            for prep_fp in prep_file_paths:
+                obs.append(pd.read_csv(prep_fp, sep='\t', dtype=str)[
+                    'sample_name'][0])
+
+            # each file is rewritten only w/the tube-ids of its own project.
+            self.assertEqual(obs, ['sample.1', 'sample.1',
+                                   'sample.2', 'sample.2',
+                                   '0363192526', '0363192526'])
+
+    def test_get_prep_pool_size(self):
+        class ConfiguredAssay(Assay):
+            def __init__(self, klp_config):
+                self.klp_config = klp_config
+
+            def get_klp_config_value(self, key, default):
+                return self.klp_config.get(key, default)
+
+        small = [self.write(f'small_{i}.tsv', 'x' * 10) for i in range(20)]
+
+        # a few small files are processed serially by default.
+        assay = ConfiguredAssay({})
+        self.assertEqual(assay._get_prep_pool_size(small[:2]), 1)
+        self.assertEqual(assay._get_prep_pool_size(small), 1)
+
+        assay = ConfiguredAssay({'process_pool_min_bytes': 100})
+        self.assertEqual(assay._get_prep_pool_size(small[:5]), 1)
+        self.assertEqual(assay._get_prep_pool_size(small), 4)
+
+        # no more processes than files are used.
+        assay = ConfiguredAssay({'process_pool_min_bytes': 100,
+                                 'process_pool_size': 16})
+        self.assertEqual(assay._get_prep_pool_size(small[:10]), 10)
+
+    def test_register_prep_templates(self):
+        class PostingClient():
+            def __init__(self):
+                self.posted = []
+                self.attempts = 0
+                self.lock = Lock()
+
+            def post(self, url, data=None):
+                with self.lock:
+                    self.attempts += 1
+                # later preps are registered first.
+                prep_number = int(data['name'].split('_')[-1])
+                sleep(0.01 * (4 - prep_number))
+                if 'fail' in data['prep_info']:
+                    raise ConnectionError("connection reset")
+                with self.lock:
+                    self.posted.append(data)
+                    return {'prep': 100 + prep_number}
+
+        class RegisteringAssay(Workflow, Assay):
+            def __init__(self, prep_file_paths):
+                self.prep_file_paths = prep_file_paths
+                self.qclient = PostingClient()
+                self.run_prefixes = {}
+                self.master_qiita_job_id = 'job-id'
+
+            def get_klp_config_value(self, key, default):
+                return {'process_pool_size': 1, 'qiita_max_retries': 3,
+                        'qiita_retry_backoff': 0}.get(key, default)
+
+            def _generate_artifact_name(self, prep_file_path):
+                return split(prep_file_path)[1].replace('.tsv', ''), False
+
+        prep_file_paths = {'1': [], '2': []}
+        for i in range(4):
+            prep_fp = self.write(f'prep_{i}.tsv', f"sample_name\trun_prefix\n"
+                                                  f"s{i}.a\tA_S{i}_L001\n"
+                                                  f"s{i}.b\tB_S{i}_L001\n")
+            prep_file_paths['1' if i < 3 else '2'].append(prep_fp)
+
+        assay = RegisteringAssay(prep_file_paths)
+        obs = assay._register_prep_templates(
+            lambda columns, collected: 'Metagenomic')
+
+        self.assertEqual(obs, {'1': [(100, 'prep_0', False),
+                                     (101, 'prep_1', False),
+                                     (102, 'prep_2', False)],
+                               '2': [(103, 'prep_3', False)]})
+        self.assertEqual(assay.run_prefixes[103],
+                         ['A_S3_L001', 'B_S3_L001'])
+        self.assertEqual(len(assay.qclient.posted), 4)
+        self.assertEqual(assay.qclient.posted[0]['data_type'],
+                         'Metagenomic')
+
+        # all failures are reported, along w/the preps that were
+        # registered.
+        for i in [1, 2]:
+            self.write(f'prep_{i}.tsv',
+                       "sample_name\trun_prefix\nfail\tA_S1_L001\n")
+
+        assay = RegisteringAssay(prep_file_paths)
+        with self.assertRaisesRegex(ValueError, "2 of 4 tasks failed"
+                                    "(.|\n)*prep_3.tsv \\(study 2\\): "
+                                    "prep 103"):
+            assay._register_prep_templates(
+                lambda columns, collected: 'Metagenomic')
+
+        # a POST that failed may still have registered a prep, hence it is
+        # not retried.
+        self.assertEqual(assay.qclient.attempts, 4)
+
+        # preps are not registered if a file can't be read.
+        self.write('prep_3.tsv', "run_prefix\nA_S1_L001\n")
+
+        assay = RegisteringAssay(prep_file_paths)
+        with self.assertRaisesRegex(ValueError, "1 of 4 prep-info files"):
+            assay._register_prep_templates(
+                lambda columns, collected: 'Metagenomic')
+        self.assertEqual(assay.qclient.posted, [])
@@ -0,0 +1,64 @@
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from os.path import join, islink
+from os import stat
+from qp_klp.FileStager import FileStager
+from fixtures import OutputDirTestCase
+
+
+class FileStagerTests(OutputDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.src = self.write('sample_S1_L001_R1_001.fastq.gz',
+                              "This is a file.")
+
+    def test_invalid_mode(self):
+        with self.assertRaisesRegex(ValueError, "'foo' is not a valid mode"):
+            FileStager(mode='foo')
+
+    def test_link(self):
+        stager = FileStager(max_workers=2, mode='link')
+        pairs = [(self.src, join(self.output.name, f'copy{i}'))
+                 for i in range(3)]
+
+        self.assertEqual(stager.stage(pairs), ['hardlink'] * 3)
+        self.assertEqual(stager.stats['bytes_avoided'], 45)
+        self.assertEqual(stager.stats['bytes_copied'], 0)
+
+        for _, dst in pairs:
+            self.assertEqual(stat(dst).st_ino, stat(self.src).st_ino)
+
+    def test_copy_fallback(self):
+        # a failed reflink and copy_file_range must still produce a copy.
+        stager = FileStager(mode='link')
+        dst = join(self.output.name, 'copy')
+        self.assertIn(stager._copy(self.src, dst),
+                      ['reflink', 'copy_file_range', 'copy'])
+
+        with open(dst, 'r') as f:
+            self.assertEqual(f.read(), "This is a file.")
+
+    def test_symlink_and_copy(self):
+        dst = join(self.output.name, 'symlink')
+        self.assertEqual(FileStager(mode='symlink').stage_file(self.src, dst),
+                         'symlink')
+        self.assertTrue(islink(dst))
+
+        dst = join(self.output.name, 'copy')
+        stager = FileStager(mode='copy')
+        self.assertEqual(stager.stage_file(self.src, dst), 'copy')
+        self.assertNotEqual(stat(dst).st_ino, stat(self.src).st_ino)
+        self.assertEqual(stager.stats['bytes_copied'], 15)
+
+    def test_symlinks_not_allowed(self):
+        stager = FileStager(mode='symlink')
+        dst = join(self.output.name, 'link')
+        self.assertEqual(stager.stage([(self.src, dst)],
+                                      allow_symlinks=False), ['hardlink'])
+        self.assertFalse(islink(dst))
+        self.assertEqual(stat(dst).st_ino, stat(self.src).st_ino)
@@ -0,0 +1,49 @@
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from unittest import TestCase
+from qp_klp.OrientationClassifier import OrientationClassifier
+
+
+class OrientationClassifierTests(TestCase):
+    def test_classify(self):
+        def rfind_orientation(file_name):
+            # the original implementation of Workflow._determine_orientation.
+            results = []
+            for o in ['R1', 'R2', 'I1', 'I2']:
+                for v in [f"_{o}_", f".{o}."]:
+                    results.append((file_name.rfind(v), o))
+            results.sort(reverse=True)
+            pos, orientation = results[0]
+            return None if pos == -1 else orientation
+
+        names = ["ABC_7_04_1776_R1_SRE_S3_L007_R2_001.trimmed.fastq.gz",
+                 "ABC_7_04_1776.R1.SRE_S3_L007.I2.001.trimmed.fastq.gz",
+                 "ABC_7_04_1776_I2_SRE.R1.S3_L007_R1_001.trimmed.fastq.gz",
+                 "ABC_R1_R2_001.fastq.gz", "ABC.R1.R2.001.fastq.gz",
+                 "ABC_R1.001.fastq.gz", "ABC_R3_001.fastq.gz", "_R1_",
+                 ".I1.", "R1", "", "ABC_R1_\n_R2.fastq.gz",
+                 "ABC_R1_\nfastq.gz"]
+
+        # every combination of separators and orientations, three deep.
+        parts = ['_', '.', 'R1', 'R2', 'I1', 'I2', 'X']
+        for a in parts:
+            for b in parts:
+                for c in parts:
+                    names.append(f'S{a}{b}{c}{a}{c}_001.fastq.gz')
+
+        classifier = OrientationClassifier(maxsize=16)
+        for name in names:
+            self.assertEqual(classifier.classify(name),
+                             rfind_orientation(name), name)
+
+        # repeated names are served from the cache.
+        classifier.cache_clear()
+        for i in range(3):
+            classifier.classify(names[0])
+        self.assertEqual(classifier.cache_info().hits, 2)
+        self.assertEqual(classifier.cache_info().misses, 1)
@@ -0,0 +1,72 @@
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from os.path import join
+from os import makedirs, walk
+from tempfile import TemporaryDirectory
+from qp_klp.OutputTreeIndex import OutputTreeIndex
+from fixtures import OutputDirTestCase
+
+
+class OutputTreeIndexTests(OutputDirTestCase):
+    def test_output_tree_index(self):
+        root = self.output.name
+        for path in ['ConvertJob/Feist_11661', 'ConvertJob/Gerwick_6123',
+                     'NuQCJob/Feist_11661/filtered_sequences',
+                     'NuQCJob/logs']:
+            for i in range(2):
+                self.write(f'{path}/file{i}.txt')
+
+        def as_set(results):
+            return {(r, tuple(sorted(d)), tuple(sorted(f))) for r, d, f
+                    in results}
+
+        index = OutputTreeIndex(root)
+        self.assertEqual(as_set(index.walk(root)), as_set(walk(root)))
+
+        # walking a subdirectory uses the existing scan.
+        scans = index.scans
+        top = join(root, 'NuQCJob')
+        self.assertEqual(as_set(index.walk(top)), as_set(walk(top)))
+        self.assertEqual(index.scans, scans)
+
+        dirs, files = index.listdir(join(root, 'ConvertJob'))
+        self.assertEqual(sorted(dirs), ['Feist_11661', 'Gerwick_6123'])
+        self.assertEqual(files, [])
+        self.assertIsNone(index.listdir(join(root, 'FastQCJob')))
+
+        # new files aren't visible until their directory is invalidated.
+        makedirs(join(root, 'FastQCJob'))
+        feist = join(root, 'ConvertJob', 'Feist_11661')
+        self.write('ConvertJob/Feist_11661/new.txt')
+        self.assertEqual(sorted(index.listdir(feist)[1]),
+                         ['file0.txt', 'file1.txt'])
+        self.assertNotIn('FastQCJob', index.listdir(root)[0])
+
+        index.invalidate(join(root, 'ConvertJob'))
+        index.invalidate(root, recursive=False)
+        self.assertEqual(sorted(index.listdir(feist)[1]),
+                         ['file0.txt', 'file1.txt', 'new.txt'])
+        self.assertEqual(index.listdir(join(root, 'FastQCJob')), ([], []))
+        self.assertEqual(as_set(index.walk(root)), as_set(walk(root)))
+
+        # as w/os.walk(), directories removed from dirs aren't visited.
+        visited = []
+        for _root, dirs, files in index.walk(root):
+            visited.append(_root)
+            if 'NuQCJob' in dirs:
+                dirs.remove('NuQCJob')
+        self.assertFalse([x for x in visited if 'NuQCJob' in x])
+        self.assertIn(join(root, 'ConvertJob', 'Gerwick_6123'), visited)
+
+        # paths outside the tree are passed through to os.walk().
+        with TemporaryDirectory() as other:
+            with open(join(other, 'file.txt'), 'w') as f:
+                f.write('')
+            self.assertEqual(list(index.walk(other)),
+                             [(other, [], ['file.txt'])])
+            self.assertEqual(index.listdir(other), ([], ['file.txt']))
@@ -0,0 +1,139 @@
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from os.path import join
+from os import listdir
+from shutil import rmtree, which
+from subprocess import run
+from qp_klp.Packager import Packager
+from fixtures import OutputDirTestCase
+import gzip
+import tarfile
+
+
+class PackagerTests(OutputDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.working_dir = self.output.name
+        self.results_dir = join(self.working_dir, 'final_results')
+
+        for file_path in ['ConvertJob/logs/ConvertJob.log',
+                          'ConvertJob/Reports/Demultiplex_Stats.csv',
+                          'FastQCJob/multiqc/multiqc_report.html',
+                          'touched_studies.html']:
+            self.write(file_path, "This is a file.")
+
+    def test_packager(self):
+        packager = Packager(self.working_dir, self.results_dir,
+                            max_workers=2, use_pigz=False)
+
+        self.assertTrue(packager.add_archive('logs-ConvertJob.tgz',
+                                             ['ConvertJob/logs']))
+        self.assertTrue(packager.add_archive('reports-ConvertJob.tgz',
+                                             ['ConvertJob/Reports',
+                                              'ConvertJob/logs',
+                                              'NuQCJob/logs']))
+        # archives w/out any existing inputs are ignored.
+        self.assertFalse(packager.add_archive('logs-NuQCJob.tgz',
+                                              ['NuQCJob/logs']))
+        self.assertTrue(packager.add_move(['failed_samples.html',
+                                           'touched_studies.html',
+                                           'FastQCJob/multiqc'],
+                                          'final_results'))
+
+        exp = [f'cd {self.working_dir}; tar zcvf final_results/logs-'
+               'ConvertJob.tgz ConvertJob/logs',
+               f'cd {self.working_dir}; tar zcvf final_results/reports-'
+               'ConvertJob.tgz ConvertJob/Reports ConvertJob/logs',
+               f'cd {self.working_dir}; mv touched_studies.html '
+               'FastQCJob/multiqc final_results']
+        self.assertEqual(packager.get_commands(), exp)
+
+        packager.execute()
+
+        self.assertEqual(sorted(listdir(self.results_dir)),
+                         ['logs-ConvertJob.tgz', 'multiqc',
+                          'reports-ConvertJob.tgz', 'touched_studies.html'])
+
+        with tarfile.open(join(self.results_dir,
+                               'reports-ConvertJob.tgz')) as tar:
+            obs = sorted(tar.getnames())
+
+        self.assertEqual(obs, ['ConvertJob/Reports',
+                               'ConvertJob/Reports/Demultiplex_Stats.csv',
+                               'ConvertJob/logs',
+                               'ConvertJob/logs/ConvertJob.log'])
+
+    def test_archive_set(self):
+        for project in ['P1', 'P2']:
+            for i in range(3):
+                self.write(f'NuQCJob/{project}/fastp_reports_dir/html/'
+                           f'{project}_{i}.html',
+                           f"report {i} for {project}" * 1000)
+
+        def get_reports(project):
+            return [f'NuQCJob/{project}/fastp_reports_dir']
+
+        for use_pigz in [False, True]:
+            if use_pigz and which('pigz') is None:
+                continue
+
+            rmtree(self.results_dir, ignore_errors=True)
+            packager = Packager(self.working_dir, self.results_dir,
+                                max_workers=2, use_pigz=use_pigz)
+
+            # archives w/out any existing inputs are ignored.
+            obs = packager.add_archive_set(
+                'reports-NuQCJob.tgz',
+                [(f'reports-NuQCJob-{x}.tgz', get_reports(x)) for x in
+                 ['P1', 'P2', 'P3']])
+            self.assertEqual(obs, ['reports-NuQCJob-P1.tgz',
+                                   'reports-NuQCJob-P2.tgz',
+                                   'reports-NuQCJob.tgz'])
+            # the combined archive is audited as an archive of all inputs.
+            cmd = packager.get_commands()[-1]
+            self.assertIn('final_results/reports-NuQCJob.tgz', cmd)
+            self.assertIn('NuQCJob/P1/fastp_reports_dir '
+                          'NuQCJob/P2/fastp_reports_dir', cmd)
+            self.assertEqual(len(packager.execute()), 3)
+
+            members = {}
+            for name in obs:
+                with tarfile.open(join(self.results_dir, name)) as tar:
+                    members[name] = {x.name: tar.extractfile(x).read() for x
+                                     in tar.getmembers() if x.isfile()}
+
+            self.assertEqual(len(members['reports-NuQCJob-P1.tgz']), 3)
+            self.assertEqual(members['reports-NuQCJob.tgz'],
+                             {**members['reports-NuQCJob-P1.tgz'],
+                              **members['reports-NuQCJob-P2.tgz']})
+
+            # the combined archive is a single tar of whole records.
+            with open(join(self.results_dir, 'reports-NuQCJob.tgz'),
+                      'rb') as f:
+                self.assertEqual(len(gzip.decompress(f.read())) %
+                                 tarfile.RECORDSIZE, 0)
+
+            if which('tar') is not None:
+                proc = run(['tar', 'tzf', join(self.results_dir,
+                                               'reports-NuQCJob.tgz')],
+                           capture_output=True, text=True)
+                self.assertEqual(proc.returncode, 0, proc.stderr)
+                self.assertEqual(proc.stderr, '')
+                self.assertIn('NuQCJob/P2/fastp_reports_dir/html/P2_2.html',
+                              proc.stdout.split())
+
+        packager = Packager(self.working_dir, self.results_dir,
+                            use_pigz=False)
+        # a set of one is built under the combined name.
+        self.assertEqual(packager.add_archive_set(
+            'combined.tgz', [('P1.tgz', get_reports('P1'))]),
+            ['combined.tgz'])
+        self.assertEqual(packager.add_archive_set(
+            None, [('P1.tgz', get_reports('P1')),
+                   ('P2.tgz', get_reports('P2'))]), ['P1.tgz', 'P2.tgz'])
+        self.assertEqual(packager.combined, [])
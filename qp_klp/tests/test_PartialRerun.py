@@ -0,0 +1,74 @@
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from os.path import join, exists
+from os import listdir
+from qp_klp.PartialRerun import PartialRerun
+from qp_klp.FileStager import FileStager
+from fixtures import OutputDirTestCase
+
+
+class PartialRerunTests(OutputDirTestCase):
+    def test_partial_rerun(self):
+        output_path = self.output.name
+        input_dir = join(output_path, 'ConvertJob')
+        job_dir = join(output_path, 'NuQCJob')
+        for sample_id in ['sample1', 'sample11', 'sample2']:
+            for read in ['R1', 'R2']:
+                self.write(f'ConvertJob/Feist_11661/{sample_id}_S1_L001_'
+                           f'{read}_001.fastq.gz', f'{sample_id} {read}')
+
+        # sample1 completed before the job was interrupted. sample11
+        # has a partially written file.
+        filtered = join(job_dir, 'Feist_11661', 'filtered_sequences')
+        self.write(join(filtered, 'sample1_S1_L001_R1_001.trimmed.fastq.gz'),
+                   'sample1 done')
+        self.write(join(filtered, 'sample11_S1_L001_R1_001.trimmed.fastq.gz'),
+                   'sample11 partial')
+        self.write('NuQCJob/logs/NuQCJob_1.log', 'original log')
+
+        rerun = PartialRerun(output_path, 'NuQCJob')
+        reduced_dir, count = rerun.stage_inputs(
+            input_dir, ['sample11', 'sample2'], FileStager(), '0')
+
+        self.assertEqual(count, 4)
+        self.assertEqual(sorted(listdir(join(reduced_dir, 'Feist_11661'))),
+                         ['sample11_S1_L001_R1_001.fastq.gz',
+                          'sample11_S1_L001_R2_001.fastq.gz',
+                          'sample2_S1_L001_R1_001.fastq.gz',
+                          'sample2_S1_L001_R2_001.fastq.gz'])
+
+        # merging the output of a job that didn't complete is an error.
+        with self.assertRaisesRegex(ValueError, "did not complete"):
+            rerun.merge(['sample11', 'sample2'])
+
+        # simulate the output of the reduced job.
+        rerun_filtered = join(rerun.rerun_job_dir, 'Feist_11661',
+                              'filtered_sequences')
+        for sample_id in ['sample11', 'sample2']:
+            self.write(join(rerun_filtered,
+                            f'{sample_id}_S1_L001_R1_001.trimmed.fastq.gz'),
+                       f'{sample_id} done')
+        self.write(join(rerun.rerun_job_dir, 'logs', 'NuQCJob_1.log'),
+                   'rerun log')
+        self.write(join(rerun.rerun_job_dir, 'job_completed'))
+
+        self.assertEqual(rerun.merge(['sample11', 'sample2']), 2)
+        rerun.cleanup()
+
+        for sample_id in ['sample1', 'sample11', 'sample2']:
+            with open(join(filtered, f'{sample_id}_S1_L001_R1_001.'
+                                     'trimmed.fastq.gz')) as f:
+                self.assertEqual(f.read(), f'{sample_id} done')
+
+        # files not belonging to the samples rerun are kept.
+        with open(join(job_dir, 'logs', 'NuQCJob_1.log')) as f:
+            self.assertEqual(f.read(), 'original log')
+
+        self.assertTrue(exists(join(job_dir, 'job_completed')))
+        self.assertFalse(exists(join(output_path, 'partial_rerun',
+                                     'NuQCJob')))
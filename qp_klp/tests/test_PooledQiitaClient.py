@@ -0,0 +1,191 @@
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from unittest import TestCase
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread, Lock
+from json import dumps
+from time import sleep
+from qp_klp.PooledQiitaClient import PooledQiitaClient
+from qp_klp.TaskRunner import TaskRunner
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 allows connections to be kept alive between requests.
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, body):
+        self.server.record(self.path, self.client_address)
+
+        # '/slow' requests take long enough to overlap one another.
+        if self.path.startswith('/slow'):
+            self.server.enter()
+            sleep(0.2)
+            self.server.leave()
+
+        payload = dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._respond({'path': self.path})
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        data = self.rfile.read(length).decode()
+        self._respond({'path': self.path, 'data': data})
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.lock = Lock()
+        self.paths = []
+        self.client_ports = set()
+        self.active = 0
+        self.max_active = 0
+
+    def record(self, path, client_address):
+        with self.lock:
+            self.paths.append(path)
+            self.client_ports.add(client_address[1])
+
+    def enter(self):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+    def leave(self):
+        with self.lock:
+            self.active -= 1
+
+
+class StubQiitaClient():
+    """
+    Sends requests the same way QiitaClient does, minus authentication.
+    """
+    def __init__(self, server_url):
+        self._server_url = server_url
+
+    def _request_retry(self, req, url, rettype='json', **kwargs):
+        r = req(self._server_url + url, **kwargs)
+        r.raise_for_status()
+        return r.json()
+
+    def get(self, url, **kwargs):
+        raise ValueError("requests should be sent through the session")
+
+
+class PooledQiitaClientTests(TestCase):
+    def setUp(self):
+        self.server = StubServer()
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        host, port = self.server.server_address
+        self.qclient = StubQiitaClient(f'http://{host}:{port}')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_sync_api(self):
+        client = PooledQiitaClient(self.qclient, max_concurrency=2)
+
+        for i in range(5):
+            self.assertEqual(client.get(f'/api/v1/study/{i}/samples'),
+                             {'path': f'/api/v1/study/{i}/samples'})
+
+        obs = client.post('/qiita_db/prep_template/', data={'a': 1})
+        self.assertEqual(obs['path'], '/qiita_db/prep_template/')
+        self.assertEqual(obs['data'], 'a=1')
+
+        # requests sent one after another reuse the same connection.
+        self.assertEqual(len(self.server.client_ports), 1)
+
+        # other attributes are those of the wrapped client.
+        self.assertEqual(client._server_url, self.qclient._server_url)
+
+        self.assertEqual(client.get_stats(), {'requests': 6,
+                                              'coalesced': 0})
+
+        histograms = client.get_histograms()
+        self.assertEqual(set(histograms), {'get', 'post'})
+        self.assertEqual(sum(x[1] for x in histograms['get']), 5)
+        self.assertEqual(sum(x[1] for x in histograms['post']), 1)
+        self.assertIsNone(histograms['get'][-1][0])
+
+        client.close()
+
+    def test_coalescing(self):
+        client = PooledQiitaClient(self.qclient, max_concurrency=4)
+
+        results = []
+        threads = [Thread(target=lambda: results.append(
+                   client.get('/slow/api/v1/study/1/samples')))
+                   for _ in range(5)]
+
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # identical requests in flight at the same time are sent once.
+        self.assertEqual(self.server.paths,
+                         ['/slow/api/v1/study/1/samples'])
+        self.assertEqual(results,
+                         [{'path': '/slow/api/v1/study/1/samples'}] * 5)
+        self.assertEqual(client.get_stats(), {'requests': 1,
+                                              'coalesced': 4})
+
+        # results are not cached once the request has completed.
+        client.get('/slow/api/v1/study/1/samples')
+        self.assertEqual(len(self.server.paths), 2)
+
+        client.close()
+
+    def test_concurrency_limit(self):
+        client = PooledQiitaClient(self.qclient, max_concurrency=2)
+
+        urls = [f'/slow/api/v1/study/{i}/samples' for i in range(6)]
+        obs = TaskRunner(max_workers=6).run(client.get, [(x,) for x in urls])
+
+        self.assertEqual([x['path'] for x in obs], urls)
+        self.assertEqual(self.server.max_active, 2)
+        self.assertLessEqual(len(self.server.client_ports), 2)
+
+        client.close()
+
+    def test_fallback(self):
+        class FakeClient():
+            def __init__(self):
+                self.results = []
+
+            def get(self, url):
+                self.results.append({'url': url})
+                return self.results[-1]
+
+        # clients w/out _request_retry() are called directly.
+        fake_client = FakeClient()
+        client = PooledQiitaClient(fake_client)
+        obs = client.get('/a')
+        self.assertEqual(obs, {'url': '/a'})
+
+        # the caller that sent a request is given a copy of the result, as
+        # are any callers that shared it.
+        self.assertIsNot(obs, fake_client.results[0])
+        client.close()
+
+        with self.assertRaisesRegex(ValueError, "positive integer"):
+            PooledQiitaClient(FakeClient(), max_concurrency=0)
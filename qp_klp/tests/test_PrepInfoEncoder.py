@@ -0,0 +1,83 @@
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from os.path import join
+from json import dumps
+from qp_klp.Assays import Assay
+from qp_klp.PrepInfoEncoder import PrepInfoEncoder
+from fixtures import OutputDirTestCase
+
+
+class PrepInfoEncoderTests(OutputDirTestCase):
+    def test_parity_w_pandas(self):
+        def read(file_name):
+            with open(join('qp_klp', 'tests', 'data', file_name),
+                      encoding='utf-8') as f:
+                return f.read()
+
+        cases = [
+            # files generated by GenPrepFileJob.
+            read('good-sample-prep.tsv'),
+            read('20230101_XX99999999_99_LOL99999-9999.NYU_BMS_Melanoma_'
+                 '13059.1.tsv'),
+            # numeric-looking values remain strings.
+            'sample_name\trun_prefix\tx\n001\tp1\t1.10\n',
+            # empty fields, NA strings, blank lines and quoted tabs.
+            'sample_name\trun_prefix\tx\n1.a\t\tnull\n\n2.b\tNA\t'
+            '"q\tz"\n',
+            # short rows.
+            'sample_name\ta\tb\n1\tx\n2\n',
+            # CRLF line endings and a byte-order mark.
+            '\ufeffsample_name\ta\r\n1\tx\r\n',
+            # a missing sample_name and a sample_name that isn't first.
+            'a\tsample_name\tb\nx\t\ty\nx\t2\ty\n',
+            # whitespace and characters escaped by JSON.
+            'sample_name\ta\n 1 \t\u00b5 "q" \\ \n',
+            'sample_name\ta\n']
+
+        for contents in cases:
+            path = self.write('prep.tsv', contents.encode('utf-8'))
+            exp = dumps(Assay._parse_prep_file(path))
+            self.assertEqual(PrepInfoEncoder(path).encode(), exp)
+
+    def test_collect(self):
+        path = self.write('prep.tsv', 'sample_name\trun_prefix\ttarget_gene\n'
+                                      'a\tp1\t16S\nb\t\t16S\n')
+        encoder = PrepInfoEncoder(path)
+        encoder.encode(collect=['run_prefix', 'instrument_model'])
+        self.assertEqual(encoder.sample_names, ['a', 'b'])
+        self.assertEqual(list(encoder.collected), ['run_prefix'])
+        self.assertEqual(encoder.collected['run_prefix'][0], 'p1')
+        self.assertIs(encoder.collected['run_prefix'][1], PrepInfoEncoder.NAN)
+
+    def test_errors(self):
+        path = self.write('prep.tsv', 'sample_name\ta\n1\tx\n1\ty\n')
+        with self.assertRaisesRegex(ValueError, "duplicate sample_name '1'"):
+            PrepInfoEncoder(path).encode()
+
+        # pandas raises on duplicate sample_names as well.
+        with self.assertRaises(ValueError):
+            Assay._parse_prep_file(path)
+
+        path = self.write('prep.tsv', 'run_prefix\ta\np1\tx\n')
+        with self.assertRaisesRegex(ValueError, "'sample_name' column"):
+            PrepInfoEncoder(path).encode()
+
+        path = self.write('prep.tsv', 'sample_name\ta\ta\n1\tx\ty\n')
+        with self.assertRaisesRegex(ValueError, "duplicate columns: a"):
+            PrepInfoEncoder(path).encode()
+
+        path = self.write('prep.tsv', 'sample_name\ta\n1\tx\n2\tx\ty\n')
+        with self.assertRaisesRegex(ValueError, "line 3: expected 2 fields"):
+            PrepInfoEncoder(path).encode()
+
+        with self.assertRaises(ValueError):
+            Assay._parse_prep_file(path)
+
+        path = self.write('prep.tsv', '')
+        with self.assertRaisesRegex(ValueError, "is empty"):
+            PrepInfoEncoder(path).encode()
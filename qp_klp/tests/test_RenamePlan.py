@@ -0,0 +1,69 @@
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from os.path import join, exists, split
+from os import makedirs, remove, rename
+from qp_klp.RenamePlan import RenamePlan
+from fixtures import OutputDirTestCase
+
+
+class RenamePlanTests(OutputDirTestCase):
+    def test_rename_plan(self):
+        integrated = join(self.output.name, 'integrated')
+
+        renames = []
+        for i in range(10):
+            src = join(integrated, f'C5{i:02d}.R1.fastq.gz')
+            self.write(src, src)
+            project = 'Project_1' if i % 2 else 'Project_2'
+            renames.append((src, join(integrated, project,
+                                      f'sample{i}_S{i}_L001_R1_001.'
+                                      'fastq.gz')))
+
+        journal_path = join(self.output.name, RenamePlan.FILE_NAME)
+        plan = RenamePlan(journal_path)
+        self.assertFalse(plan.exists())
+        plan.create(renames)
+        self.assertTrue(plan.exists())
+
+        # simulate an interruption after some of the files were renamed.
+        for src, dst in renames[:4]:
+            makedirs(split(dst)[0], exist_ok=True)
+            rename(src, dst)
+
+        plan = RenamePlan(journal_path)
+        plan.load()
+        self.assertEqual(plan.renames, renames)
+        self.assertEqual(plan.execute(max_workers=4), 6)
+
+        for src, dst in renames:
+            self.assertFalse(exists(src))
+            with open(dst) as f:
+                self.assertEqual(f.read(), src)
+
+        # a completed plan has nothing left to do.
+        self.assertEqual(plan.execute(), 0)
+
+        # files that are neither at their source nor their destination
+        # are reported.
+        remove(renames[0][1])
+        with self.assertRaisesRegex(ValueError, "1 files in .* are "
+                                                "missing"):
+            plan.execute()
+
+    def test_invalid_plans(self):
+        paths = [join(self.output.name, x) for x in ['a', 'b', 'c', 'd']]
+        self.write(paths[3])
+
+        plan = RenamePlan(join(self.output.name, RenamePlan.FILE_NAME))
+
+        # every problem is reported and nothing is recorded.
+        with self.assertRaisesRegex(ValueError, "4 files could not be "
+                                                "renamed"):
+            plan.create([(paths[0], paths[2]), (paths[1], paths[2]),
+                         (paths[2], paths[3]), (paths[3], paths[0])])
+        self.assertFalse(plan.exists())
@@ -0,0 +1,64 @@
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from os import remove, utime
+from qp_klp.RestartManifest import RestartManifest
+from fixtures import OutputDirTestCase
+
+
+class RestartManifestTests(OutputDirTestCase):
+    def test_restart_manifest(self):
+        job_dir = self.output.name
+        paths = {}
+        for name, size in [('a.fastq.gz', 10),
+                           ('b.fastq.gz', 3 * RestartManifest.CHUNK_SIZE),
+                           ('c.fastq.gz', 100)]:
+            paths[name] = self.write(f'filtered_sequences/{name}',
+                                     b'A' * size)
+
+        self.write('job_completed')
+
+        manifest = RestartManifest(job_dir)
+        self.assertFalse(manifest.exists())
+        self.assertEqual(manifest.create(), 4)
+        self.assertTrue(manifest.exists())
+
+        exp = {'valid': ['filtered_sequences/a.fastq.gz',
+                         'filtered_sequences/b.fastq.gz',
+                         'filtered_sequences/c.fastq.gz',
+                         'job_completed'],
+               'modified': [],
+               'missing': []}
+        self.assertEqual(RestartManifest(job_dir).verify(), exp)
+
+        # a file w/a new mtime but the same content is still valid.
+        utime(paths['a.fastq.gz'], (0, 0))
+
+        # the end of a file is rewritten w/out changing its size.
+        with open(paths['b.fastq.gz'], 'r+b') as f:
+            f.seek(-1, 2)
+            f.write(b'C')
+        utime(paths['b.fastq.gz'], (0, 0))
+
+        remove(paths['c.fastq.gz'])
+
+        # new files are ignored.
+        self.write('d.fastq.gz', 'D')
+
+        exp = {'valid': ['filtered_sequences/a.fastq.gz',
+                         'job_completed'],
+               'modified': ['filtered_sequences/b.fastq.gz'],
+               'missing': ['filtered_sequences/c.fastq.gz']}
+        self.assertEqual(RestartManifest(job_dir).verify(), exp)
+
+    def test_checksum(self):
+        path = self.write('a.txt', 'ACGT')
+
+        self.assertEqual(RestartManifest.checksum(path, 'crc32'), 'a30e9ff2')
+
+        with self.assertRaisesRegex(ValueError, "not a valid checksum"):
+            RestartManifest.checksum(path, 'md5')
@@ -0,0 +1,43 @@
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from unittest import TestCase
+from os.path import join
+from qp_klp.RunPrefixIndex import RunPrefixIndex
+
+
+class RunPrefixIndexTests(TestCase):
+    def test_find(self):
+        base = 'NuQCJob/Feist_11661/filtered_sequences'
+        files = [join(base, f'{name}_{read}_001.trimmed.fastq.gz')
+                 for name in ['sample11_S2_L001', 'sample1_S1_L001',
+                              'sample2_S3_L001']
+                 for read in ['R1', 'R2']]
+
+        index = RunPrefixIndex(files)
+
+        run_prefixes = ['sample2_S3_L001', 'sample1_S1_L001', 'S2_L001',
+                        'Feist_11661', 'not_a_sample']
+
+        # w/unique S<n>s, results are the same as a substring test against
+        # each path.
+        for run_prefix in run_prefixes:
+            self.assertEqual(index.find(run_prefix),
+                             [x for x in files if run_prefix in x])
+
+        self.assertEqual(index.find_all(run_prefixes[:2]),
+                         files[4:6] + files[2:4])
+
+        # file names that contain a run_prefix other than at their start are
+        # only returned if no file name starts w/it.
+        index = RunPrefixIndex(['XA_S1_L001_R1_001.fastq.gz',
+                                'A_S1_L001_R1_001.fastq.gz'])
+        self.assertEqual(index.find('A_S1_L001'),
+                         ['A_S1_L001_R1_001.fastq.gz'])
+        self.assertEqual(index.find('S1_L001'),
+                         ['XA_S1_L001_R1_001.fastq.gz',
+                          'A_S1_L001_R1_001.fastq.gz'])
@@ -0,0 +1,112 @@
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from os.path import join
+from os import stat
+from qp_klp.SequenceCounter import SequenceCounter
+from fixtures import OutputDirTestCase
+import gzip
+
+
+class SequenceCounterTests(OutputDirTestCase):
+    def write_fastq(self, file_name, reads, members=1,
+                    trailing_newline=True):
+        records = [f'@read{i}\nACGT\n+\nFFFF\n' for i in range(reads)]
+        text = ''.join(records)
+        if not trailing_newline:
+            text = text[:-1]
+
+        # gzip files may be concatenated, as pigz does.
+        step = -(-len(text) // members) if text else 1
+        return self.write(file_name, b''.join(
+            gzip.compress(text[i:i + step].encode()) for i in
+            range(0, max(len(text), 1), step)))
+
+    def test_count_reads(self):
+        self.assertEqual(SequenceCounter.count_reads(
+            self.write_fastq('a.fastq.gz', 10)), 10)
+        self.assertEqual(SequenceCounter.count_reads(
+            self.write_fastq('b.fastq.gz', 0)), 0)
+        self.assertEqual(SequenceCounter.count_reads(
+            self.write_fastq('c.fastq.gz', 7, members=3)), 7)
+        self.assertEqual(SequenceCounter.count_reads(
+            self.write_fastq('d.fastq.gz', 5, trailing_newline=False)), 5)
+
+        path = self.write('e.fastq.gz', gzip.compress(b'@read1\nACGT\n+\n'))
+        with self.assertRaisesRegex(ValueError, "not a multiple of four"):
+            SequenceCounter.count_reads(path)
+
+    def test_write(self):
+        paths = [self.write_fastq('sample1_S1_L001_R1_001.fastq.gz', 3),
+                 self.write_fastq('sample1_S1_L001_R2_001.fastq.gz', 3),
+                 self.write_fastq('sample_11_S2_L001_R1_001.fastq.gz', 5,
+                                  members=2),
+                 self.write_fastq('sample_11_S2_L001_R2_001.fastq.gz', 5)]
+
+        for max_workers in [1, 2]:
+            output_dir = join(self.output.name, f'SeqCountsJob{max_workers}')
+            path = SequenceCounter(max_workers).write(paths, output_dir)
+
+            with open(path) as f:
+                self.assertEqual(f.read(), "Sample_ID,raw_reads_r1r2\n"
+                                           "sample1,6\n"
+                                           "sample_11,10\n")
+
+        with self.assertRaisesRegex(ValueError, "Sample_ID could not be"):
+            SequenceCounter().write(
+                [self.write_fastq('C501.R1.fastq.gz', 1)], self.output.name)
+
+    def test_scan(self):
+        path = self.write_fastq('a.fastq.gz', 6, members=3)
+        obs = SequenceCounter.scan(path)
+
+        self.assertEqual(obs['reads'], 6)
+        self.assertEqual(obs['bases'], 24)
+        self.assertEqual(obs['size'], stat(path).st_size)
+
+        # members are contiguous and cover the whole file.
+        self.assertEqual(len(obs['members']), 3)
+        offset = 0
+        for member_offset, compressed, _ in obs['members']:
+            self.assertEqual(member_offset, offset)
+            offset += compressed
+        self.assertEqual(offset, obs['size'])
+        with open(path, 'rb') as f:
+            self.assertEqual(sum(x[2] for x in obs['members']),
+                             len(gzip.decompress(f.read())))
+
+    def test_scan_chunk_boundaries(self):
+        # records of varying lengths, split across many small chunks.
+        records = [f'@read{i}\n{"A" * i}\n+\n{"F" * i}\n' for i in
+                   range(1, 40)]
+        path = self.write('a.fastq.gz',
+                          gzip.compress(''.join(records).encode()))
+
+        chunk_size = SequenceCounter.CHUNK_SIZE
+        try:
+            for size in [1, 7, 64]:
+                SequenceCounter.CHUNK_SIZE = size
+                obs = SequenceCounter.scan(path)
+                self.assertEqual(obs['reads'], 39)
+                self.assertEqual(obs['bases'], sum(range(1, 40)))
+        finally:
+            SequenceCounter.CHUNK_SIZE = chunk_size
+
+    def test_scan_truncated(self):
+        path = self.write_fastq('a.fastq.gz', 6, members=2)
+        size = stat(path).st_size
+
+        # an empty file contains no reads.
+        empty = self.write('b.fastq.gz', b'')
+        self.assertEqual(SequenceCounter.scan(empty)['reads'], 0)
+
+        # a file cut off inside either member is rejected.
+        for length in [size // 4, size - 4]:
+            with open(path, 'rb') as f:
+                truncated = self.write('c.fastq.gz', f.read(length))
+            with self.assertRaisesRegex(EOFError, 'ends before the end'):
+                SequenceCounter.scan(truncated)
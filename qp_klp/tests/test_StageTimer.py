@@ -0,0 +1,89 @@
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from os.path import join
+from json import load
+from threading import Thread
+from qp_klp.StageTimer import StageTimer, TimedQiitaClient
+from qp_klp.TaskRunner import TaskRunner
+from fixtures import FakeClient, OutputDirTestCase
+
+
+class StageTimerTests(OutputDirTestCase):
+    def test_stage_timer(self):
+        timer = StageTimer()
+        qclient = TimedQiitaClient(FakeClient(), timer)
+
+        # requests made outside of a stage are still counted.
+        qclient.get('/api/v1/study/11661/samples')
+
+        timer.begin('Step A', step=1)
+        qclient.get('/api/v1/study/11661/samples')
+        qclient.get('/api/v1/study/11661/samples/info')
+        timer.begin('Step B', step=2)
+        qclient.get('/api/v1/study/13059/samples')
+        timer.end()
+
+        timer.record_status_update(0.5)
+        timer.set_counter('study_cache', {'hits': 2})
+
+        # attributes other than requests are passed through.
+        self.assertEqual(qclient.info_in_11661, FakeClient().info_in_11661)
+
+        results = timer.to_dict()
+        self.assertEqual([x['name'] for x in results['stages']],
+                         ['Step A', 'Step B'])
+        self.assertEqual([x['step'] for x in results['stages']], [1, 2])
+        self.assertEqual([x['qiita_requests'] for x in results['stages']],
+                         [2, 1])
+        self.assertEqual(results['unattributed_qiita_requests']['count'], 1)
+        self.assertEqual(results['status_updates'], {'count': 1,
+                                                     'total_time': 0.5})
+        self.assertEqual(results['counters'], {'study_cache': {'hits': 2}})
+
+        for stage in results['stages']:
+            self.assertGreaterEqual(stage['wall_time'], 0)
+            self.assertGreaterEqual(stage['cpu_time'], 0)
+            self.assertGreater(stage['max_rss_to_date'], 0)
+            self.assertGreaterEqual(stage['max_rss_growth'], 0)
+            self.assertLessEqual(stage['max_rss_growth'],
+                                 stage['max_rss_to_date'])
+
+        tmp = self.output.name
+        paths = timer.write([tmp, join(tmp, 'final_results')])
+        self.assertEqual(paths, [join(tmp, 'timings.json'),
+                                 join(tmp, 'final_results', 'timings.json')])
+        with open(paths[1]) as f:
+            self.assertEqual(load(f)['stages'], results['stages'])
+
+    def test_task_runner_requests(self):
+        timer = StageTimer()
+        qclient = TimedQiitaClient(FakeClient(), timer)
+        urls = ['/api/v1/study/11661/samples', '/api/v1/study/13059/samples',
+                '/api/v1/study/6123/samples']
+
+        # requests made on a TaskRunner's threads belong to the stage that
+        # ran it.
+        timer.begin('Step A', step=1)
+        TaskRunner(max_workers=3).run(qclient.get, [(x,) for x in urls])
+        timer.end()
+
+        # stages begun on other threads are kept separate.
+        def run_stage(name):
+            with timer.stage(name):
+                qclient.get(urls[0])
+
+        threads = [Thread(target=run_stage, args=(x,)) for x in ['B', 'C']]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        results = timer.to_dict()
+        self.assertEqual({x['name']: x['qiita_requests'] for x in
+                          results['stages']}, {'Step A': 3, 'B': 1, 'C': 1})
+        self.assertEqual(results['unattributed_qiita_requests']['count'], 0)
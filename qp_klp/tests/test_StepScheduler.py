@@ -0,0 +1,91 @@
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from unittest import TestCase
+from threading import Barrier
+from qp_klp.StepScheduler import Step, StepScheduler
+
+
+class StepSchedulerTests(TestCase):
+    def test_sequential(self):
+        ran = []
+        statuses = []
+
+        steps = [Step('a', lambda: ran.append('a'), status='A'),
+                 Step('b', lambda: ran.append('b'), ['a']),
+                 Step('c', lambda: ran.append('c'), ['a'], status='C',
+                      skip=True),
+                 Step('d', lambda: ran.append('d'), ['b', 'c'], status='D',
+                      skip=lambda: False)]
+
+        scheduler = StepScheduler(
+            steps, max_workers=1,
+            on_start=lambda step, total: statuses.append((step.number,
+                                                          total)))
+
+        # w/a single worker, steps run in the order they are declared.
+        self.assertEqual(scheduler.run(), ['a', 'b', 'c', 'd'])
+
+        # skipped steps are reported but not run.
+        self.assertEqual(ran, ['a', 'b', 'd'])
+        self.assertEqual(statuses, [(1, 3), (None, 3), (2, 3), (3, 3)])
+
+    def test_concurrent(self):
+        # 'b' and 'c' can only complete if they run at the same time.
+        barrier = Barrier(2, timeout=5)
+        ran = []
+
+        def func(name):
+            barrier.wait()
+            ran.append(name)
+
+        steps = [Step('a', lambda: None),
+                 Step('b', lambda: func('b'), ['a']),
+                 Step('c', lambda: func('c'), ['a']),
+                 Step('d', lambda: ran.append('d'), ['b', 'c'])]
+
+        completed = StepScheduler(steps, max_workers=2).run()
+
+        self.assertEqual(completed[0], 'a')
+        self.assertEqual(set(completed[1:3]), {'b', 'c'})
+        self.assertEqual(completed[3], 'd')
+        self.assertEqual(ran[-1], 'd')
+
+    def test_failure(self):
+        ran = []
+        finished = []
+
+        def fail():
+            raise ValueError("step failed")
+
+        steps = [Step('a', fail),
+                 Step('b', lambda: ran.append('b')),
+                 Step('c', lambda: ran.append('c'), ['a'])]
+
+        scheduler = StepScheduler(steps, max_workers=2,
+                                  on_finish=lambda x: finished.append(x.name))
+
+        with self.assertRaisesRegex(ValueError, "step failed"):
+            scheduler.run()
+
+        # steps requiring a failed step are never run.
+        self.assertNotIn('c', ran)
+        self.assertNotIn('c', finished)
+        self.assertIn('a', finished)
+
+    def test_invalid_steps(self):
+        with self.assertRaisesRegex(ValueError, "duplicate step names: a"):
+            StepScheduler([Step('a', print), Step('a', print)])
+
+        with self.assertRaisesRegex(ValueError, "requires unknown steps: c"):
+            StepScheduler([Step('a', print), Step('b', print, ['c'])])
+
+        with self.assertRaisesRegex(ValueError, "circular dependency: a, b"):
+            StepScheduler([Step('a', print, ['b']), Step('b', print, ['a'])])
+
+        with self.assertRaisesRegex(ValueError, "positive integer"):
+            StepScheduler([Step('a', print)], max_workers=0)
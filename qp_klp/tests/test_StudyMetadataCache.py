@@ -0,0 +1,67 @@
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from unittest import TestCase
+from qp_klp.StudyMetadataCache import StudyMetadataCache
+from qp_klp.TaskRunner import TaskRunner
+from fixtures import FakeClient
+
+
+class StudyMetadataCacheTests(TestCase):
+    def setUp(self):
+        class CountingClient(FakeClient):
+            def __init__(self):
+                super().__init__()
+                self.requested = []
+                self.patched = []
+
+            def get(self, url):
+                self.requested.append(url)
+                return super().get(url)
+
+            def http_patch(self, url, data=None):
+                self.patched.append(url)
+
+        self.client = CountingClient()
+        self.cache = StudyMetadataCache(self.client,
+                                        TaskRunner(max_workers=4))
+
+    def test_prefetch(self):
+        self.cache.prefetch(['13059', '11661', '6123', '13059'])
+
+        # samples and samples/info for each study, plus tube-ids for the
+        # two studies that have them.
+        self.assertEqual(len(self.client.requested), 8)
+        self.assertEqual(self.cache.get_stats(),
+                         {'hits': 0, 'misses': 8, 'entries': 8})
+
+        obs = self.cache.get('/api/v1/study/13059/samples')
+        self.assertEqual(obs, self.client.samples_in_13059)
+        self.cache.get('/api/v1/study/6123/samples/info')
+        self.assertEqual(len(self.client.requested), 8)
+        self.assertEqual(self.cache.get_stats()['hits'], 2)
+
+    def test_uncached_urls(self):
+        self.cache.get('/qiita_db/artifacts/types/')
+        self.cache.get('/qiita_db/artifacts/types/')
+        self.assertEqual(len(self.client.requested), 2)
+        self.assertEqual(self.cache.get_stats()['entries'], 0)
+
+        # attributes not defined by the cache are those of the client.
+        self.assertEqual(self.cache._server_url, "some.server.url")
+
+    def test_invalidate_after_patch(self):
+        self.cache.prefetch(['13059', '11661'])
+        self.cache.http_patch('/api/v1/study/13059/samples', data='{}')
+        self.assertEqual(self.client.patched,
+                         ['/api/v1/study/13059/samples'])
+
+        # only entries for study 13059 should have been removed.
+        self.assertEqual(self.cache.get_stats()['entries'], 3)
+        self.cache.get('/api/v1/study/13059/samples')
+        self.cache.get('/api/v1/study/11661/samples')
+        self.assertEqual(self.cache.get_stats()['hits'], 1)
@@ -0,0 +1,56 @@
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from unittest import TestCase
+from time import sleep
+from qp_klp.TaskRunner import TaskRunner
+
+
+class TaskRunnerTests(TestCase):
+    def test_ordered_results(self):
+        def slow_square(x):
+            # later tasks complete first.
+            sleep(0.01 * (10 - x))
+            return x * x
+
+        runner = TaskRunner(max_workers=4, max_retries=0)
+        obs = runner.run(slow_square, [(x,) for x in range(10)])
+        self.assertEqual(obs, [x * x for x in range(10)])
+
+    def test_retry(self):
+        attempts = []
+
+        def flaky(x):
+            attempts.append(x)
+            if len(attempts) < 3:
+                raise ConnectionError("connection reset")
+            return x
+
+        runner = TaskRunner(max_workers=1, max_retries=2, backoff=0.01)
+        self.assertEqual(runner.run(flaky, [('a',)]), ['a'])
+        self.assertEqual(len(attempts), 3)
+
+    def test_failures_collected(self):
+        def fail_on_odd(x):
+            if x % 2:
+                raise ValueError(f"{x} is odd")
+            return x
+
+        runner = TaskRunner(max_workers=4, max_retries=1, backoff=0.01)
+        with self.assertRaisesRegex(ValueError, "2 of 4 tasks failed"):
+            runner.run(fail_on_odd, [(x,) for x in range(4)],
+                       labels=['zero', 'one', 'two', 'three'])
+
+        self.assertEqual([label for label, _ in runner.failures],
+                         ['one', 'three'])
+
+        # the results of the tasks that succeeded remain available.
+        self.assertEqual(runner.results, [0, None, 2, None])
+
+    def test_invalid_parameters(self):
+        with self.assertRaisesRegex(ValueError, "max_workers must be"):
+            TaskRunner(max_workers=0)
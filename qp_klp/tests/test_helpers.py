@@ -13,152 +13,11 @@ from os import remove, getcwd
 from qp_klp.Workflows import WorkflowError
 from qp_klp.WorkflowFactory import WorkflowFactory
 from qp_klp.FailedSamplesRecord import FailedSamplesRecord
+from fixtures import LatencyFakeClient, FakeClient
 from copy import deepcopy
 from tempfile import TemporaryDirectory
-
-
-class FakeClient():
-    def __init__(self):
-        self.cwd = getcwd()
-        self.base_path = join(self.cwd, 'qp_klp/tests/data/QDir')
-        self.qdirs = {'Demultiplexed': 'Demultiplexed',
-                      'beta_div_plots': 'analysis/beta_div_plots',
-                      'rarefaction_curves': 'analysis/rarefaction_curves',
-                      'taxa_summary': 'analysis/taxa_summary',
-                      'q2_visualization': 'working_dir',
-                      'distance_matrix': 'working_dir',
-                      'ordination_results': 'working_dir',
-                      'alpha_vector': 'working_dir',
-                      'FASTQ': 'FASTQ',
-                      'BIOM': 'BIOM',
-                      'per_sample_FASTQ': 'per_sample_FASTQ',
-                      'SFF': 'SFF',
-                      'FASTA': 'FASTA',
-                      'FASTA_Sanger': 'FASTA_Sanger',
-                      'FeatureData': 'FeatureData',
-                      'job-output-folder': 'job-output-folder',
-                      'BAM': 'BAM',
-                      'VCF': 'VCF',
-                      'SampleData': 'SampleData',
-                      'uploads': 'uploads'}
-
-        self.samples_in_13059 = ['13059.SP331130A04', '13059.AP481403B02',
-                                 '13059.LP127829A02', '13059.BLANK3.3B',
-                                 '13059.EP529635B02', '13059.EP542578B04',
-                                 '13059.EP446602B01', '13059.EP121011B01',
-                                 '13059.EP636802A01', '13059.SP573843A04']
-
-        # note these samples have known tids, but aren't in good-sample-sheet.
-        self.samples_in_11661 = ['11661.1.24', '11661.1.57', '11661.1.86',
-                                 '11661.10.17', '11661.10.41', '11661.10.64',
-                                 '11661.11.18', '11661.11.43', '11661.11.64',
-                                 '11661.12.15']
-
-        self.samples_in_6123 = ['3A', '4A', '5B', '6A', 'BLANK.41.12G', '7A',
-                                '8A', 'ISB', 'GFR', '6123']
-
-        self.info_in_11661 = {'number-of-samples': 10,
-                              'categories': ['sample_type', 'tube_id']}
-
-        self.info_in_13059 = {'number-of-samples': 10,
-                              'categories': ['anonymized_name',
-                                             'collection_timestamp',
-                                             'description',
-                                             'dna_extracted',
-                                             'elevation', 'empo_1',
-                                             'empo_2', 'empo_3',
-                                             'env_biome', 'env_feature',
-                                             'env_material',
-                                             'env_package',
-                                             'geo_loc_name', 'host_age',
-                                             'host_age_units',
-                                             'host_body_habitat',
-                                             'host_body_mass_index',
-                                             'host_body_product',
-                                             'host_body_site',
-                                             'host_common_name',
-                                             'host_height',
-                                             'host_height_units',
-                                             'host_life_stage',
-                                             'host_scientific_name',
-                                             'host_subject_id',
-                                             'host_taxid', 'host_weight',
-                                             'host_weight_units',
-                                             'latitude', 'longitude',
-                                             'nyuid',
-                                             'physical_specimen_location',
-                                             'physical_specimen_remaining',
-                                             'predose_time',
-                                             'sample_type',
-                                             'scientific_name', 'sex',
-                                             'subject_id', 'taxon_id',
-                                             'title', 'tube_id']}
-
-        # Study not in qiita-rc. Faking results.
-        self.info_in_6123 = {'number-of-samples': 10,
-                             'categories': ['sample_type', 'subject_id',
-                                            'title']}
-
-        self.tids_13059 = {"header": ["tube_id"],
-                           "samples": {'13059.SP331130A04': ['SP331130A-4'],
-                                       '13059.AP481403B02': ['AP481403B-2'],
-                                       '13059.LP127829A02': ['LP127829A-2'],
-                                       '13059.BLANK3.3B': ['BLANK3.3B'],
-                                       '13059.EP529635B02': ['EP529635B-2'],
-                                       '13059.EP542578B04': ['EP542578B-4'],
-                                       '13059.EP446602B01': ['EP446602B-1'],
-                                       '13059.EP121011B01': ['EP121011B-1'],
-                                       '13059.EP636802A01': ['EP636802A-1'],
-                                       '13059.SP573843A04': ['SP573843A-4']}}
-
-        self.tids_11661 = {"header": ["tube_id"],
-                           "samples": {"11661.1.24": ["1.24"],
-                                       "11661.1.57": ["1.57"],
-                                       "11661.1.86": ["1.86"],
-                                       "11661.10.17": ["10.17"],
-                                       "11661.10.41": ["10.41"],
-                                       "11661.10.64": ["10.64"],
-                                       "11661.11.18": ["11.18"],
-                                       "11661.11.43": ["11.43"],
-                                       "11661.11.64": ["11.64"],
-                                       "11661.12.15": ["12.15"]}}
-
-        for key in self.qdirs:
-            self.qdirs[key] = join(self.base_path, self.qdirs[key])
-
-        for qdir in self.qdirs:
-            makedirs(self.qdirs[qdir], exist_ok=True)
-
-        self.fake_id = 1000
-        self._server_url = "some.server.url"
-        self.saved_posts = {}
-
-    def get(self, url):
-        m = {'/api/v1/study/11661/samples': self.samples_in_11661,
-             '/api/v1/study/11661/samples/categories=tube_id': self.tids_11661,
-             '/api/v1/study/11661/samples/info': self.info_in_11661,
-             '/api/v1/study/13059/samples': self.samples_in_13059,
-             '/api/v1/study/13059/samples/categories=tube_id': self.tids_13059,
-             '/api/v1/study/13059/samples/info': self.info_in_13059,
-             '/api/v1/study/6123/samples': self.samples_in_6123,
-             '/api/v1/study/6123/samples/info': self.info_in_6123,
-             '/qiita_db/artifacts/types/': self.qdirs}
-
-        if url in m:
-            return m[url]
-
-        return None
-
-    def post(self, url, data=None):
-        if '/qiita_db/prep_template/' == url:
-            self.fake_id += 1
-            return {'prep': self.fake_id}
-        elif '/qiita_db/artifact/' == url:
-            self.saved_posts[str(self.fake_id)] = data
-            self.fake_id += 1
-            return {'job_id': self.fake_id}
-        else:
-            raise ValueError("Unsupported URL")
+from time import time
+import pandas as pd
 
 
 class AnotherFakeClient():
@@ -345,6 +204,61 @@ class TestHelpers(TestCase):
         with self.assertRaisesRegex(WorkflowError, msg):
             wf._project_metadata_check()
 
+    def test_load_preps_concurrently(self):
+        client = LatencyFakeClient(latency=0.2)
+        self.kwargs['qclient'] = client
+        wf = WorkflowFactory.generate_workflow(**self.kwargs)
+
+        files = {'raw_forward_seqs': ['a_R1_001.fastq.gz'],
+                 'raw_reverse_seqs': ['a_R2_001.fastq.gz']}
+        tasks = [(client, str(prep_id), f'artifact_{prep_id}', '13059',
+                  'NYU_BMS_Melanoma_13059', files, 'per_sample_FASTQ')
+                 for prep_id in range(20)]
+
+        start = time()
+        df = wf._load_preps_concurrently(tasks)
+        elapsed = time() - start
+
+        # 20 requests w/0.2 seconds of latency each would take 4 seconds
+        # if issued serially.
+        self.assertLess(elapsed, 2.0)
+        self.assertEqual(len(client.saved_posts), 20)
+
+        # rows must be in the same order as the tasks, regardless of the
+        # order in which the requests completed.
+        self.assertEqual(list(df['Qiita Prep ID']),
+                         [str(x) for x in range(20)])
+        self.assertTrue(exists(join(self.output_dir,
+                                    'touched_studies.html')))
+
+    def test_load_preps_not_retried(self):
+        class FailingClient(LatencyFakeClient):
+            def __init__(self):
+                super().__init__(latency=0)
+                self.attempts = 0
+
+            def post(self, url, data=None):
+                with self.lock:
+                    self.attempts += 1
+                # e.g. a timeout after Qiita created the artifact.
+                raise ConnectionError("read timed out")
+
+        client = FailingClient()
+        self.kwargs['qclient'] = client
+        wf = WorkflowFactory.generate_workflow(**self.kwargs)
+
+        files = {'raw_forward_seqs': ['a_R1_001.fastq.gz'],
+                 'raw_reverse_seqs': ['a_R2_001.fastq.gz']}
+        tasks = [(client, str(prep_id), f'artifact_{prep_id}', '13059',
+                  'NYU_BMS_Melanoma_13059', files, 'per_sample_FASTQ')
+                 for prep_id in range(3)]
+
+        with self.assertRaisesRegex(ValueError, "3 of 3 tasks failed"):
+            wf._load_preps_concurrently(tasks)
+
+        # each artifact is POSTed once, so that a duplicate is never made.
+        self.assertEqual(client.attempts, 3)
+
 
 class FailedSamplesRecordTests(TestCase):
     def setUp(self):
@@ -402,3 +316,60 @@ class FailedSamplesRecordTests(TestCase):
         self.assertFalse(exists(fsr.report_path))
         fsr.generate_report()
         self.assertTrue(exists(fsr.report_path))
+
+    def test_journal(self):
+        fsr = FailedSamplesRecord(self.output.name, self.samples)
+
+        # write() appends new failures to the journal rather than rewriting
+        # the whole state.
+        fsr.write(['A'], 'ConvertJob')
+        fsr.write(['A', 'B'], 'NuQCJob')
+        self.assertFalse(exists(fsr.output_path))
+
+        with open(fsr.journal_path) as f:
+            self.assertEqual(f.readlines(),
+                             ['{"sample_id": "A", "job_name": "ConvertJob"}\n',
+                              '{"sample_id": "B", "job_name": "NuQCJob"}\n'])
+
+        # simulate a crash while an entry was being written.
+        with open(fsr.journal_path, 'a') as f:
+            f.write('{"sample_id": "C", "job_na')
+
+        # a new record, e.g. after a restart, recovers state from the
+        # journal on its first write().
+        fsr = FailedSamplesRecord(self.output.name, self.samples)
+        fsr.write(['C'], 'FastQCJob')
+        exp = {'A': 'ConvertJob', 'B': 'NuQCJob', 'C': 'FastQCJob',
+               'D': None}
+        self.assertEqual(fsr.sample_state, exp)
+
+        # dump() compacts the journal into failed_samples.json.
+        fsr.dump()
+        with open(fsr.journal_path) as f:
+            self.assertEqual(f.read(), '')
+
+        fsr = FailedSamplesRecord(self.output.name, self.samples)
+        fsr.load()
+        self.assertEqual(fsr.sample_state, exp)
+        self.assertEqual(fsr.journal_entries, 0)
+
+    def test_generate_report(self):
+        fsr = FailedSamplesRecord(self.output.name, self.samples)
+
+        for failed_ids in [[], ['A', 'C']]:
+            fsr.update(failed_ids, 'ConvertJob')
+            fsr.generate_report()
+
+            # the report must be identical to the one generated by pandas.
+            df = pd.DataFrame([{'Project': fsr.project_map[x],
+                                'Sample ID': x,
+                                'Failed at': fsr.sample_state[x]}
+                               for x in failed_ids],
+                              columns=FailedSamplesRecord.REPORT_COLUMNS)
+
+            with open(fsr.report_path) as f:
+                self.assertEqual(f.read(),
+                                 df.to_html(border=2, index=False,
+                                            justify="left",
+                                            render_links=True,
+                                            escape=False))
@@ -0,0 +1,37 @@
+# -----------------------------------------------------------------------------
+# Copyright (c) 2014--, The Qiita Development Team.
+#
+# Distributed under the terms of the BSD 3-clause License.
+#
+# The full license is in the file LICENSE, distributed with this software.
+# -----------------------------------------------------------------------------
+from unittest import TestCase
+from os import environ
+from subprocess import run
+import sys
+
+
+class ImportTests(TestCase):
+    def test_plugin_imports_are_lazy(self):
+        # loading the plugin, as start_klp and configure_klp do, must not
+        # import the workflows or their dependencies. qiita_client is
+        # imported first, so that the modules it imports are not counted.
+        code = ("import sys\n"
+                "import qiita_client\n"
+                "before = set(sys.modules)\n"
+                "import qp_klp\n"
+                "print('\\n'.join(sorted(set(sys.modules) - before)))\n")
+
+        env = dict(environ)
+        env.setdefault('QP_KLP_CONFIG_FP', 'unused')
+        proc = run([sys.executable, '-c', code], capture_output=True,
+                   text=True, env=env, check=True)
+        imported = proc.stdout.split()
+
+        self.assertIn('qp_klp.klp', imported)
+
+        deferred = {'pandas', 'metapool', 'sequence_processing_pipeline',
+                    'qp_klp.Workflows', 'qp_klp.WorkflowFactory',
+                    'qp_klp.Assays', 'qp_klp.Protocol'}
+        self.assertEqual([x for x in imported if x in deferred or
+                          x.split('.')[0] in deferred], [])
@@ -6,17 +6,22 @@
 # The full license is in the file LICENSE, distributed with this software.
 # -----------------------------------------------------------------------------
 from unittest import TestCase
-from os.path import join, abspath, exists, split
-from os import makedirs, chmod, access, W_OK, walk
+from os.path import join, abspath, exists, split, islink
+from os import makedirs, chmod, access, W_OK, walk, stat, utime
 from shutil import rmtree
 from os import environ, remove, getcwd
 import re
 from qp_klp.WorkflowFactory import WorkflowFactory
-from qp_klp.Workflows import Workflow
+from qp_klp.Workflows import Workflow, WorkflowError
+from qp_klp.FailedSamplesRecord import FailedSamplesRecord
+from qp_klp.Packager import Packager
+from qp_klp.PooledQiitaClient import PooledQiitaClient
+from fixtures import MockPipeline, OutputDirTestCase
 from metapool import load_sample_sheet
 from collections import defaultdict
 from random import randint
 from platform import system as get_operating_system_type
+import gzip
 
 
 class FakeClient():
@@ -933,3 +938,198 @@ class TestWorkflows(TestCase):
 
         for file_name, exp in test_names:
             self.assertEqual(Workflow._determine_orientation(file_name), exp)
+
+
+class FastpReportTests(OutputDirTestCase):
+    def setUp(self):
+        super().setUp()
+        self.workflow = self.make_workflow()
+
+    def make_dirs(self, paths):
+        for path in paths:
+            self.write(join(path, 'report.html'), "This is a report.")
+
+    def test_no_reports(self):
+        self.assertEqual(self.workflow._process_fastp_report_dirs(), [])
+
+        self.make_dirs(['NuQCJob/Project_1/filtered_sequences'])
+        self.assertEqual(self.workflow._process_fastp_report_dirs(), [])
+
+    def test_project_reports(self):
+        self.make_dirs(['NuQCJob/Project_2/fastp_reports_dir/html',
+                        'NuQCJob/Project_1/fastp_reports_dir/json',
+                        'NuQCJob/Project_1/filtered_sequences',
+                        'NuQCJob/logs',
+                        'NuQCJob/only-adapter-filtered'])
+
+        self.assertEqual(self.workflow._process_fastp_report_dirs(),
+                         ['NuQCJob/Project_1/fastp_reports_dir',
+                          'NuQCJob/Project_2/fastp_reports_dir'])
+
+        # the directories are listed w/out indexing the output tree.
+        self.assertIsNone(self.workflow.output_index)
+
+        packager = Packager(self.output.name,
+                            join(self.output.name, 'final_results'),
+                            use_pigz=False)
+        self.assertEqual(self.workflow._add_fastp_report_archives(packager),
+                         ['reports-NuQCJob-Project_1.tgz',
+                          'reports-NuQCJob-Project_2.tgz',
+                          'reports-NuQCJob.tgz'])
+
+    def test_run_reports(self):
+        self.make_dirs(['NuQCJob/fastp_reports_dir/html',
+                        'NuQCJob/Project_1/filtered_sequences'])
+
+        self.assertEqual(self.workflow._process_fastp_report_dirs(),
+                         ['NuQCJob/fastp_reports_dir'])
+
+        packager = Packager(self.output.name,
+                            join(self.output.name, 'final_results'),
+                            use_pigz=False)
+        self.assertEqual(self.workflow._add_fastp_report_archives(packager),
+                         ['reports-NuQCJob.tgz'])
+
+    def test_bounded_search(self):
+        # reports in other locations are found if they are no more than
+        # three levels below NuQCJob.
+        self.make_dirs(['NuQCJob/a/b/fastp_reports_dir/html',
+                        'NuQCJob/c/d/e/fastp_reports_dir/html'])
+
+        self.assertEqual(self.workflow._process_fastp_report_dirs(),
+                         ['NuQCJob/a/b/fastp_reports_dir'])
+
+
+class WorkflowHelperTests(OutputDirTestCase):
+    def test_copy_files(self):
+        src = self.write('sample_S1_L001_R1_001.fastq.gz', "This is a file.")
+
+        # files staged for Qiita are never symlinks, regardless of the
+        # configured mode.
+        workflow = self.make_workflow({'file_staging_mode': 'symlink'})
+        obs = workflow._copy_files({'raw_forward_seqs': [src]})
+
+        dst = join(self.output.name, 'copy1',
+                   'sample_S1_L001_R1_001.fastq.gz')
+        self.assertEqual(obs, {'raw_forward_seqs': [dst]})
+        self.assertFalse(islink(dst))
+        self.assertEqual(stat(dst).st_ino, stat(src).st_ino)
+
+    def test_instrumentation_write_failure(self):
+        # timings.json cannot be written beneath a regular file.
+        workflow = Workflow()
+        workflow.pipeline = MockPipeline(self.write('output'))
+
+        # the pipeline's own error is raised, rather than the failure to
+        # write timings.
+        with self.assertRaisesRegex(ValueError, 'step failed'):
+            with workflow.instrumentation():
+                raise ValueError('step failed')
+
+        self.assertEqual(workflow.finish_instrumentation(), [])
+
+    def test_pooled_qclient_opt_in(self):
+        # PooledQiitaClient relies on private QiitaClient methods and is
+        # only used when enabled.
+        workflow = Workflow()
+        workflow.qclient = FakeClient()
+        self.assertIsNone(workflow.start_pooled_qclient())
+        self.assertIsInstance(workflow.qclient, FakeClient)
+
+        workflow = Workflow()
+        workflow.qclient = FakeClient()
+        workflow.klp_config = {'qiita_use_pooled_client': True}
+        self.assertIs(workflow.start_pooled_qclient(), workflow.qclient)
+        self.assertIsInstance(workflow.qclient, PooledQiitaClient)
+        workflow.pooled_qclient.close()
+
+    def test_remove_incomplete_output(self):
+        data = gzip.compress(b'@r1\nACGT\n+\nFFFF\n' * 100)
+        paths = {}
+        for sample_id, contents in [('sample1', data),
+                                    ('sample2', data[:-20]),
+                                    ('sample3', b'not gzipped'),
+                                    ('sample4', data[:-20])]:
+            paths[sample_id] = self.write(
+                f'NuQCJob/Feist_11661/filtered_sequences/{sample_id}_S1_'
+                'L001_R1_001.trimmed.fastq.gz', contents)
+
+        # files last written well before the Job stopped aren't read.
+        mtime = stat(paths['sample4']).st_mtime - 7200
+        utime(paths['sample4'], (mtime, mtime))
+
+        workflow = self.make_workflow()
+        obs = workflow.remove_incomplete_output(join(self.output.name,
+                                                     'NuQCJob'))
+        self.assertEqual(sorted(obs), [paths['sample2'], paths['sample3']])
+        self.assertTrue(exists(paths['sample1']))
+        self.assertFalse(exists(paths['sample2']))
+        self.assertFalse(exists(paths['sample3']))
+        self.assertTrue(exists(paths['sample4']))
+
+    def test_rerun_failed_samples_wo_input(self):
+        class NuQCJob():
+            def audit(self, sample_ids):
+                return ['sample1', 'sample2']
+
+        class MockSample():
+            def __init__(self, sample_id):
+                self.Sample_ID = sample_id
+                self.Sample_Project = 'Feist_11661'
+
+        workflow = self.make_workflow()
+        workflow.pipeline.get_sample_ids = lambda: ['sample1', 'sample2']
+        workflow.fsr = FailedSamplesRecord(
+            self.output.name, [MockSample('sample1'), MockSample('sample2')])
+        workflow.fsr.update(['sample1'], 'ConvertJob')
+
+        # the input for sample2 exists, but under a name it can't be
+        # matched by.
+        input_dir = join(self.output.name, 'ConvertJob')
+        self.write('ConvertJob/Feist_11661/sample-2_S2_L001_R1_001.fastq.gz',
+                   gzip.compress(b''))
+        self.write('NuQCJob/logs/NuQCJob_1.log', 'interrupted')
+        job_completed = join(self.output.name, 'NuQCJob', 'job_completed')
+
+        with self.assertRaisesRegex(WorkflowError, "NuQCJob has no output "
+                                                   "for 1 samples(.|\n)*: "
+                                                   "sample2$"):
+            workflow.rerun_failed_samples(NuQCJob(), None, [input_dir])
+        self.assertFalse(exists(job_completed))
+
+        # samples that failed an earlier step have no input to rerun.
+        workflow.fsr.update(['sample2'], 'ConvertJob')
+        self.assertEqual(workflow.rerun_failed_samples(NuQCJob(), None,
+                                                       [input_dir]), [])
+        self.assertTrue(exists(job_completed))
+
+    def test_study_cache(self):
+        workflow = self.make_workflow()
+        workflow.pipeline.get_project_info = lambda: [{'qiita_id': '13059'},
+                                                      {'qiita_id': '11661'}]
+        locked = []
+
+        class LockCheckingClient(FakeClient):
+            def get(self, url):
+                locked.append(workflow.lock.locked())
+                return super().get(url)
+
+        workflow.qclient = LockCheckingClient()
+        study_cache = workflow.get_study_cache()
+        self.assertIs(workflow.get_study_cache(), study_cache)
+        self.assertEqual(study_cache.get_stats()['entries'], 6)
+
+        # the lock shared by all steps isn't held while metadata is
+        # fetched.
+        self.assertEqual(locked, [False] * 6)
+
+    def test_can_resume(self):
+        workflow = Workflow()
+        workflow.skip_steps = ['ConvertJob', 'NuQCJob']
+
+        self.assertTrue(workflow.can_resume('NuQCJob', ['ConvertJob']))
+        self.assertFalse(workflow.can_resume('NuQCJob', ['TellReadJob']))
+
+        # FastQCJob's MultiQC report must cover every sample.
+        self.assertFalse(workflow.can_resume('FastQCJob',
+                                             ['ConvertJob', 'NuQCJob']))